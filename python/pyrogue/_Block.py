@@ -120,13 +120,16 @@ class BaseBlock(object):
     def bulkEn(self):
         return True
 
-    def startTransaction(self,type, check=False):
+    def startTransaction(self,type, check=False, drop=False):
         """
         Start a transaction.
+        Local transactions are never dropped.
         """
         with self._lock:
             self._doUpdate = True
 
+        return True
+
     def _checkTransaction(self):
         """
         Check status of block.
@@ -147,8 +150,8 @@ class LocalBlock(BaseBlock):
     def __init__(self, *, variable, localSet, localGet, value):
         BaseBlock.__init__(self, name=variable.path, mode=variable.mode, device=variable.parent)
 
-        self._localSet = localSet
-        self._localGet = localGet
+        self._localSet = pr.functionWrapper(function=localSet, callArgs=['dev','var','value','changed'], log=self._log, path=variable.path)
+        self._localGet = pr.functionWrapper(function=localGet, callArgs=['dev','var'], log=self._log, path=variable.path)
         self._variable = variable
         self._variables = [variable] # Used by poller
         self._value = value
@@ -168,20 +171,12 @@ class LocalBlock(BaseBlock):
 
             # If a setFunction exists, call it (Used by local variables)
             if self._localSet is not None:
-
-                # Possible args
-                pargs = {'dev' : self._device, 'var' : self._variable, 'value' : self._value, 'changed' : changed}
-
-                pr.varFuncHelper(self._localSet, pargs, self._log, self._variable.path)
+                self._localSet(dev=self._device, var=self._variable, value=self._value, changed=changed)
 
     def get(self, var):
         if self._localGet is not None:
             with self._lock:
-
-                # Possible args
-                pargs = {'dev' : self._device, 'var' : self._variable}
-
-                self._value = pr.varFuncHelper(self._localGet,pargs, self._log, self._variable.path)
+                self._value = self._localGet(dev=self._device, var=self._variable)
 
         return self._value
 
@@ -275,6 +270,13 @@ class RemoteBlock(BaseBlock, rim.Master):
         self._minSize   = self._reqMinAccess()
         self._maxSize   = self._reqMaxAccess()
         self._variables = variables
+        self._varMasks  = []     # (variable, bit mask) pairs for change detection
+        self._pData     = None   # Block data at last update
+        self._changeCount = 0    # Number of updates where the block data changed
+        self._link      = None   # LinkScheduler of the memory slave
+        self._lane      = None   # Transaction lane held until the transaction is checked
+        self._lastValue = {}     # Last notified value of deadband variables
+        self._refreshTime = 0.0
 
         if self._minSize == 0 or self._maxSize == 0:
             raise MemoryError(name=self.name, address=self.address, msg="Invalid min/max size")
@@ -319,6 +321,12 @@ class RemoteBlock(BaseBlock, rim.Master):
                     self._verifyEn = True
                     self._setBits(self._vDataMask,var.bitOffset[x],var.bitSize[x])
 
+            # Mask of variable bits within the block
+            mask = 0
+            for x in range(len(var.bitOffset)):
+                mask |= ((1 << var.bitSize[x]) - 1) << var.bitOffset[x]
+            self._varMasks.append((var,mask))
+
         # Check for overlaps by anding exclusive and overmap bit vectors
         for b1, b2 in zip(oleMask, excMask):
             if b1 & b2 != 0:
@@ -362,6 +370,16 @@ class RemoteBlock(BaseBlock, rim.Master):
     def bulkEn(self):
         return self._bulkEn
 
+    def _linkScheduler(self):
+        if self._link is None:
+            self._link = self._device.root._linkScheduler(self._reqSlaveId())
+        return self._link
+
+    def _releaseLane(self):
+        if self._lane is not None:
+            self._link.release(self._lane)
+            self._lane = None
+
     def set(self, var, value):
         """
         Update block with bitSize bits from passed byte array.
@@ -396,14 +414,26 @@ class RemoteBlock(BaseBlock, rim.Master):
 
             return var._base.fromBytes(ba,sum(var.bitSize))
 
-    def startTransaction(self, type, check=False):
+    def startTransaction(self, type, check=False, drop=False):
         """
         Start a transaction.
+        The transaction first waits for its lane of the link, see pyrogue.transactionLane().
+        A read with drop set is dropped when its lane is full, this is used by the poll workers.
+        Returns False if the transaction was dropped, True otherwise.
         """
+        lane = pr.currentLane()
+
+        if not self._linkScheduler().acquire(lane, drop=(drop and type == rim.Read)):
+            return False
+
         with self._lock:
 
             #print(f'Called {self.name}.startTransaction(check={check})')
 
+            # Lane of a transaction which was never checked
+            self._releaseLane()
+            self._lane = lane
+
             # Check for invalid combinations
             if (type == rim.Write  and (self.mode == 'RO')) or \
                (type == rim.Post   and (self.mode == 'RO')) or \
@@ -411,7 +441,8 @@ class RemoteBlock(BaseBlock, rim.Master):
                (type == rim.Verify and (self.mode == 'WO' or \
                                         self.mode == 'RO' or \
                                         self._verifyWr == False)):
-                return
+                self._releaseLane()
+                return True
 
             self._waitTransaction(0)
             self.error = 0
@@ -427,7 +458,8 @@ class RemoteBlock(BaseBlock, rim.Master):
 
             # Do not write to hardware for a disabled device
             if (self._device.enable.value() is not True):
-                return
+                self._releaseLane()
+                return True
 
             self._log.debug(f'startTransaction type={type}')
             self._log.debug(f'len bData = {len(self._bData)}, vData = {len(self._vData)}, vDataMask = {len(self._vDataMask)}')
@@ -445,18 +477,24 @@ class RemoteBlock(BaseBlock, rim.Master):
             tData = self._vData if self._doVerify else self._bData
 
             # Start transaction
-            self._reqTransaction(self.offset,tData,0,0,type)
+            try:
+                self._reqTransaction(self.offset,tData,0,0,type)
+            except Exception:
+                self._releaseLane()
+                raise
 
         if check:
             #print(f'Checking {self.name}.startTransaction(check={check})')
             self._checkTransaction()
 
+        return True
 
     def _checkTransaction(self):
         
         doUpdate = False
         with self._lock:
             self._waitTransaction(0)
+            self._releaseLane()
 
             #print(f'Checking {self.name}._checkTransaction()')            
 
@@ -497,7 +535,186 @@ class RemoteBlock(BaseBlock, rim.Master):
 
 
     def updated(self):
+        """
+        Notify variables whose bits have changed since the last update.
+        Changes within a variable's deadband are suppressed. All variables
+        are notified on the first update and every root UpdateRefresh seconds.
+        """
         self._log.debug(f'Block {self._name} _update called')
-        for v in self._variables:
+        uvars = []
+
+        with self._lock:
+            now     = time.monotonic()
+            refresh = self._device.root.UpdateRefresh.value()
+            force   = (self._pData is None) or (refresh > 0 and (now - self._refreshTime) >= refresh)
+
+            if force:
+                self._refreshTime = now
+                diff = -1
+            else:
+                diff = int.from_bytes(self._bData,'little') ^ int.from_bytes(self._pData,'little')
+
+            if self._pData != self._bData:
+                self._changeCount += 1
+
+            self._pData = bytearray(self._bData)
+
+            if diff != 0:
+                for var,mask in self._varMasks:
+                    if diff & mask:
+                        if var._deadband is not None:
+                            value = self.get(var)
+
+                            if (not force) and (var in self._lastValue) and \
+                               abs(value - self._lastValue[var]) < var._deadband:
+                                continue
+
+                            self._lastValue[var] = value
+
+                        uvars.append(var)
+
+        # Update variables outside of lock
+        for v in uvars:
             v._queueUpdate()
 
+
+
+class BlockGroup(rim.Master):
+    """
+    A single read transaction covering a list of address contiguous remote blocks
+    on the same memory slave. The read data is distributed to the blocks when
+    the transaction is checked and each block then notifies its variables as
+    after its own read.
+    """
+    def __init__(self, blocks):
+        rim.Master.__init__(self)
+
+        self._blocks = blocks
+        self._size   = sum(b._size for b in blocks)
+        self._offset = blocks[0].offset
+        self._data   = bytearray(self._size)
+        self._name   = blocks[0].name
+        self._link   = blocks[0]._linkScheduler()
+        self._lane   = None
+
+        # Addresses are relative to the device of the first block
+        self._setSlave(blocks[0]._device)
+        self._setTimeout(max(b._getTimeout() for b in blocks))
+
+    def __repr__(self):
+        return repr([b.name for b in self._blocks])
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def address(self):
+        return self._blocks[0].address
+
+    @property
+    def blocks(self):
+        return self._blocks
+
+    def startTransaction(self, type, check=False, drop=False):
+        """Start the read. Only rim.Read is supported. See RemoteBlock.startTransaction()."""
+        lane = pr.currentLane()
+
+        if not self._link.acquire(lane, drop=drop):
+            return False
+
+        self._lane = lane
+
+        for b in self._blocks:
+            with b._lock:
+                b._waitTransaction(0)
+                b.error = 0
+
+        self._setError(0)
+
+        try:
+            self._reqTransaction(self._offset,self._data,0,0,rim.Read)
+        except Exception:
+            self._link.release(self._lane)
+            self._lane = None
+            raise
+
+        if check:
+            self._checkTransaction()
+
+        return True
+
+    def _checkTransaction(self):
+        if self._lane is None:
+            return
+
+        self._waitTransaction(0)
+        self._link.release(self._lane)
+        self._lane = None
+
+        err = self._getError()
+        self._setError(0)
+
+        if err > 0:
+            raise MemoryError(name=self.name, address=self.address, error=err, size=self._size)
+
+        off = 0
+        for b in self._blocks:
+            with b._lock:
+                b._bData[:] = self._data[off:off+b._size]
+                b._doVerify = False
+                b._doUpdate = True
+            off += b._size
+
+        for b in self._blocks:
+            b._checkTransaction()
+
+
+def groupBlocks(blocks, merge=True):
+    """
+    Order the passed blocks by memory slave and address. With merge=True, runs of
+    readable remote blocks which are address contiguous on the same memory slave
+    of an enabled device are combined into BlockGroup transactions, up to the
+    maximum transaction size of the slave. Returns a list of blocks and block groups.
+    """
+    ret  = []
+    run  = []
+    last = None
+
+    def _flush():
+        if len(run) == 1:
+            ret.append(run[0])
+        elif len(run) > 1:
+            ret.append(BlockGroup(list(run)))
+        run.clear()
+
+    remote = []
+    for b in blocks:
+        if isinstance(b,RemoteBlock):
+            remote.append((b._reqSlaveId(),b.address,b))
+        else:
+            ret.append(b)
+
+    remote.sort(key=lambda x: (x[0],x[1]))
+
+    for slave,addr,b in remote:
+        if not (merge and b.mode != 'WO' and b._device.enable.value() is True):
+            _flush()
+            ret.append(b)
+            continue
+
+        if len(run) > 0 and (last[0] != slave or (last[1] + run[-1]._size) != addr or
+                             size + b._size > min(maxSize, b._maxSize)):
+            _flush()
+
+        if len(run) == 0:
+            size    = 0
+            maxSize = b._maxSize
+
+        run.append(b)
+        last    = (slave,addr)
+        size   += b._size
+        maxSize = min(maxSize, b._maxSize)
+
+    _flush()
+    return ret
@@ -18,8 +18,6 @@ import textwrap
 import time
 from collections import OrderedDict as odict
 import pyrogue as pr
-import inspect
-import Pyro4
 
 class CommandError(Exception):
     """ Exception for command errors."""
@@ -48,22 +46,18 @@ class BaseCommand(pr.BaseVariable):
             minimum=minimum,
             maximum=maximum)
         
-        self._function = function if function is not None else BaseCommand.nothing
+        self._function = pr.functionWrapper(function=function if function is not None else BaseCommand.nothing,
+                                            callArgs=['dev','cmd','arg'], log=self._log, path=self.path)
 
         # args flag
-        try:
-            self._arg = 'arg' in inspect.getfullargspec(self._function).args
-
-        # C++ functions
-        except:
-            self._arg = False
+        self._arg = 'arg' in self._function.args
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def arg(self):
         return self._arg
 
-    @Pyro4.expose
+    @pr.expose
     def call(self,arg=None):
         """Execute command: TODO: Update comments"""
         if (self.parent.enable.value() is not True):
@@ -74,10 +68,7 @@ class BaseCommand(pr.BaseVariable):
             # Convert arg
             arg = self.parseDisp(arg)
 
-            # Possible args
-            pargs = {'dev' : self.parent, 'cmd' : self, 'arg' : arg}
-
-            pr.varFuncHelper(self._function,pargs, self._log,self.path)
+            self._function(dev=self.parent, cmd=self, arg=arg)
 
         except Exception as e:
             self._log.exception(e)
@@ -143,6 +134,11 @@ class BaseCommand(pr.BaseVariable):
     def _setDict(self,d,writeEach,modes):
         pass
 
+    def _describe(self):
+        ret = pr.BaseVariable._describe(self)
+        ret['arg'] = self.arg
+        return ret
+
     def _getDict(self,modes):
         return None
 
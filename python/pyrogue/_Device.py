@@ -20,7 +20,6 @@ import functools as ft
 import pyrogue as pr
 import inspect
 import threading
-import Pyro4
 import math
 import time
 
@@ -48,7 +47,7 @@ class EnableVariable(pr.BaseVariable):
     def nativeType(self):
         return bool
 
-    @Pyro4.expose
+    @pr.expose
     def get(self, read=False):
         ret = self._value
 
@@ -68,7 +67,7 @@ class EnableVariable(pr.BaseVariable):
 
         return ret
         
-    @Pyro4.expose
+    @pr.expose
     def set(self, value, write=True):
         if value != 'parent' and value != 'deps':
             old = self.value()
@@ -107,7 +106,8 @@ class Device(pr.Node,rim.Hub):
                  expand=True,
                  enabled=True,
                  defaults=None,
-                 enableDeps=None):
+                 enableDeps=None,
+                 pollGroup=None):
 
         
         """Initialize device class"""
@@ -124,6 +124,7 @@ class Device(pr.Node,rim.Hub):
         self._size      = size
         self._blockSize = blockSize
         self._defaults  = defaults if defaults is not None else {}
+        self._pollGroup = pollGroup
 
         # Connect to memory slave
         if memBase: self._setSlave(memBase)
@@ -139,26 +140,34 @@ class Device(pr.Node,rim.Hub):
         # Variable interface to enable flag
         self.add(EnableVariable(enabled=enabled, deps=enableDeps))
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def address(self):
         return self._getAddress()
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def offset(self):
         return self._getOffset()
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def size(self):
         return self._size
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def memBaseId(self):
         return self._reqSlaveId()
 
+    @property
+    def pollGroup(self):
+        """
+        Blocks of this device and its sub-devices are polled by the poll worker for this group.
+        None uses the group of the parent device, or the memory slave at the root.
+        """
+        return self._pollGroup
+
     def add(self,node):
         # Call node add
         pr.Node.add(self,node)
@@ -466,6 +475,13 @@ class Device(pr.Node,rim.Hub):
         for v in self.variables.values():
             v._finishInit()
 
+    def _stop(self):
+        """
+        Called by Root.stop() before the root workers are stopped.
+        Devices which run their own threads stop them here.
+        """
+        for d in self.devices.values():
+            d._stop()
 
     def _setTimeout(self,timeout):
         """
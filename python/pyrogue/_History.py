@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : PyRogue base module - Variable History Class
+#-----------------------------------------------------------------------------
+# File       : pyrogue/_History.py
+# Created    : 2018-08-22
+#-----------------------------------------------------------------------------
+# Description:
+# Fixed capacity ring buffer of the recent values of a variable, filled by the
+# root update workers and by the recorder utility. Requires numpy, this module
+# is only imported when a history is created.
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import threading
+import numpy as np
+
+# Array types in promotion order
+_dtypes = ['?', 'i8', 'f8']
+
+def _dtypeIndex(value):
+    if isinstance(value,(bool,np.bool_)):
+        return 0
+    elif isinstance(value,(int,np.integer)):
+        return 1
+    elif isinstance(value,(float,np.floating)):
+        return 2
+    else:
+        return None
+
+class VariableHistory(object):
+    """
+    Ring buffer of (timestamp, value) samples of a numeric variable.
+    The value array type is set by the first sample: bool, int64 or float64.
+    It is promoted when a later sample needs a wider type, and integers
+    outside of int64 switch it to float64. Values which are not numeric
+    are not recorded and counted as skipped.
+
+    unflushed() hands out each sample once, for consumers which store the
+    samples elsewhere. Samples overwritten before they were handed out are
+    counted as dropped.
+    """
+
+    def __init__(self, size):
+        self._size    = size
+        self._time    = np.zeros(size, dtype='f8')
+        self._value   = None
+        self._kind    = None # Index into _dtypes of the value array
+        self._head    = 0    # Total samples appended
+        self._flushed = 0    # Total samples handed out by unflushed()
+        self._dropped = 0
+        self._change  = None # Time of the last value change
+        self._skipped = 0
+        self._lock    = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def dtype(self):
+        """Type of the value array, None until the first numeric sample"""
+        return None if self._value is None else self._value.dtype
+
+    @property
+    def appended(self):
+        """Total samples appended"""
+        return self._head
+
+    @property
+    def dropped(self):
+        """Samples overwritten before they were handed out by unflushed()"""
+        with self._lock:
+            return self._dropped + max(0, self._head - self._flushed - self._size)
+
+    @property
+    def skipped(self):
+        """Values which were not recorded because they are not numeric"""
+        return self._skipped
+
+    def append(self, stamp, value):
+        kind = _dtypeIndex(value)
+
+        with self._lock:
+            if kind is None:
+                self._skipped += 1
+                return
+
+            if self._value is None:
+                self._value = np.zeros(self._size, dtype=_dtypes[kind])
+                self._kind  = kind
+
+            elif kind > self._kind:
+                self._value = self._value.astype(_dtypes[kind])
+                self._kind  = kind
+
+            idx  = self._head % self._size
+            prev = self._value[(idx - 1) % self._size]
+
+            try:
+                self._value[idx] = value
+            except OverflowError:
+                self._value = self._value.astype('f8')
+                self._kind  = 2
+                self._value[idx] = value
+
+            if self._head == 0 or self._value[idx] != prev:
+                self._change = stamp
+
+            self._time[idx] = stamp
+            self._head += 1
+
+    def _select(self, first, count, since):
+        """Index array of the selected samples, oldest first. Called with the lock held."""
+        first = max(first, self._head - self._size)
+
+        if count is not None:
+            first = max(first, self._head - count)
+
+        idx = np.arange(first, self._head) % self._size
+
+        if since is not None:
+            idx = idx[self._time[idx] >= since]
+
+        return idx
+
+    def arrays(self, count=None, since=None):
+        """
+        Return (times, values) arrays of the last count samples with a
+        timestamp at or after since, oldest first. Both default to all samples.
+        """
+        with self._lock:
+            if self._value is None:
+                return np.zeros(0, dtype='f8'), np.zeros(0)
+
+            idx = self._select(0, count, since)
+            return self._time[idx], self._value[idx]
+
+    def pending(self, since=None):
+        """Return (times, values) arrays of the samples not yet handed out by unflushed()"""
+        with self._lock:
+            if self._value is None:
+                return np.zeros(0, dtype='f8'), np.zeros(0)
+
+            idx = self._select(self._flushed, None, since)
+            return self._time[idx], self._value[idx]
+
+    def unflushed(self):
+        """Return (times, values) arrays of the samples not yet handed out and mark them flushed"""
+        with self._lock:
+            if self._value is None:
+                return np.zeros(0, dtype='f8'), np.zeros(0)
+
+            self._dropped += max(0, self._head - self._flushed - self._size)
+
+            idx = self._select(self._flushed, None, None)
+            self._flushed = self._head
+            return self._time[idx], self._value[idx]
+
+    def lastChange(self):
+        """Timestamp of the last sample which changed the value, or None"""
+        with self._lock:
+            return self._change
+
+    def changedSince(self, stamp):
+        """Return True if the value changed at or after the passed timestamp"""
+        with self._lock:
+            return self._change is not None and self._change >= stamp
+
+    def stats(self, count=None, since=None):
+        """
+        Return a dictionary of statistics over the samples selected as in
+        arrays(): count, min, max, mean, first and last time, last value, rate
+        of change in units per second and the time of the last value change.
+        Rate is the least squares slope and is None with fewer than two samples.
+        """
+        t, v = self.arrays(count, since)
+
+        ret = {'count'   : len(t),
+               'min'     : None,
+               'max'     : None,
+               'mean'    : None,
+               'rate'    : None,
+               'first'   : None,
+               'last'    : None,
+               'value'   : None,
+               'changed' : self.lastChange(),
+               'skipped' : self._skipped}
+
+        if len(t) == 0:
+            return ret
+
+        v = v.astype('f8')
+
+        ret.update({'min'   : float(v.min()),
+                    'max'   : float(v.max()),
+                    'mean'  : float(v.mean()),
+                    'first' : float(t[0]),
+                    'last'  : float(t[-1]),
+                    'value' : float(v[-1])})
+
+        if len(t) > 1:
+            dt  = t - t.mean()
+            den = float(np.dot(dt,dt))
+
+            if den > 0.0:
+                ret['rate'] = float(np.dot(dt, v - v.mean()) / den)
+
+        return ret
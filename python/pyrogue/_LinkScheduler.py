@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : PyRogue base module - Link Scheduler Class
+#-----------------------------------------------------------------------------
+# File       : pyrogue/_LinkScheduler.py
+# Created    : 2018-08-22
+#-----------------------------------------------------------------------------
+# Description:
+# Priority lanes for the transactions issued to a memory link.
+#
+# Each transaction runs in one of three lanes, selected per thread with
+# pyrogue.transactionLane():
+#    interactive : single variable set() and get() calls, the default
+#    config      : bulk root reads, writes and configuration loads
+#    poll        : background polling
+#
+# Interactive transactions are never held. Config transactions wait while
+# interactive transactions are pending on the link, poll transactions wait
+# while any interactive or config transactions are pending. A pending
+# transaction is one which has been started and not yet checked. Waits are
+# limited to maxYield seconds so lower lanes are not starved.
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import threading
+import time
+from contextlib import contextmanager
+
+TransactionLanes = ['interactive', 'config', 'poll']
+
+_laneLocal = threading.local()
+
+@contextmanager
+def transactionLane(lane):
+    """Run the transactions started by this thread within the block in the passed lane"""
+    if lane not in TransactionLanes:
+        raise ValueError(f"Invalid transaction lane {lane}. Supported: {TransactionLanes}")
+
+    old = getattr(_laneLocal, 'lane', 0)
+    _laneLocal.lane = TransactionLanes.index(lane)
+
+    try:
+        yield
+    finally:
+        _laneLocal.lane = old
+
+def currentLane():
+    """Index of the transaction lane of the calling thread"""
+    return getattr(_laneLocal, 'lane', 0)
+
+
+class LinkScheduler(object):
+    """
+    Priority gate for the transactions of one memory link. Each lane holds at
+    most maxPending[lane] transactions waiting for the gate. A droppable
+    transaction arriving at a full lane is dropped, this is only requested for
+    the reads of the poll workers, which poll the block at its next deadline.
+    Other transactions wait for room in their lane.
+    """
+
+    def __init__(self, *, maxYield=1.0, maxPending=(None, 64, 16)):
+        self._cond       = threading.Condition()
+        self._maxYield   = maxYield
+        self._maxPending = maxPending
+        self._pending    = [0] * len(TransactionLanes) # Started and not checked
+        self._waiting    = [0] * len(TransactionLanes) # Waiting for the gate
+
+        # Statistics
+        self._count    = [0] * len(TransactionLanes)
+        self._yields   = [0] * len(TransactionLanes)
+        self._dropped  = [0] * len(TransactionLanes)
+        self._waitTime = [0.0] * len(TransactionLanes)
+        self._maxWait  = [0.0] * len(TransactionLanes)
+
+    def _busy(self, lane):
+        return sum(self._pending[l] + self._waiting[l] for l in range(lane)) > 0
+
+    def acquire(self, lane, drop=False):
+        """
+        Wait until the passed lane may start a transaction.
+        Returns False if drop is set and the transaction is dropped.
+        """
+        with self._cond:
+            maxPending = self._maxPending[lane]
+
+            while maxPending is not None and self._waiting[lane] >= maxPending:
+                if drop:
+                    self._dropped[lane] += 1
+                    return False
+                self._cond.wait()
+
+            start = time.monotonic()
+            end   = start + self._maxYield
+
+            if self._busy(lane):
+                self._yields[lane]  += 1
+                self._waiting[lane] += 1
+
+                try:
+                    while self._busy(lane) and time.monotonic() < end:
+                        self._cond.wait(end - time.monotonic())
+                finally:
+                    self._waiting[lane] -= 1
+                    self._cond.notify_all()
+
+            wait = time.monotonic() - start
+
+            self._count[lane]    += 1
+            self._waitTime[lane] += wait
+            self._maxWait[lane]   = max(self._maxWait[lane], wait)
+
+            # Poll transactions are never waited on
+            if lane != len(TransactionLanes) - 1:
+                self._pending[lane] += 1
+
+            return True
+
+    def release(self, lane):
+        """Mark a transaction started after acquire() as checked"""
+        if lane != len(TransactionLanes) - 1:
+            with self._cond:
+                self._pending[lane] -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        """Return a dictionary of transaction statistics for each lane"""
+        with self._cond:
+            return {name : {'count'    : self._count[i],
+                            'pending'  : self._pending[i],
+                            'waiting'  : self._waiting[i],
+                            'yields'   : self._yields[i],
+                            'dropped'  : self._dropped[i],
+                            'waitTime' : self._waitTime[i],
+                            'maxWait'  : self._maxWait[i]}
+                    for i,name in enumerate(TransactionLanes)}
@@ -14,7 +14,6 @@
 # contained in the LICENSE.txt file.
 #-----------------------------------------------------------------------------
 import pyrogue as pr
-import Pyro4
 
 def wordCount(bits, wordSize):
     ret = bits // wordSize
@@ -56,7 +55,7 @@ class Model(object):
             #ba[i] = ba[i] & m[i]
         return ba
 
-@Pyro4.expose
+@pr.expose
 class UInt(Model):
     """Converts Unsigned Integer to and from bytearray"""
 #     def __init__(self, numBits=1, signed=False, endianness='little'):
@@ -94,7 +93,7 @@ class UInt(Model):
         return '{}{}'.format(cls.__name__, bitSize)
 
 
-@Pyro4.expose
+@pr.expose
 class Int(Model):
 
     defaultdisp = '{:d}'
@@ -139,7 +138,7 @@ class Int(Model):
     def name(cls, bitSize):
         return '{}{}'.format(cls.__name__, bitSize)
 
-@Pyro4.expose
+@pr.expose
 class Bool(Model):
     
     defaultdisp = {False: 'False', True: 'True'}
@@ -166,7 +165,7 @@ class Bool(Model):
         return '{}'.format(cls.__name__)
     
         
-@Pyro4.expose
+@pr.expose
 class String(Model):
 
     encoding = 'utf-8'
@@ -197,7 +196,7 @@ class String(Model):
         return '{}'.format(cls.__name__)
 
 
-@Pyro4.expose
+@pr.expose
 class Float(Model):
     """Converter for 32-bit float"""
 
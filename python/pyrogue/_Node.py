@@ -19,9 +19,7 @@ import logging
 import re
 import inspect
 import pyrogue as pr
-import Pyro4
 import functools as ft
-import parse
 import collections
 
 def logInit(cls=None,name=None):
@@ -41,6 +39,31 @@ class NodeError(Exception):
     """ Exception for node manipulation errors."""
     pass
 
+def expose(item):
+    """
+    Mark a method, property or class as remotely accessible.
+    Sets the same _pyroExposed marker as Pyro4.expose without
+    importing Pyro4, which is only loaded once a remote interface is used.
+    """
+    if isinstance(item,property):
+        for func in (item.fget, item.fset, item.fdel):
+            if func is not None:
+                func._pyroExposed = True
+        return item
+
+    if inspect.isclass(item):
+        for k,v in item.__dict__.items():
+            if not k.startswith('_'):
+                if inspect.isfunction(v):
+                    v._pyroExposed = True
+                elif isinstance(v,(staticmethod,classmethod)):
+                    v.__func__._pyroExposed = True
+                elif isinstance(v,property):
+                    expose(v)
+
+    item._pyroExposed = True
+    return item
+
 class Node(object):
     """
     Class which serves as a managed obect within the pyrogue package. 
@@ -76,32 +99,32 @@ class Node(object):
         # Setup logging
         self._log = logInit(self,name)
 
-    @Pyro4.expose
+    @expose
     @property
     def name(self):
         return self._name
 
-    @Pyro4.expose
+    @expose
     @property
     def description(self):
         return self._description
 
-    @Pyro4.expose
+    @expose
     @property
     def hidden(self):
         return self._hidden
 
-    @Pyro4.expose
+    @expose
     @hidden.setter
     def hidden(self, value):
         self._hidden = value
 
-    @Pyro4.expose
+    @expose
     @property
     def path(self):
         return self._path
 
-    @Pyro4.expose
+    @expose
     @property
     def expand(self):
         return self._expand
@@ -167,12 +190,12 @@ class Node(object):
         for i in range(number):
             self.add(nodeClass(name='{:s}[{:d}]'.format(name, i), offset=offset+(i*stride), **kwargs))
 
-    @Pyro4.expose
+    @expose
     @property
     def nodeList(self):
         return([k for k,v in self._nodes.items()])
 
-    @Pyro4.expose
+    @expose
     def getNodes(self,typ,exc=None,hidden=True):
         """
         Get a ordered dictionary of nodes.
@@ -183,7 +206,7 @@ class Node(object):
         return odict([(k,n) for k,n in self._nodes.items() \
             if (n._isinstance(typ) and ((exc is None) or (not n._isinstance(exc))) and (hidden or n.hidden == False))])
 
-    @Pyro4.expose
+    @expose
     @property
     def nodes(self):
         """
@@ -191,7 +214,7 @@ class Node(object):
         """
         return self._nodes
 
-    @Pyro4.expose
+    @expose
     @property
     def variables(self):
         """
@@ -199,7 +222,7 @@ class Node(object):
         """
         return self.getNodes(typ=pr.BaseVariable,exc=pr.BaseCommand,hidden=True)
 
-    @Pyro4.expose
+    @expose
     @property
     def visableVariables(self):
         """
@@ -207,7 +230,7 @@ class Node(object):
         """
         return self.getNodes(typ=pr.BaseVariable,exc=pr.BaseCommand,hidden=False)
 
-    @Pyro4.expose
+    @expose
     @property
     def variableList(self):
         """
@@ -221,7 +244,7 @@ class Node(object):
                 lst.extend(value.variableList)
         return lst
 
-    @Pyro4.expose
+    @expose
     @property
     def deviceList(self):
         """
@@ -235,7 +258,7 @@ class Node(object):
                 lst.extend(value.deviceList)
         return lst
 
-    @Pyro4.expose
+    @expose
     @property
     def commands(self):
         """
@@ -243,7 +266,7 @@ class Node(object):
         """
         return self.getNodes(pr.BaseCommand,hidden=True)
 
-    @Pyro4.expose
+    @expose
     @property
     def visableCommands(self):
         """
@@ -251,7 +274,7 @@ class Node(object):
         """
         return self.getNodes(pr.BaseCommand,hidden=False)
 
-    @Pyro4.expose
+    @expose
     @property
     def devices(self):
         """
@@ -259,7 +282,7 @@ class Node(object):
         """
         return self.getNodes(pr.Device,hidden=True)
 
-    @Pyro4.expose
+    @expose
     @property
     def visableDevices(self):
         """
@@ -267,7 +290,7 @@ class Node(object):
         """
         return self.getNodes(pr.Device,hidden=False)
 
-    @Pyro4.expose
+    @expose
     @property
     def parent(self):
         """
@@ -275,7 +298,7 @@ class Node(object):
         """
         return self._parent
 
-    @Pyro4.expose
+    @expose
     @property
     def root(self):
         """
@@ -283,21 +306,21 @@ class Node(object):
         """
         return self._root
 
-    @Pyro4.expose
+    @expose
     def node(self, path):
         return attrHelper(self._nodes,path)
 
-    @Pyro4.expose
+    @expose
     @property
     def isDevice(self):
         return isinstance(self,pr.Device)
 
-    @Pyro4.expose
+    @expose
     @property
     def isVariable(self):
         return (isinstance(self,pr.BaseVariable) and (not isinstance(self,pr.BaseCommand)))
 
-    @Pyro4.expose
+    @expose
     @property
     def isCommand(self):
         return isinstance(self,pr.BaseCommand)
@@ -365,10 +388,24 @@ class Node(object):
         self._root   = root
         self._path   = parent.path + '.' + self.name
 
-    def _exportNodes(self,daemon):
-        for k,n in self._nodes.items():
-            daemon.register(n)
-            n._exportNodes(daemon)
+    def _describe(self):
+        """
+        Return a dictionary of the static attributes of this node.
+        Used to send the tree structure to remote clients in bulk.
+        """
+        if self._bases is None:
+            self._bases = pr.genBaseList(self.__class__)
+
+        return {'name'        : self.name,
+                'path'        : self.path,
+                'description' : self.description,
+                'hidden'      : self.hidden,
+                'expand'      : self.expand,
+                'bases'       : self._bases,
+                'nodes'       : self.nodeList,
+                'isDevice'    : self.isDevice,
+                'isVariable'  : self.isVariable,
+                'isCommand'   : self.isCommand}
 
     def _getDict(self,modes):
         """
@@ -400,98 +437,6 @@ class Node(object):
     def _setTimeout(self,timeout):
         pass
 
-class PyroNode(object):
-    def __init__(self, *, root, node, daemon):
-        self._root   = root
-        self._node   = node
-        self._daemon = daemon
-
-    def __repr__(self):
-        return self._node.path
-
-    def __getattr__(self, name):
-        ret = self.node(name)
-        if ret is None:
-            return self._node.__getattr__(name)
-        else:
-            return ret
-
-    def __dir__(self):
-        return(super().__dir__() + self._node.nodeList)
-
-    def _convert(self,d):
-        ret = odict()
-        for k,n in d.items():
-
-            if isinstance(n,dict):
-                ret[k] = PyroNode(root=self._root,node=Pyro4.util.SerializerBase.dict_to_class(n),daemon=self._daemon)
-            else:
-                ret[k] = PyroNode(root=self._root,node=n,daemon=self._daemon)
-
-        return ret
-
-    def attr(self,attr,**kwargs):
-        return self.__getattr__(attr)(**kwargs)
-
-    def addInstance(self,node):
-        self._daemon.register(node)
-
-    def node(self, path):
-        ret = self._node.node(path)
-        if ret is None: 
-            return None
-        elif isinstance(ret,odict) or isinstance(ret,dict):
-            return self._convert(ret)
-        else:
-            return PyroNode(root=self._root,node=ret,daemon=self._daemon)
-
-    def getNodes(self,typ,exc=None,hidden=True):
-        excPass = str(exc) if exc is not None else None
-        return self._convert(self._node.getNodes(str(typ),excPass,hidden))
-
-    @property
-    def nodes(self):
-        return self._convert(self._node.nodes)
-
-    @property
-    def variables(self):
-        return self._convert(self._node.variables)
-
-    @property
-    def visableVariables(self):
-        return self._convert(self._node.visableVariables)
-
-    @property
-    def commands(self):
-        return self._convert(self._node.commands)
-
-    @property
-    def visableCommands(self):
-        return self._convert(self._node.visableCommands)
-
-    @property
-    def devices(self):
-        return self._convert(self._node.devices)
-
-    @property
-    def visableDevices(self):
-        return self._convert(self._node.visableDevices)
-
-    @property
-    def parent(self):
-        return PyroNode(root=self._root,node=self._node.parent,daemon=self._daemon)
-
-    @property
-    def root(self):
-        return self._root
-
-    def addListener(self, listener):
-        self.root._addRelayListener(self.path, listener)
-
-    def __call__(self,arg=None):
-        self._node.call(arg)
-
-
 def attrHelper(nodes,name):
     """
     Return a single item or a list of items matching the passed
@@ -520,6 +465,63 @@ def attrHelper(nodes,name):
             return ret
 
 
+def pathMatcher(patterns):
+    """
+    Return a function which tests a variable path against a list of patterns.
+    Patterns containing * or ? are globs matched against the full path,
+    where * matches any sequence of characters including '.'. Other patterns
+    match the path itself and all paths below it. A patterns value of None
+    matches everything, an empty list matches nothing.
+    """
+    return PathMatcher(patterns)
+
+
+class PathMatcher(object):
+    """
+    Callable returned by pathMatcher(). Subtree patterns are held in a set and
+    a path is tested by looking up the path and each of its parents. Only the
+    glob patterns are compiled into a regular expression. add() extends the
+    patterns without rebuilding the subtree set.
+    """
+
+    def __init__(self, patterns):
+        self._all   = False
+        self._paths = set()
+        self._globs = []
+        self._regex = None
+        self.add(patterns)
+
+    def add(self, patterns):
+        """Add a list of patterns, None matches everything"""
+        if patterns is None:
+            self._all = True
+            return
+
+        globs = [p for p in patterns if ('*' in p or '?' in p) and p not in self._globs]
+        self._paths.update(p for p in patterns if not ('*' in p or '?' in p))
+
+        if len(globs) > 0:
+            self._globs.extend(globs)
+
+            exp = [''.join('.*' if c == '*' else '.' if c == '?' else re.escape(c) for c in p) for p in self._globs]
+            self._regex = re.compile('(?:' + '|'.join(exp) + r')\Z', re.DOTALL)
+
+    def __call__(self, path):
+        if self._all or path in self._paths:
+            return True
+
+        if len(self._paths) > 0:
+            i = path.rfind('.')
+
+            while i > 0:
+                if path[:i] in self._paths:
+                    return True
+
+                i = path.rfind('.', 0, i)
+
+        return self._regex is not None and self._regex.match(path) is not None
+
+
 def nodeMatch(nodes,name):
     """
     Return a list of nodes which match the given name. The name can either
@@ -16,57 +16,207 @@
 import sys
 import threading
 import collections
-import datetime
-import itertools
-import heapq
+import time
+import math
+import zlib
 import rogue.interfaces.memory
 import pyrogue as pr
 
 class PollQueueEntry(object):
-    def __init__(self, readTime, count, interval, block):
+    def __init__(self, readTime, interval, block):
         self.readTime = readTime
-        self.count    = count
         self.interval = interval
+        self.period   = interval # Current interval, larger than interval while backed off
+        self.changes  = 0        # Block change count at the last poll
         self.block    = block
 
-    def __lt__(self,other):
-        return self.readTime < other.readTime
+        # Fraction of the interval by which the poll times of the entry are offset
+        self.phase = 0.0
+
+        # Demand driven polling
+        self.consumers = 0
+        self.needed    = True
+        self.paused    = False
+
+        # Statistics
+        self.polls       = 0
+        self.lateness    = 0.0
+        self.maxLateness = 0.0
+        self.overruns    = 0
+        self.dropped     = 0
+
+        # Timer wheel position
+        self._slot = None
+        self._tick = 0
+
+
+class TimerWheel(object):
+    """
+    Hashed timing wheel of poll entries. An entry is stored in the slot of the
+    tick which contains its readTime, so adding and removing an entry is O(1).
+    Entries more than one revolution ahead stay in their slot until the wheel
+    reaches their tick. Entries which are already due when added are kept apart
+    and returned by the next expire() call.
+    """
+
+    def __init__(self, *, tick=0.01, slots=1024, start=None):
+        self._tick  = tick
+        self._slots = [{} for i in range(slots)]
+        self._due   = {}
+        self._count = 0
+        self._cur   = math.floor((time.monotonic() if start is None else start) / tick) - 1
+
+    def __len__(self):
+        return self._count
+
+    def add(self, entry):
+        t = math.floor(entry.readTime / self._tick)
+
+        if t <= self._cur:
+            entry._slot = self._due
+        else:
+            entry._slot = self._slots[t % len(self._slots)]
+
+        entry._tick = t
+        entry._slot[entry] = None
+        self._count += 1
+
+    def remove(self, entry):
+        if entry._slot is not None:
+            del entry._slot[entry]
+            entry._slot = None
+            self._count -= 1
+
+    def expire(self, limit):
+        """Remove and return the entries whose readTime is at or before limit"""
+        end = math.floor(limit / self._tick)
+        ret = list(self._due)
+        self._due.clear()
+
+        for t in range(self._cur + 1, min(end, self._cur + len(self._slots)) + 1):
+            slot = self._slots[t % len(self._slots)]
+
+            if len(slot) > 0:
+                exp = [e for e in slot if e._tick < end or (e._tick == end and e.readTime <= limit)]
+
+                for e in exp:
+                    del slot[e]
+
+                ret.extend(exp)
+
+        for e in ret:
+            e._slot = None
+
+        # The tick containing limit is checked again by the next call
+        self._count -= len(ret)
+        self._cur = max(self._cur, end - 1)
+        return ret
+
+    def nextTime(self):
+        """Earliest readTime in the wheel, None if the wheel is empty"""
+        if self._count == 0:
+            return None
+
+        if len(self._due) > 0:
+            return min(e.readTime for e in self._due)
+
+        for t in range(self._cur + 1, self._cur + len(self._slots) + 1):
+            ret = [e.readTime for e in self._slots[t % len(self._slots)] if e._tick == t]
+
+            if len(ret) > 0:
+                return min(ret)
+
+        # Only entries more than one revolution ahead
+        return (self._cur + len(self._slots)) * self._tick
 
-    def __gt__(self,other):
-        return self.readTime > other.readTime
 
 class PollQueue(object):
+    """
+    Schedules periodic block reads. Deadlines are kept on the monotonic clock
+    so wall clock adjustments do not affect polling. When an entry is polled
+    after one or more of its deadlines have passed, the root PollPolicy variable
+    selects the next deadline:
+        skip     : skip the missed deadlines and keep the original phase
+        catchUp  : poll once for each missed deadline
+        coalesce : poll once and restart the interval from the poll time
+
+    Entries which expire within the root PollWindow are polled together on the
+    same tick. Their reads are ordered by memory slave and address and, when the
+    root PollMerge variable is set, address contiguous blocks are read in a
+    single transaction, see pyrogue.groupBlocks().
+
+    When the root PollAdaptive variable is set, the interval of a remote block
+    whose data did not change in a poll is multiplied by Backoff, up to the root
+    PollMaxInterval. The block returns to its base interval when its data
+    changes or when a listener subscribes to one of its variables.
+
+    Blocks are polled by a PollWorker thread per poll group, so a link which
+    times out only delays the polling of its own blocks. The poll group of a
+    block is the pollGroup of its closest device which sets one, otherwise
+    the memory slave of the block. Local blocks without a pollGroup share
+    one worker.
+
+    Each block is polled once when it is added. Later polls are offset within
+    the interval by a phase taken from a hash of the device path, so blocks
+    with the same interval do not all poll at the same instant. Blocks of the
+    same device share a phase and can still be merged. The root PollSpread
+    variable turns the phase offsets off.
+
+    When the root PollOnDemand variable is set, blocks are only polled while
+    they have consumers, see updateConsumers(). Variables with pollAlways set
+    or with a history keep their block polled, for example for logging.
+    """
+
+    Policies = ['skip', 'catchUp', 'coalesce']
+    Backoff  = 2.0
 
     def __init__(self,*, root):
-        self._pq = [] # The heap queue
-        self._entries = {} # {Block: Entry} mapping to look up if a block is already in the queue
-        self._counter = itertools.count()
+        self._workers = {} # {group: PollWorker}
+        self._entries = {} # {Block: PollWorker} mapping to look up the worker of a block
+        self._intervals = {} # {Block: {Variable: pollInterval}} of the polled variables of each block
+        self._minInterval = {} # {Block: interval} cached poll interval of each block
         self._lock = threading.RLock()
-        self._update = threading.Condition()
-        self._run = True
+        self._run = False
         self._root = root
-        self._pollThread = threading.Thread(target=self._poll)
 
         # Setup logging
         self._log = pr.logInit(self)
 
     def _start(self):
-        self._pollThread.start()
+        with self._lock:
+            self._run = True
+            for w in self._workers.values():
+                w._start()
         self._log.info("PollQueue Started")
 
-    def _addEntry(self, block, interval):
+    def _group(self, block):
+        dev = block._device
+
+        while isinstance(dev, pr.Device):
+            if dev.pollGroup is not None:
+                return dev.pollGroup
+
+            if dev is self._root:
+                break
+
+            dev = dev.parent
+
+        if isinstance(block, pr.RemoteBlock):
+            return block._reqSlaveId()
+        else:
+            return None
+
+    def _worker(self, block):
         with self._lock:
-            timedelta = datetime.timedelta(seconds=interval)
-            # new entries are always polled first immediately 
-            # (rounded up to the next second)
-            readTime = datetime.datetime.now()
-            readTime = readTime.replace(microsecond=0)
-            entry = PollQueueEntry(readTime, next(self._counter), timedelta, block)
-            self._entries[block] = entry
-            heapq.heappush(self._pq, entry)
-            # Wake up the thread
-            with self._update:
-                self._update.notify()
+            group = self._group(block)
+
+            if group not in self._workers:
+                self._workers[group] = PollWorker(queue=self, group=group)
+
+                if self._run:
+                    self._workers[group]._start()
+
+            return self._workers[group]
 
     def updatePollInterval(self, var):
         with self._lock:
@@ -74,47 +224,280 @@ class PollQueue(object):
             # Special case: Variable has no block and just depends on other variables
             # Then do update on each dependency instead
             if not hasattr(var, '_block') or var._block is None:
-                if len(var.dependencies) > 0:
+                if var.pollInterval > 0:
                     for dep in var.dependencies:
                         if dep.pollInterval == 0 or var.pollInterval < dep.pollInterval:
                             dep.pollInterval = var.pollInterval
 
                 return
 
-            if var._block in self._entries.keys():
-                oldInterval = self._entries[var._block].interval
-                blockVars = [v for v in var._block._variables if v.pollInterval > 0]
-                if len(blockVars) > 0:
-                    minVar = min(blockVars, key=lambda x: x.pollInterval)
-                    newInterval = datetime.timedelta(seconds=minVar.pollInterval)
-                    # If block interval has changed, invalidate the current entry for the block
-                    # and re-add it with the new interval
-                    if newInterval != oldInterval:
-                        self._entries[var._block].block = None
-                        self._addEntry(var._block, minVar.pollInterval)
-                else:
-                    # No more variables belong to block entry, can remove it
-                    self._entries[var._block].block = None
+            block = var._block
+
+            # Variable which has never been polled
+            if var.pollInterval == 0 and var not in self._intervals.get(block, {}):
+                return
+
+            ivals = self._intervals.setdefault(block, {})
+            old   = ivals.pop(var, None)
+
+            if var.pollInterval > 0:
+                ivals[var] = var.pollInterval
+
+            # No more polled variables belong to block entry, can remove it
+            if len(ivals) == 0:
+                del self._intervals[block]
+                del self._minInterval[block]
+                self._entries.pop(block)._removeEntry(block)
+                return
+
+            # The block interval is only recomputed when the variable with the minimum interval changes
+            cur = self._minInterval.get(block)
+
+            if cur is None or old == cur:
+                new = min(ivals.values())
             else:
+                new = min(cur, ivals.get(var, cur))
+
+            self._minInterval[block] = new
+
+            if block not in self._entries:
                 # Pure entry add
-                self._addEntry(var._block, var.pollInterval)
+                worker = self._worker(block)
+                worker._addEntry(block, new)
+                self._entries[block] = worker
+
+                if self._root.PollOnDemand.value():
+                    self._updateConsumers(block, self._root._getVarListeners(), {})
+
+            elif new != cur:
+                # Block interval has changed, reschedule the block with the new interval
+                self._entries[block]._addEntry(block, new)
+
+    def updateConsumers(self):
+        """
+        Count the consumers of each polled block: the listeners of its variables,
+        the root listeners whose patterns match its variables and the consumers of
+        variables which listen to its variables. Called by the root when listeners
+        are added, removed or change their patterns. Polling of a block is paused
+        while it is not needed and resumes immediately when it is.
+        """
+        with self._lock:
+            listeners = self._root._getVarListeners()
+            memo = {}
+
+            for block in self._entries:
+                self._updateConsumers(block, listeners, memo)
+
+    def updateVarConsumers(self, var):
+        """
+        Update the blocks of the passed variable and of the variables it listens to,
+        after a listener is added to the variable. Their consumers are recounted with
+        PollOnDemand set and they return to their base interval with PollAdaptive set.
+        No other blocks are visited.
+        """
+        with self._lock:
+            blocks = {v._block for v in self._root._varUp.get(var,(var,)) if v._block in self._entries}
+
+            if self._root.PollOnDemand.value():
+                listeners = self._root._getVarListeners()
+                memo = {}
+
+                for block in blocks:
+                    self._updateConsumers(block, listeners, memo)
+
+            if self._root.PollAdaptive.value():
+                for block in blocks:
+                    self._entries[block]._resetEntry(block)
+
+    def _updateConsumers(self, block, listeners, memo):
+        if self._root.PollOnDemand.value():
+            count  = sum(self._consumers(v, listeners, memo) for v in block._variables)
+            needed = count > 0 or any(v.pollAlways or v.historySize > 0 for v in block._variables)
+        else:
+            count  = 0
+            needed = True
+
+        self._entries[block]._setConsumers(block, count, needed)
+
+    def _consumers(self, var, listeners, memo):
+        if var not in memo:
+            memo[var] = 0 # Guards against listener loops
+            memo[var] = len(var._listenerFuncs) + \
+                        sum(1 for l in listeners if l._patterns is None or l._match(var.path)) + \
+                        sum(self._consumers(v, listeners, memo) for v in var._listenerVars)
+
+        return memo[var]
+
+    def resetInterval(self, match=None):
+        """
+        Return backed off blocks to their base interval and poll them now.
+        match is an optional function which is passed each variable path of a block,
+        see pyrogue.pathMatcher(). Default is all blocks.
+        """
+        with self._lock:
+            for block, worker in self._entries.items():
+                if match is None or any(match(v.path) for v in block._variables):
+                    worker._resetEntry(block)
+
+    @property
+    def workers(self):
+        """Dictionary of poll workers keyed by poll group"""
+        with self._lock:
+            return dict(self._workers)
+
+    def stats(self):
+        """
+        Return a dictionary of poll statistics for each block, keyed by the path
+        of the first variable of the block.
+        lateness is the delay of the last poll after its deadline in seconds,
+        overruns is the number of polls which occured after the following
+        deadline had already passed, dropped is the number of polls dropped
+        because the poll lane of the link was full, group is the poll group of the block and
+        period is the current interval of the block with adaptive polling,
+        consumers is the consumer count and paused is True while the block is
+        not polled because it has no consumers.
+        """
+        ret = {}
+        for w in self.workers.values():
+            ret.update(w.stats())
+        return ret
+
+    @property
+    def lateness(self):
+        """Largest lateness of the last poll of each entry"""
+        return max([w.lateness for w in self.workers.values()], default=0.0)
+
+    @property
+    def maxLateness(self):
+        return max([w.maxLateness for w in self.workers.values()], default=0.0)
+
+    @property
+    def overruns(self):
+        return sum(w.overruns for w in self.workers.values())
+
+    def empty(self):
+        return all(w.empty() for w in self.workers.values())
+
+    def stop(self):
+        with self._lock:
+            self._run = False
+            for w in self._workers.values():
+                w.stop()
+
+
+class PollWorker(object):
+    """Polls the blocks of one poll group from its own thread"""
+
+    def __init__(self,*, queue, group):
+        self._wheel = TimerWheel()
+        self._entries = {} # {Block: Entry} mapping to look up if a block is already in the queue
+        self._lock = threading.RLock()
+        self._update = threading.Condition()
+        self._run = True
+        self._group = group
+        self._root = queue._root
+        self._pollThread = threading.Thread(target=self._poll, name=f'PollWorker[{group}]')
+
+        # Setup logging
+        self._log = queue._log
+
+    @property
+    def group(self):
+        return self._group
+
+    def _start(self):
+        self._pollThread.start()
+        self._log.info(f"PollWorker {self._group} Started")
+
+    def _addEntry(self, block, interval):
+        with self._lock:
+            old = self._entries.get(block)
+
+            # Remove any current entry for the block
+            self._removeEntry(block)
+
+            # new entries are always polled first immediately
+            entry = PollQueueEntry(time.monotonic(), interval, block)
+            self._entries[block] = entry
+
+            if self._root.PollSpread.value():
+                entry.phase = PollWorker._phase(block)
+
+            if old is not None:
+                entry.consumers = old.consumers
+                entry.needed    = old.needed
+
+            if entry.needed:
+                self._schedule(entry)
+            else:
+                entry.paused = True
+
+    def _removeEntry(self, block):
+        with self._lock:
+            if block in self._entries:
+                entry = self._entries.pop(block)
+                self._wheel.remove(entry)
+
+                # Marks an entry which is being polled as removed
+                entry.block = None
+
+    @staticmethod
+    def _phase(block):
+        """Deterministic phase in [0,1) for the blocks of a device"""
+        dev = block._device
+        return zlib.crc32(dev.path.encode('utf-8')) / float(1 << 32)
+
+    def _schedule(self, entry):
+        self._wheel.add(entry)
+
+        # Wake up the thread
+        with self._update:
+            self._update.notify()
+
+    def _setConsumers(self, block, count, needed):
+        with self._lock:
+            entry = self._entries[block]
+            entry.consumers = count
+            entry.needed    = needed
+
+            # Paused entries are not in the wheel
+            if needed and entry.paused:
+                entry.paused   = False
+                entry.readTime = time.monotonic()
+                self._schedule(entry)
+
+            elif not needed and not entry.paused:
+                entry.paused = True
+                self._wheel.remove(entry)
+
+    def _resetEntry(self, block):
+        with self._lock:
+            entry = self._entries[block]
+
+            if entry.period != entry.interval:
+                entry.period   = entry.interval
+                entry.readTime = min(entry.readTime, time.monotonic())
+
+                if not entry.paused:
+                    self._wheel.remove(entry)
+                    self._schedule(entry)
 
     def _poll(self):
         """Run by the poll thread"""
         while True:
-            now = datetime.datetime.now()
+            with self._lock:
+                nextTime = self._wheel.nextTime()
 
-            if self.empty() is True:
+            if nextTime is None:
                 # Sleep until woken
                 with self._update:
                     self._update.wait()
             else:
-                # Sleep until the top entry is ready to be polled
+                # Sleep until the next entry is ready to be polled
                 # Or a new entry is added by updatePollInterval
-                readTime = self.peek().readTime
-                waitTime = (readTime - now).total_seconds()
+                waitTime = nextTime - time.monotonic()
                 with self._update:
-                    self._log.debug(f'Poll thread sleeping for {waitTime}')
+                    self._log.debug(f'Poll thread {self._group} sleeping for {waitTime}')
                     self._update.wait(waitTime)
 
             self._log.debug(f'Global reference count: {sys.getrefcount(None)}')
@@ -122,62 +505,153 @@ class PollQueue(object):
             with self._lock:
                 # Stop the thread if someone set run to False
                 if self._run is False:
-                    self._log.info("PollQueue thread exiting")
+                    self._log.info(f"PollWorker {self._group} thread exiting")
                     return
 
-                # Start update capture
-                with self._root.updateGroup():
-
-                    # Pop all timed out entries from the queue
-                    now = datetime.datetime.now()
-                    blockEntries = []
-                    for entry in self._expiredEntries(now):
-                        self._log.debug(f'Polling Block {entry.block.name}')
-                        blockEntries.append(entry)
-                        try:
-                            entry.block.startTransaction(rogue.interfaces.memory.Read, check=False)
-                        except Exception as e:
-                            self._log.exception(e)
-
-                        # Update the entry with new read time
-                        entry.readTime += entry.interval
-                        entry.count = next(self._counter)
-                        # Push the updated entry back into the queue
-                        heapq.heappush(self._pq, entry)
+                # Remove all entries which expire within the poll window from the wheel
+                now = time.monotonic()
+                policy = self._root.PollPolicy.value()
+                entries = self._wheel.expire(now + self._root.PollWindow.value())
+
+                for entry in entries:
+                    self._log.debug(f'Polling Block {entry.block.name}')
+
+                    # Update the entry with new read time and add it back to the wheel
+                    entry.readTime = self._nextTime(entry, now, policy)
+                    self._wheel.add(entry)
+
+                blocks = [e.block for e in entries]
+
+            # Transactions are run outside of the lock so updatePollInterval
+            # does not wait on a timing out link
+
+            with self._root.updateGroup(), pr.transactionLane('poll'):
 
+                # Start all reads, ordered by memory slave and address, before checking any
+                # Each read yields to interactive and configuration transactions on its link
+                try:
+                    txns = pr.groupBlocks(blocks, merge=self._root.PollMerge.value())
+                except Exception as e:
+                    self._log.exception(e)
+                    txns = blocks
+
+                started = []
+                for txn in txns:
                     try:
-                        for entry in blockEntries:
-                            entry.block._checkTransaction()
+                        if txn.startTransaction(rogue.interfaces.memory.Read, check=False, drop=True):
+                            started.append(txn)
+                        else:
+                            self._dropped(txn)
                     except Exception as e:
                         self._log.exception(e)
 
-    def _expiredEntries(self, time=None):
-        """An iterator of all entries that expire by a given time. 
-        Use datetime.now() if no time provided. Each entry is popped from the queue before being 
-        yielded by the iterator
-        """
+                for txn in started:
+                    try:
+                        txn._checkTransaction()
+                    except Exception as e:
+                        self._log.exception(e)
+
+            if self._root.PollAdaptive.value():
+                self._adapt(entries, self._root.PollMaxInterval.value())
+
+    def _dropped(self, txn):
+        """Count a read dropped by the link scheduler, the blocks are polled at their next deadline"""
+        self._log.debug(f'Dropped poll of {txn.name}')
+
+        with self._lock:
+            for b in getattr(txn, 'blocks', [txn]):
+                if b in self._entries:
+                    self._entries[b].dropped += 1
+
+    def _adapt(self, entries, maxInterval):
+        """Back off the entries whose block data did not change in the last poll"""
         with self._lock:
-            if time == None:
-                time = datetime.datetime.now()
-            while self.empty() is False and self.peek().readTime <= time:
-                entry = heapq.heappop(self._pq)
-                if entry.block is not None:
-                    yield entry
+            for entry in entries:
+                if entry.block is None or not isinstance(entry.block, pr.RemoteBlock):
+                    continue
 
+                count = entry.block._changeCount
 
-    def peek(self):
+                if count != entry.changes:
+                    period = entry.interval
+                else:
+                    period = max(entry.interval, min(entry.period * PollQueue.Backoff, maxInterval))
+
+                entry.changes = count
+
+                if period != entry.period:
+                    entry.readTime += period - entry.period
+                    entry.period    = period
+
+                    if not entry.paused:
+                        self._wheel.remove(entry)
+                        self._wheel.add(entry)
+
+    def _nextTime(self, entry, now, policy):
+        """Update the entry statistics and return its next deadline"""
+        # Entries polled early within the poll window are not late
+        late = max(0.0, now - entry.readTime)
+
+        entry.polls      += 1
+        entry.lateness    = late
+        entry.maxLateness = max(entry.maxLateness, late)
+
+        # The first poll is immediate, following polls are at the phase of the entry
+        if entry.polls == 1:
+            offset = entry.phase * entry.period
+            return now + ((offset - now) % entry.period or entry.period)
+
+        nextTime = entry.readTime + entry.period
+
+        if nextTime > now:
+            return nextTime
+
+        missed = int(late // entry.period)
+        entry.overruns += 1
+
+        if policy == 'catchUp':
+            return nextTime
+        elif policy == 'coalesce':
+            return now + entry.period
+        else:
+            return entry.readTime + (missed + 1) * entry.period
+
+    def stats(self):
+        """Return a dictionary of poll statistics for each block, see PollQueue.stats()"""
         with self._lock:
-            if self.empty() is False:
-                return self._pq[0]
-            else:
-                return None
+            return {e.block._variables[0].path : {'group'       : self._group,
+                                                  'interval'    : e.interval,
+                                                  'period'      : e.period,
+                                                  'polls'       : e.polls,
+                                                  'lateness'    : e.lateness,
+                                                  'maxLateness' : e.maxLateness,
+                                                  'overruns'    : e.overruns,
+                                                  'dropped'     : e.dropped,
+                                                  'consumers'   : e.consumers,
+                                                  'paused'      : e.paused}
+                    for e in self._entries.values()}
+
+    @property
+    def lateness(self):
+        """Largest lateness of the last poll of each entry"""
+        with self._lock:
+            return max([e.lateness for e in self._entries.values()], default=0.0)
+
+    @property
+    def maxLateness(self):
+        with self._lock:
+            return max([e.maxLateness for e in self._entries.values()], default=0.0)
+
+    @property
+    def overruns(self):
+        with self._lock:
+            return sum(e.overruns for e in self._entries.values())
 
     def empty(self):
         with self._lock:
-            return len(self._pq)==0
+            return len(self._wheel)==0
 
     def stop(self):
         with self._lock, self._update:
             self._run = False
             self._update.notify()
-
@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : PyRogue base module - Pyro Classes
+#-----------------------------------------------------------------------------
+# File       : pyrogue/_Pyro.py
+# Created    : 2017-05-16
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to 
+# the license terms in the LICENSE.txt file found in the top-level directory 
+# of this distribution and at: 
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html. 
+# No part of the rogue software platform, including this file, may be 
+# copied, modified, propagated, or distributed except according to the terms 
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict as odict
+import pyrogue as pr
+import Pyro4
+import Pyro4.naming
+
+# Marks a prefetched value which has been returned
+_Used = object()
+
+# Seconds after which a prefetched value is discarded and fetched again
+PrefetchAge = 1.0
+
+# Node attributes which never change and are served from the cached tree structure
+_StaticAttrs = {'name', 'description', 'expand', 'isDevice', 'isVariable', 'isCommand',
+                'mode', 'typeStr', 'disp', 'enum', 'units', 'minimum', 'maximum', 'urgent', 'arg'}
+
+# Tree structures downloaded by this process, keyed by structure hash
+_structureCache = {}
+
+_log = pr.logInit(name='Pyro')
+
+class PyroNode(object):
+    def __init__(self, *, root, node, daemon, path=None):
+        self._root     = root
+        self._node     = node
+        self._daemon   = daemon
+        self._path     = path
+        self._prefetch = None
+
+    def __repr__(self):
+        return self.path
+
+    def __getattr__(self, name):
+        meta = self._root._structure.get(self.path)
+
+        # Static attributes and non node names are resolved without a node lookup
+        if meta is not None:
+            if name in _StaticAttrs and name in meta:
+                return meta[name]
+
+            if not any(k == name or k.startswith(name + '[') for k in meta['nodes']):
+                return self._node.__getattr__(name)
+
+        ret = self.node(name)
+        if ret is None:
+            return self._node.__getattr__(name)
+        else:
+            return ret
+
+    def __dir__(self):
+        return(super().__dir__() + self.nodeList)
+
+    @property
+    def nodeList(self):
+        meta = self._root._structure.get(self.path)
+
+        if meta is not None:
+            return list(meta['nodes'])
+        else:
+            return self._node.nodeList
+
+    def _convert(self,d,prefetch=False,array=None):
+        """
+        Wrap a dictionary of remote nodes. With prefetch=True the current values
+        of the nodes are fetched in a single call and returned by the first
+        value() and valueDisp() call of each wrapper within PrefetchAge seconds.
+        array is the base name when the keys are array indexes.
+        """
+        ret = odict()
+        for k,n in d.items():
+
+            if isinstance(n,dict):
+                n = Pyro4.util.SerializerBase.dict_to_class(n)
+
+            name = k if array is None else '{}[{}]'.format(array,k)
+            ret[k] = PyroNode(root=self._root,node=n,daemon=self._daemon,path=self.path + '.' + name)
+
+        if prefetch and len(ret) > 0:
+            vals  = self._root._node.getMany([n.path for n in ret.values()],False,True)
+            stamp = time.monotonic()
+
+            for n in ret.values():
+                if n.path in vals:
+                    n._prefetch = list(vals[n.path]) + [stamp]
+
+        return ret
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = self._node.path
+        return self._path
+
+    def _takePrefetch(self, idx):
+        """Return the prefetched value (0) or display string (1) once, _Used if there is none or it is too old"""
+        if self._prefetch is None:
+            return _Used
+
+        if time.monotonic() - self._prefetch[2] > PrefetchAge:
+            self._prefetch = None
+            return _Used
+
+        ret, self._prefetch[idx] = self._prefetch[idx], _Used
+        return ret
+
+    def value(self):
+        ret = self._takePrefetch(0)
+        if ret is not _Used:
+            return ret
+        return self._node.value()
+
+    def valueDisp(self, read=True):
+        ret = self._takePrefetch(1)
+        if ret is not _Used:
+            return ret
+        return self._node.valueDisp()
+
+    def snapshot(self, modes=['RW','RO','WO'], read=False):
+        return self._root._node.snapshot(self.path,modes,read)
+
+    def describe(self):
+        return self._root._node.describe(self.path)
+
+    def attr(self,attr,**kwargs):
+        return self.__getattr__(attr)(**kwargs)
+
+    def addInstance(self,node):
+        self._daemon.register(node)
+
+    def node(self, path):
+        ret = self._node.node(path)
+        if ret is None: 
+            return None
+        elif isinstance(ret,odict) or isinstance(ret,dict):
+            return self._convert(ret,array=path)
+        else:
+            return PyroNode(root=self._root,node=ret,daemon=self._daemon,path=self.path + '.' + path)
+
+    def getNodes(self,typ,exc=None,hidden=True):
+        excPass = str(exc) if exc is not None else None
+        return self._convert(self._node.getNodes(str(typ),excPass,hidden))
+
+    @property
+    def nodes(self):
+        return self._convert(self._node.nodes)
+
+    @property
+    def variables(self):
+        return self._convert(self._node.variables,True)
+
+    @property
+    def visableVariables(self):
+        return self._convert(self._node.visableVariables,True)
+
+    @property
+    def commands(self):
+        return self._convert(self._node.commands)
+
+    @property
+    def visableCommands(self):
+        return self._convert(self._node.visableCommands)
+
+    @property
+    def devices(self):
+        return self._convert(self._node.devices)
+
+    @property
+    def visableDevices(self):
+        return self._convert(self._node.visableDevices)
+
+    @property
+    def parent(self):
+        return PyroNode(root=self._root,node=self._node.parent,daemon=self._daemon)
+
+    @property
+    def root(self):
+        return self._root
+
+    def addListener(self, listener):
+        self.root._addRelayListener(self.path, listener)
+
+    def __call__(self,arg=None):
+        self._node.call(arg)
+
+
+class PyroRoot(PyroNode):
+    def __init__(self, *, node,daemon):
+        self._structure = {}
+
+        pr.PyroNode.__init__(self,root=self,node=node,daemon=daemon)
+
+        self._varListeners   = []
+        self._relayListeners = {}
+        self._patterns       = set()
+        self._patternLock    = threading.Lock()
+
+    def addInstance(self,node):
+        self._daemon.register(node)
+
+    def getNode(self, path):
+        return PyroNode(root=self,node=self._node.getNode(path),daemon=self._daemon,path=path)
+
+    def getMany(self, paths, read=True, disp=False):
+        return self._node.getMany(paths,read,disp)
+
+    def setMany(self, values, write=True, disp=False):
+        self._node.setMany(values,write,disp)
+
+    def snapshot(self, path=None, modes=['RW','RO','WO'], read=False):
+        return self._node.snapshot(path,modes,read)
+
+    def history(self, path, count=None, since=None):
+        return self._node.history(path,count,since)
+
+    def historyStats(self, path, count=None, since=None):
+        return self._node.historyStats(path,count,since)
+
+    def changedSince(self, path, stamp):
+        return self._node.changedSince(path,stamp)
+
+    def describe(self, path=None):
+        return self._node.describe(path)
+
+    def addVarListener(self,listener,patterns=None):
+        """
+        Add a listener for updates matching the passed path patterns, default is all paths.
+        Only updates matching the patterns of at least one listener are sent by the server.
+        """
+        self._varListeners.append((listener,pr.pathMatcher(patterns)))
+        self._subscribe(['*'] if patterns is None else patterns)
+
+    def removeVarListener(self,listener):
+        """
+        Remove a listener previously passed to addVarListener().
+        The server stops sending updates once no listeners are left.
+        """
+        self._varListeners = [l for l in self._varListeners if l[0] != listener]
+
+        with self._patternLock:
+            if len(self._varListeners) == 0 and len(self._relayListeners) == 0 and len(self._patterns) > 0:
+                self._patterns.clear()
+                self._node.removeVarListener(self)
+
+    def _subscribe(self, patterns):
+        with self._patternLock:
+            new = [p for p in patterns if p not in self._patterns]
+
+            if len(new) == 0:
+                return
+
+            self._patterns.update(new)
+            self._node.addVarListenerPatterns(self,new)
+
+    def _loadStructure(self, cacheDir=None):
+        """
+        Load the static tree structure, keyed by the structure hash of the remote root.
+        The structure is downloaded once per process, or once per cacheDir if passed.
+        """
+        h = self._node.structureHash()
+        fname = None if cacheDir is None else os.path.join(cacheDir,'pyrogue_{}.pickle'.format(h))
+
+        if h not in _structureCache and fname is not None and os.path.isfile(fname):
+            try:
+                with open(fname,'rb') as f:
+                    _structureCache[h] = pickle.load(f)
+            except Exception as e:
+                _log.warning("Removing unreadable structure cache {}: {}".format(fname,e))
+
+                try:
+                    os.remove(fname)
+                except OSError:
+                    pass
+
+        if h not in _structureCache:
+            _structureCache[h] = dict(self._node.describe(None))
+
+            if fname is not None:
+                try:
+                    os.makedirs(cacheDir,exist_ok=True)
+                    with open(fname,'wb') as f:
+                        pickle.dump(_structureCache[h],f)
+                except Exception as e:
+                    _log.warning("Failed to write structure cache {}: {}".format(fname,e))
+
+        self._structure = _structureCache[h]
+
+    def _addRelayListener(self, path, listener):
+        if not path in self._relayListeners:
+            self._relayListeners[path] = []
+
+        self._relayListeners[path].append(listener)
+        self._subscribe([path])
+
+    @pr.expose
+    def varListenerBatch(self, entries):
+        for path,value,disp in entries:
+            self.varListener(path,value,disp)
+
+    @pr.expose
+    def varListener(self, path, value, disp):
+        for f,match in self._varListeners:
+            if match(path):
+                f.varListener(path=path, value=value, disp=disp)
+
+        if path in self._relayListeners:
+            for f in self._relayListeners[path]:
+                f.varListener(path=path, value=value, disp=disp)
+
+class PyroClient(object):
+    """
+    Connects to remote roots through the Pyro name server.
+    The static structure of each root is downloaded once. Pass cacheDir
+    to also keep a copy on disk for later sessions.
+    """
+    def __init__(self, group, localAddr=None, nsAddr=None, cacheDir=None):
+        self._group    = group
+        self._cacheDir = cacheDir
+
+        Pyro4.config.THREADPOOL_SIZE = 100
+        Pyro4.config.SERVERTYPE = "multiplex"
+        Pyro4.config.POLLTIMEOUT = 3
+
+        Pyro4.util.SerializerBase.register_dict_to_class("collections.OrderedDict", recreate_OrderedDict)
+
+        if nsAddr is None:
+            nsAddr = localAddr
+
+        try:
+            self._ns = Pyro4.locateNS(host=nsAddr)
+        except:
+            raise pr.NodeError("PyroClient Failed to find nameserver")
+
+        self._pyroDaemon = Pyro4.Daemon(host=localAddr)
+
+        self._pyroThread = threading.Thread(target=self._pyroDaemon.requestLoop)
+        self._pyroThread.start()
+
+    def stop(self):
+        self._pyroDaemon.shutdown()
+
+    def getRoot(self,name):
+        try:
+            uri = self._ns.lookup("{}.{}".format(self._group,name))
+            ret = PyroRoot(node=Pyro4.Proxy(uri),daemon=self._pyroDaemon)
+            self._pyroDaemon.register(ret)
+
+            ret._loadStructure(self._cacheDir)
+            ret._node.addVarListener(ret,patterns=[],batch=True)
+            return ret
+        except:
+            raise pr.NodeError("PyroClient Failed to find {}.{}.".format(self._group,name))
+
+
+class PyroNodeTable(dict):
+    """
+    Object table for the Pyro daemon of a root. Replaces registering every node
+    of the tree at start. Nodes are registered under the id 'pyrogue.<path>' when
+    they are first returned to a client, or when a client calls an object id of
+    that form which is not registered. At most maxNodes nodes are kept registered,
+    the least recently used are dropped and are registered again on their next use.
+    """
+    Prefix = 'pyrogue.'
+
+    def __init__(self, *, root, daemon, maxNodes=10000):
+        dict.__init__(self, daemon.objectsById)
+
+        self._root   = root
+        self._daemon = daemon
+        self._max    = maxNodes
+        self._lru    = odict()
+        self._lock   = threading.RLock()
+
+        self._setReplacement(pr.Node)
+
+    def get(self, key, default=None):
+        ret = dict.get(self, key)
+
+        if ret is not None:
+            with self._lock:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+
+        elif isinstance(key,str) and key.startswith(self.Prefix):
+            try:
+                ret = self.export(self._root._getNode(key[len(self.Prefix):]))
+            except pr.NodeError:
+                ret = None
+
+        return default if ret is None else ret
+
+    def export(self, node):
+        """Register the node if required and mark it as recently used"""
+        with self._lock:
+            if not getattr(node,'_pyroId',''):
+                self._daemon.register(node, self.Prefix + node.path)
+                self._setReplacement(type(node))
+
+            oid = node._pyroId
+
+            if oid.startswith(self.Prefix):
+                self._lru[oid] = None
+                self._lru.move_to_end(oid)
+
+                while len(self._lru) > self._max:
+                    old, _ = self._lru.popitem(last=False)
+                    self._daemon.unregister(old)
+
+        return node
+
+    def _autoProxy(self, node):
+        return self._daemon.proxyFor(self.export(node))
+
+    def _setReplacement(self, typ):
+        # Daemon.register() installs its own replacement for the registered type,
+        # which only proxies registered objects. Restore ours for the whole class.
+        for ser in Pyro4.util._serializers.values():
+            ser.register_type_replacement(typ, self._autoProxy)
+
+
+def recreate_OrderedDict(name, values):
+    return odict(values['items'])
@@ -14,14 +14,14 @@
 # contained in the LICENSE.txt file.
 #-----------------------------------------------------------------------------
 import rogue.interfaces.memory
-import yaml
+import sys
 import threading
+import collections
 from collections import OrderedDict as odict
 import logging
 import pyrogue as pr
-import Pyro4
-import Pyro4.naming
 import functools as ft
+import hashlib
 import time
 import queue
 from contextlib import contextmanager
@@ -42,6 +42,172 @@ class RootLogHandler(logging.Handler):
                print(e)
                print("------------------------------------------------")
 
+class VarListener(object):
+    """
+    Bounded delivery queue for a variable listener.
+    Updates are delivered in order by the root listener worker threads, so a slow
+    listener only delays itself. When the backlog exceeds maxBacklog the oldest
+    updates are dropped. With policy='coalesce' only the latest update for each
+    path is kept. Delivery lag and drop counts are tracked for each listener.
+    If patterns is passed only updates for matching paths are queued, see pyrogue.pathMatcher.
+    With batch=True all pending updates are delivered in one call to
+    func.varListenerBatch(entries) or func(entries), with a list of (path,value,disp) entries.
+    """
+    def __init__(self, *, func, maxBacklog=10000, policy='coalesce', patterns=None, batch=False):
+
+        if policy != 'coalesce' and policy != 'dropOldest':
+            raise pr.NodeError(f'Invalid listener policy {policy}. Supported: coalesce, dropOldest')
+
+        self._func       = func
+        self._pyro       = _isPyroProxy(func)
+        self._method     = self._pyro or hasattr(func,'varListenerBatch' if batch else 'varListener')
+        self._maxBacklog = maxBacklog
+        self._policy     = policy
+        self._pending    = odict()
+        self._seq        = 0
+        self._lock       = threading.Lock()
+        self._scheduled  = False
+        self._batch      = batch
+
+        self._setPatterns(patterns)
+
+        # Metrics
+        self._delivered = 0
+        self._dropped   = 0
+        self._lag       = 0.0
+        self._maxLag    = 0.0
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {'listener'  : str(self._func),
+                    'policy'    : self._policy,
+                    'patterns'  : None if self._patterns is None else list(self._patterns),
+                    'batch'     : self._batch,
+                    'backlog'   : len(self._pending),
+                    'delivered' : self._delivered,
+                    'dropped'   : self._dropped,
+                    'lag'       : self._lag,
+                    'maxLag'    : self._maxLag}
+
+    def _setPatterns(self, patterns):
+        with self._lock:
+            self._patterns = None if patterns is None else dict.fromkeys(patterns)
+            self._matcher  = pr.pathMatcher(patterns)
+            self._matched  = {}
+
+    def _addPatterns(self, patterns):
+        with self._lock:
+            if self._patterns is None:
+                return
+
+            if patterns is None:
+                self._patterns = None
+            else:
+                new = [p for p in dict.fromkeys(patterns) if p not in self._patterns]
+
+                if len(new) == 0:
+                    return
+
+                self._patterns.update(dict.fromkeys(new))
+                patterns = new
+
+            # Only paths which did not match before can change
+            self._matcher.add(patterns)
+            self._matched = {}
+
+    def _match(self, path):
+        ret = self._matched.get(path)
+
+        if ret is None:
+            ret = self._matcher(path)
+            self._matched[path] = ret
+
+        return ret
+
+    def _push(self, entries):
+        """Add a list of (path,value,disp) entries. Returns True if the listener must be scheduled."""
+        stamp = time.monotonic()
+
+        with self._lock:
+            for path,value,disp in entries:
+                if self._patterns is not None and not self._match(path):
+                    continue
+
+                if self._policy == 'coalesce':
+                    key = path
+                    self._pending.pop(key,None)
+                else:
+                    key = self._seq
+                    self._seq += 1
+
+                self._pending[key] = (path,value,disp,stamp)
+
+                if len(self._pending) > self._maxBacklog:
+                    self._pending.popitem(last=False)
+                    self._dropped += 1
+
+            if self._scheduled or len(self._pending) == 0:
+                return False
+
+            self._scheduled = True
+            return True
+
+    def _service(self, root):
+        """Deliver pending entries. Returns True if more entries arrived and the listener must be rescheduled."""
+        with self._lock:
+            items = list(self._pending.values())
+            self._pending.clear()
+
+        if self._batch:
+            chunks = [items] if len(items) > 0 else []
+        else:
+            chunks = [[i] for i in items]
+
+        for chunk in chunks:
+            try:
+                if self._batch:
+                    entries = [(path,value,disp) for path,value,disp,stamp in chunk]
+
+                    if self._method:
+                        self._func.varListenerBatch(entries)
+                    else:
+                        self._func(entries)
+
+                else:
+                    path,value,disp,stamp = chunk[0]
+
+                    if self._method:
+                        self._func.varListener(path,value,disp)
+                    else:
+                        self._func(path,value,disp)
+
+            except Exception as msg:
+                if self._pyro and _isPyroCommError(msg):
+                    if 'Connection refused' in str(msg):
+                        root._log.info("Pyro Disconnect. Removing callback")
+                        root._removeVarListener(self)
+                        return False
+                    else:
+                        root._log.error("Pyro callback failed for {}: {}".format(root.name,msg))
+                else:
+                    root._log.exception(msg)
+
+            lag = time.monotonic() - chunk[0][3]
+
+            with self._lock:
+                self._delivered += len(chunk)
+                self._lag = lag
+                self._maxLag = max(self._maxLag,lag)
+
+        with self._lock:
+            if len(self._pending) == 0:
+                self._scheduled = False
+                return False
+
+            return True
+
+
 class Root(rogue.interfaces.stream.Master,pr.Device):
     """
     Class which serves as the root of a tree of nodes.
@@ -59,7 +225,7 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
         """Root exit."""
         self.stop()
 
-    def __init__(self, *, name=None, description=''):
+    def __init__(self, *, name=None, description='', listenerThreads=4, updateThreads=1):
         """Init the node with passed attributes"""
 
         rogue.interfaces.stream.Master.__init__(self)
@@ -78,6 +244,10 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
         # Polling worker
         self._pollQueue = None
 
+        # Transaction priority lanes of each memory link
+        self._linkSchedulers = {}
+        self._linkLock = threading.Lock()
+
         # Remote object export
         self._pyroThread = None
         self._pyroDaemon = None
@@ -86,9 +256,31 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
         self._varListeners  = []
         self._varListenLock = threading.Lock()
 
-        # Variable update worker
-        self._updateQueue = queue.Queue()
-        self._updateThread = None
+        # Listener delivery workers
+        self._listenQueue   = queue.Queue()
+        self._listenThreads = [None] * listenerThreads
+
+        # Variable update workers, one queue per shard
+        self._updateQueues  = [queue.Queue() for i in range(updateThreads)]
+        self._updateThreads = [None] * updateThreads
+        self._updateLocal   = threading.local()
+
+        # Update group depth and pending variables for each calling thread
+        self._groupLocal = threading.local()
+
+        # Variable dependency graph and update shards, built at start
+        self._varRank  = {}
+        self._varDown  = {}
+        self._varUp    = {}
+        self._varShard = {}
+
+        # Hash of the tree structure, computed on first request
+        self._structureHash = None
+
+        # Binary update stream encoder. Frames are encoded and sent under one lock so
+        # a path table frame is always sent before the update frames using its ids.
+        self._updateEncoder  = pr.UpdateEncoder()
+        self._updateSendLock = threading.Lock()
 
         # Init 
         pr.Device.__init__(self, name=name, description=description)
@@ -100,6 +292,50 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
         self.add(pr.LocalVariable(name='ForceWrite', value=False, mode='RW', hidden=True,
             description='Configuration Flag To Control Write All Block'))
 
+        self.add(pr.LocalVariable(name='UpdateInterval', value=0.0, mode='RW', hidden=True, units='s',
+            description='Minimum interval between update groups sent to listeners. Updates within the interval are merged. 0 disables the limit'))
+
+        self.add(pr.LocalVariable(name='UpdateRefresh', value=0.0, mode='RW', hidden=True, units='s',
+            description='Interval at which unchanged variables are sent to listeners again. 0 disables the refresh'))
+
+        self.add(pr.LocalVariable(name='PollPolicy', value='skip', mode='RW', hidden=True, disp=pr.PollQueue.Policies,
+            description='Poll scheduling when deadlines are missed. skip: keep the poll phase, catchUp: poll for each missed deadline, coalesce: restart the interval'))
+
+        self.add(pr.LocalVariable(name='PollWindow', value=0.01, mode='RW', hidden=True, units='s',
+            description='Blocks due to be polled within this time are polled early, together with the current poll'))
+
+        self.add(pr.LocalVariable(name='PollSpread', value=True, mode='RW', hidden=True,
+            description='Offset the poll times of each device within the poll interval, by a hash of the device path'))
+
+        self.add(pr.LocalVariable(name='PollMerge', value=True, mode='RW', hidden=True,
+            description='Read address contiguous polled blocks on the same memory slave in a single transaction'))
+
+        self.add(pr.LocalVariable(name='PollAdaptive', value=False, mode='RW', hidden=True,
+            localSet=lambda value: self._pollQueue.resetInterval() if (self._pollQueue and not value) else None,
+            description='Back off the poll interval of blocks whose data does not change, up to PollMaxInterval'))
+
+        self.add(pr.LocalVariable(name='PollMaxInterval', value=60.0, mode='RW', hidden=True, units='s',
+            description='Maximum poll interval of a block with adaptive polling'))
+
+        self.add(pr.LocalVariable(name='PollOnDemand', value=False, mode='RW', hidden=True,
+            localSet=lambda value: self._pollQueue.updateConsumers() if self._pollQueue else None,
+            description='Only poll blocks with listeners on their variables, or with variables which set pollAlways or historySize'))
+
+        self.add(pr.LocalVariable(name='PollLateness', value=0.0, mode='RO', hidden=True, units='s',
+            localGet=lambda: self._pollQueue.lateness if self._pollQueue else 0.0,
+            description='Largest delay of the last poll of each block after its deadline'))
+
+        self.add(pr.LocalVariable(name='PollMaxLateness', value=0.0, mode='RO', hidden=True, units='s',
+            localGet=lambda: self._pollQueue.maxLateness if self._pollQueue else 0.0,
+            description='Largest delay of any poll after its deadline'))
+
+        self.add(pr.LocalVariable(name='PollOverruns', value=0, mode='RO', hidden=True,
+            localGet=lambda: self._pollQueue.overruns if self._pollQueue else 0,
+            description='Number of polls which occured after the following deadline had already passed'))
+
+        self.add(pr.LocalVariable(name='UpdateEncoding', value='Yaml', mode='RW', hidden=True, disp=['Yaml','Binary'],
+            description='Encoding of the variable update stream frames. Binary frames are decoded with pyrogue.UpdateDecoder'))
+
         # Commands
         self.add(pr.LocalCommand(name='WriteAll', function=self._write, 
                                  description='Write all values to the hardware'))
@@ -126,8 +362,12 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
                                  description='Clear the message log cntained in the SystemLog variable'))
 
 
-    def start(self, timeout=1.0, initRead=False, initWrite=False, pollEn=True, pyroGroup=None, pyroAddr=None, pyroNsAddr=None):
-        """Setup the tree. Start the polling thread."""
+    def start(self, timeout=1.0, initRead=False, initWrite=False, pollEn=True, pyroGroup=None, pyroAddr=None, pyroNsAddr=None, pyroMaxNodes=10000):
+        """
+        Setup the tree. Start the polling thread.
+        When pyroGroup is passed the root is exported through Pyro. Tree nodes are
+        registered with the Pyro daemon on demand, at most pyroMaxNodes at a time.
+        """
 
         # Create poll queue object
         if pollEn:
@@ -157,6 +397,9 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
                 #raise pr.NodeError("Device {} at address={} overlaps {} at address={} with size={}".format(
                 #    tmpDevs[i].path,tmpDevs[i].address,tmpDevs[i-1].path,tmpDevs[i-1].address,tmpDevs[i-1].size))
 
+        # Build variable dependency graph
+        self._buildVarGraph()
+
         # Set timeout if not default
         if timeout != 1.0:
             for key,value in self._nodes.items():
@@ -164,13 +407,17 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
 
         # Start pyro server if enabled
         if pyroGroup is not None:
+            import Pyro4
+            import Pyro4.naming
+
             Pyro4.config.THREADPOOL_SIZE = 1000
             Pyro4.config.SERVERTYPE = "multiplex"
             Pyro4.config.POLLTIMEOUT = 3
 
-            Pyro4.util.SerializerBase.register_dict_to_class("collections.OrderedDict", recreate_OrderedDict)
+            Pyro4.util.SerializerBase.register_dict_to_class("collections.OrderedDict", pr.recreate_OrderedDict)
 
             self._pyroDaemon = Pyro4.Daemon(host=pyroAddr)
+            self._pyroDaemon.objectsById = pr.PyroNodeTable(root=self,daemon=self._pyroDaemon,maxNodes=pyroMaxNodes)
 
             uri = self._pyroDaemon.register(self)
 
@@ -188,7 +435,6 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
                     self._log.info("Using pyro4 nameserver at addr: {}".format(pyroNsAddr))
 
                 ns.register('{}.{}'.format(pyroGroup,self.name),uri)
-                self._exportNodes(self._pyroDaemon)
                 self._pyroThread = threading.Thread(target=self._pyroDaemon.requestLoop)
                 self._pyroThread.start()
 
@@ -204,9 +450,15 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
         if initWrite:
             self._write()
 
+        # Start listener delivery threads
+        for i in range(len(self._listenThreads)):
+            self._listenThreads[i] = threading.Thread(target=self._listenWorker)
+            self._listenThreads[i].start()
+
         # Start update thread
-        self._updateThread = threading.Thread(target=self._updateWorker)
-        self._updateThread.start()
+        for i in range(len(self._updateThreads)):
+            self._updateThreads[i] = threading.Thread(target=self._updateWorker, args=(i,))
+            self._updateThreads[i].start()
 
         # Start poller if enabled
         if pollEn:
@@ -215,23 +467,51 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
         self._running = True
 
     def stop(self):
-        """Stop the polling thread. Must be called for clean exit."""
-        self._updateQueue.put(None)
-
+        """
+        Stop the polling thread. Must be called for clean exit.
+        Updates held back by the rate limit are delivered to the listeners before the devices are stopped.
+        """
         if self._pollQueue:
             self._pollQueue.stop()
 
+        for q in self._updateQueues:
+            q.put(None)
+
+        self._joinWorkers(self._updateThreads)
+
+        for t in self._listenThreads:
+            self._listenQueue.put(None)
+
+        self._joinWorkers(self._listenThreads)
+
+        # Listeners requeued behind the stop markers
+        while True:
+            try:
+                l = self._listenQueue.get_nowait()
+            except queue.Empty:
+                break
+
+            while l is not None and l._service(self):
+                pass
+
+        self._stop()
+
         if self._pyroDaemon:
             self._pyroDaemon.shutdown()
 
         self._running=False
 
-    @Pyro4.expose
+    def _joinWorkers(self, threads):
+        for t in threads:
+            if t is not None and t is not threading.current_thread():
+                t.join()
+
+    @pr.expose
     @property
     def running(self):
         return self._running
 
-    @Pyro4.expose
+    @pr.expose
     def getNode(self, path):
         return self._getPath(path)
 
@@ -245,17 +525,132 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
 
         return obj
 
-    @Pyro4.expose
-    def addVarListener(self,func):
+    @pr.expose
+    def addVarListener(self,func,maxBacklog=10000,policy='coalesce',patterns=None,batch=False):
         """
         Add a variable update listener function.
         The variable, value and display string will be passed as an arg: func(path,value,disp)
+        Updates are queued for each listener and delivered by a pool of worker threads.
+        Up to maxBacklog updates are held for a slow listener. When the backlog is full
+        the oldest update is dropped. With policy='coalesce' only the latest update for
+        each path is held, policy='dropOldest' keeps every update.
+        patterns is an optional list of path globs or subtree paths to receive,
+        see setVarListenerPatterns(). With batch=True all of the updates pending
+        for the listener are passed in a single call: func.varListenerBatch(entries)
+        or func(entries), where entries is a list of (path,value,disp).
+        """
+        if _isPyroProxy(func):
+            func._pyroOneway.add("varListener")
+            func._pyroOneway.add("varListenerBatch")
+
+        with self._varListenLock:
+            self._varListeners.append(VarListener(func=func,maxBacklog=maxBacklog,policy=policy,patterns=patterns,batch=batch))
+
+        self._pollSubscribe(patterns)
+
+    @pr.expose
+    def removeVarListener(self,func):
+        """Remove a listener previously passed to addVarListener()"""
+        with self._varListenLock:
+            self._varListeners = [l for l in self._varListeners if l._func != func]
+
+        self._pollSubscribe([])
+
+    @pr.expose
+    def setVarListenerPatterns(self,func,patterns):
+        """
+        Replace the path patterns of a listener previously passed to addVarListener().
+        Patterns containing * or ? are globs matched against the full variable path.
+        Other patterns select a path and everything below it. None selects all paths.
+        Updates are filtered before they are queued for the listener.
+        """
+        with self._varListenLock:
+            for l in self._varListeners:
+                if l._func == func:
+                    l._setPatterns(patterns)
+
+        self._pollSubscribe(patterns)
+
+    @pr.expose
+    def addVarListenerPatterns(self,func,patterns):
+        """
+        Add path patterns to a listener previously passed to addVarListener(),
+        see setVarListenerPatterns(). Only the new patterns are sent and matched,
+        for clients which subscribe to paths one at a time.
+        """
+        with self._varListenLock:
+            for l in self._varListeners:
+                if l._func == func:
+                    l._addPatterns(patterns)
+
+        self._pollSubscribe(patterns)
+
+    def _getVarListeners(self):
+        with self._varListenLock:
+            return list(self._varListeners)
+
+    def _pollSubscribe(self, patterns):
+        """
+        Update the poll queue after listeners are added, removed or changed.
+        Backed off blocks with variables matching the passed patterns return to their base poll interval.
+        """
+        if self._pollQueue is not None:
+            if self.PollOnDemand.value():
+                self._pollQueue.updateConsumers()
+
+            if self.PollAdaptive.value():
+                self._pollQueue.resetInterval(pr.pathMatcher(patterns))
+
+    def _pollSubscribeVar(self, var):
+        """Update the poll queue after a listener is added to a single variable"""
+        if self._pollQueue is not None:
+            self._pollQueue.updateVarConsumers(var)
+
+    def _linkScheduler(self, link):
+        with self._linkLock:
+            if link not in self._linkSchedulers:
+                self._linkSchedulers[link] = pr.LinkScheduler()
+            return self._linkSchedulers[link]
+
+    @pr.expose
+    def getLinkStats(self):
+        """Return a dictionary of transaction lane statistics for each memory link, see LinkScheduler.stats()"""
+        with self._linkLock:
+            return {str(k) : v.stats() for k,v in self._linkSchedulers.items()}
+
+    @pr.expose
+    def getPollStats(self):
+        """Return a dictionary of poll statistics for each polled block, see PollQueue.stats()"""
+        if self._pollQueue is None:
+            return {}
+        else:
+            return self._pollQueue.stats()
+
+    @pr.expose
+    def getListenerStats(self):
+        """
+        Return a list of delivery statistics for each root and variable listener.
+        lag is the delay in seconds between queueing and delivery of the last update.
         """
         with self._varListenLock:
-            self._varListeners.append(func)
+            ret = [l.stats for l in self._varListeners]
+
+        for v in self.variableList:
+            ret.extend([l.stats for l in v._listenerFuncs])
 
-            if isinstance(func,Pyro4.core.Proxy):                                    
-                func._pyroOneway.add("varListener")                                  
+        return ret
+
+    def _removeVarListener(self,listener):
+        with self._varListenLock:
+            if listener in self._varListeners:
+                self._varListeners.remove(listener)
+
+        self._pollSubscribe([])
+
+    def _deliver(self,listener,entries):
+        """Queue a list of (path,value,disp) updates to a listener"""
+        if listener._push(entries):
+            self._listenQueue.put(listener)
 
     def getYaml(self,readFirst,modes=['RW']):
         """
@@ -284,7 +679,7 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
         quanitty of variables.
         """
         d = yamlToDict(yml)
-        with self.updateGroup():
+        with self.updateGroup(), pr.transactionLane('config'):
 
             for key, value in d.items():
                 if key == self.name:
@@ -297,46 +692,231 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
 
             if not writeEach: self._write()
 
-    @Pyro4.expose
+    @pr.expose
     def get(self,path):
         obj = self.getNode(path)
         return obj.get()
 
-    @Pyro4.expose
+    @pr.expose
     def getDisp(self,path):
         obj = self.getNode(path)
         return obj.getDisp()
 
-    @Pyro4.expose
+    @pr.expose
     def value(self,path):
         obj = self.getNode(path)
         return obj.value()
 
-    @Pyro4.expose
+    @pr.expose
     def valueDisp(self,path):
         obj = self.getNode(path)
         return obj.valueDisp()
 
-    @Pyro4.expose
+    @pr.expose
     def set(self,path,value):
         obj = self.getNode(path)
         return obj.set(value)
 
-    @Pyro4.expose
+    @pr.expose
     def setDisp(self,path,value):
         obj = self.getNode(path)
         return obj.setDisp(value)
 
-    @Pyro4.expose
+    @pr.expose
     def exec(self,path,arg):
         obj = self.getNode(path)
         return obj.call(arg)
 
+    @pr.expose
+    def getMany(self, paths, read=True, disp=False):
+        """
+        Return an ordered dictionary of path:value for a list of variable paths.
+        If disp=True each entry is a (value, disp) tuple.
+        If read=True the blocks of all listed variables are read from hardware
+        together, with all transactions started before any are checked.
+        """
+        vlist = self._getVariables(paths)
+
+        if read:
+            self._readVariables(vlist)
+
+        ret = odict()
+        for v in vlist:
+            value = v.get(read=False)
+            ret[v.path] = (value, v.genDisp(value)) if disp else value
+
+        return ret
+
+    @pr.expose
+    def setMany(self, values, write=True, disp=False):
+        """
+        Set variables from a dictionary of path:value.
+        If disp=True the values are display strings.
+        If write=True the blocks of all listed variables are written and verified
+        together after all of the values are set.
+        """
+        vlist = self._getVariables(values.keys())
+
+        with self.updateGroup():
+            for v,value in zip(vlist,values.values()):
+                if disp:
+                    v.setDisp(value, write=False)
+                else:
+                    v.set(value, write=False)
+
+            if write:
+                blocks = self._getVariableBlocks(vlist)
+
+                try:
+                    for b in blocks:
+                        b.startTransaction(rogue.interfaces.memory.Write, False)
+
+                    for b in blocks:
+                        b.startTransaction(rogue.interfaces.memory.Verify, False)
+
+                    for b in blocks:
+                        b._checkTransaction()
+
+                except Exception as e:
+                    self._log.exception(e)
+                    self._log.error("Error writing variables: {}".format([v.path for v in vlist]))
+
+    @pr.expose
+    def snapshot(self, path=None, modes=['RW','RO','WO'], read=False):
+        """
+        Return an ordered dictionary of path:(value, disp) for all variables at or below
+        the passed path, default is the full tree. modes is a list of variable modes to include.
+        If read=True the blocks are read from hardware first.
+        """
+        node = self if path is None else self._getNode(path)
+
+        if isinstance(node,pr.BaseVariable):
+            vlist = [node]
+        else:
+            vlist = node.variableList
+
+        vlist = [v for v in vlist if v.mode in modes and not v.isCommand]
+
+        return self.getMany([v.path for v in vlist], read=read, disp=True)
+
+    @pr.expose
+    def history(self, path, count=None, since=None):
+        """
+        Return (times, values) lists of the history of a variable, see BaseVariable.history().
+        Lists are returned so the result can be passed to remote clients.
+        """
+        t, v = self.getNode(path).history(count, since)
+        return t.tolist(), v.tolist()
+
+    @pr.expose
+    def historyStats(self, path, count=None, since=None):
+        """Return a dictionary of statistics over the history of a variable"""
+        return self.getNode(path).historyStats(count, since)
+
+    @pr.expose
+    def changedSince(self, path, stamp):
+        """Return True if the value in the history of a variable changed at or after the passed time"""
+        return self.getNode(path).changedSince(stamp)
+
+    @pr.expose
+    def describe(self, path=None):
+        """
+        Return an ordered dictionary of path:attributes for all nodes at or below
+        the passed path, default is the full tree. The attributes are the static
+        properties of each node, returned by Node._describe().
+        """
+        ret  = odict()
+        todo = collections.deque([self if path is None else self._getNode(path)])
+
+        while len(todo) > 0:
+            n = todo.popleft()
+            ret[n.path] = n._describe()
+            todo.extend(n.nodes.values())
+
+        return ret
+
+    @pr.expose
+    def structureHash(self):
+        """
+        Return a hash of the tree structure returned by describe().
+        Remote clients use the hash to key their cached copy of the structure.
+        """
+        if self._structureHash is None:
+            self._structureHash = hashlib.sha1(repr(list(self.describe().items())).encode('utf-8')).hexdigest()
+
+        return self._structureHash
+
+    def _getNode(self, path):
+        """Return the node at the passed path, raising a NodeError if it does not exist"""
+        try:
+            ret = self._getPath(path)
+        except Exception:
+            ret = None
+
+        if not isinstance(ret,pr.Node):
+            raise pr.NodeError("Node {} not found".format(path))
+
+        return ret
+
+    def _getVariables(self, paths):
+        ret = []
+        for p in paths:
+            v = self._getNode(p)
+            if not isinstance(v,pr.BaseVariable):
+                raise pr.NodeError("Node {} is not a variable".format(p))
+            ret.append(v)
+        return ret
+
+    def _getVariableBlocks(self, vlist):
+        """Return the unique blocks behind a list of variables, including the dependencies of link variables"""
+        blocks = odict()
+        todo   = list(vlist)
+        done   = set()
+
+        while len(todo) > 0:
+            v = todo.pop()
+
+            if v in done:
+                continue
+            done.add(v)
+
+            if v._block is not None:
+                blocks[id(v._block)] = v._block
+            else:
+                todo.extend(v.dependencies)
+
+        return list(blocks.values())
+
+    def _readVariables(self, vlist):
+        blocks = self._getVariableBlocks(vlist)
+
+        try:
+            for b in blocks:
+                b.startTransaction(rogue.interfaces.memory.Read, False)
+
+            with self.updateGroup():
+                for b in blocks:
+                    b._checkTransaction()
+
+        except Exception as e:
+            self._log.exception(e)
+            self._log.error("Error reading variables: {}".format([v.path for v in vlist]))
+
     @contextmanager
     def updateGroup(self):
+        """
+        Collect variable updates generated by the calling thread and send them
+        as a single group when the outermost update group exits.
+        Groups opened by other threads are independent.
+        """
+        loc = self._groupLocal
 
         # At wtih call
-        self._updateQueue.put(True)
+        if getattr(loc,'depth',0) == 0:
+            loc.depth = 0
+            loc.uvars = {}
+
+        loc.depth += 1
 
         # Return to block within with call
         try:
@@ -344,13 +924,23 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
         finally:
 
             # After with is done
-            self._updateQueue.put(False)
+            loc.depth -= 1
+
+            if loc.depth == 0 and len(loc.uvars) > 0:
+                uvars = loc.uvars
+                loc.uvars = {}
+                self._dispatchUpdates(uvars)
 
     def _sendYamlFrame(self,yml):
         """
         Generate a frame containing the passed string.
         """
-        b = bytearray(yml,'utf-8')
+        self._sendDataFrame(bytearray(yml,'utf-8'))
+
+    def _sendDataFrame(self,b):
+        """
+        Generate a frame containing the passed bytes.
+        """
         frame = self._reqFrame(len(b),True)
         frame.write(b,0)
         self._sendFrame(frame)
@@ -364,10 +954,15 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
         """
         self._sendYamlFrame(self.getYaml(False,modes))
 
+        # Resend the path table so new files can decode binary updates
+        if self.UpdateEncoding.value() == 'Binary':
+            with self._updateSendLock:
+                self._sendDataFrame(bytearray(self._updateEncoder.table()))
+
     def _write(self):
         """Write all blocks"""
         self._log.info("Start root write")
-        with self.updateGroup():
+        with self.updateGroup(), pr.transactionLane('config'):
             try:
                 self.writeBlocks(force=self.ForceWrite.value(), recurse=True)
                 self._log.info("Verify root read")
@@ -381,7 +976,7 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
     def _read(self):
         """Read all blocks"""
         self._log.info("Start root read")
-        with self.updateGroup():
+        with self.updateGroup(), pr.transactionLane('config'):
             try:
                 self.readBlocks(recurse=True)
                 self._log.info("Check root read")
@@ -424,147 +1019,226 @@ class Root(rogue.interfaces.stream.Master,pr.Device):
         self.SystemLog.set('')
 
     def _queueUpdates(self,var):
-        self._updateQueue.put(var)
+        loc = self._groupLocal
 
-    # Worker thread
-    def _updateWorker(self):
-        self._log.info("Starting update thread")
+        if getattr(loc,'depth',0) > 0:
+            loc.uvars[var.path] = var
+        else:
+            self._dispatchUpdates({var.path:var})
 
-        # Init
-        count = 0
-        uvars = {}
+    def _dispatchUpdates(self,uvars):
+        """Split a group of updated variables between the update workers"""
+        if len(self._updateQueues) == 1:
+            self._updateQueues[0].put(uvars)
+            return
 
-        while True:
-            ent = self._updateQueue.get()
-
-            # Done
-            if ent is None:
-                self._log.info("Stopping update thread")
-                return
-
-            # Increment
-            elif ent is True:
-                count += 1
+        shards = {}
+        for p,v in uvars.items():
+            shards.setdefault(self._varShard.get(v,0),{})[p] = v
 
-            # Decrement
-            elif ent is False:
-                if count > 0:
-                    count -= 1
+        for i,sv in shards.items():
+            self._updateQueues[i].put(sv)
 
-            # Variable
-            else:
-                uvars[ent.path] = ent
+    @property
+    def _updateMemo(self):
+        """Link variable values for the update group being processed by this thread, or None"""
+        return getattr(self._updateLocal,'memo',None)
 
-            # Process list if count = 0
-            if count == 0 and len(uvars) > 0:
+    def _buildVarGraph(self):
+        """
+        Sort the variables in topological order of their dependencies.
+        Each variable gets a rank and a tuple of itself and every variable
+        that listens to it directly or indirectly, in rank order.
+        """
+        vlist = self.variableList
 
-                self._log.debug(F"Process update group. Length={len(uvars)}. Entry={list(uvars.keys())[0]}")
-                yml = ""
+        incount = {v:0 for v in vlist}
+        for v in vlist:
+            for l in v._listenerVars:
+                incount[l] = incount.get(l,0) + 1
+
+        rank  = {}
+        ready = [v for v,c in incount.items() if c == 0]
+
+        while len(ready) > 0:
+            v = ready.pop()
+            rank[v] = len(rank)
+
+            for l in v._listenerVars:
+                incount[l] -= 1
+                if incount[l] == 0:
+                    ready.append(l)
+
+        if len(rank) != len(incount):
+            cycle = [v.path for v in incount if v not in rank]
+            raise pr.NodeError("Variable dependency cycle detected between: {}".format(cycle))
+
+        # Downstream variables, built in reverse order so listeners are complete
+        down = {}
+        for v in sorted(rank, key=rank.get, reverse=True):
+            if len(v._listenerVars) > 0:
+                d = {v}
+                for l in v._listenerVars:
+                    d.update(down.get(l,(l,)))
+                down[v] = tuple(sorted(d, key=rank.get))
+
+        # Upstream variables, each variable and every variable it listens to directly or indirectly
+        up = {}
+        for v,d in down.items():
+            for l in d:
+                up.setdefault(l,{l}).add(v)
+
+        # Shard by top level device. Devices linked by dependencies share a shard
+        # so their updates keep their relative order. Links from root level variables,
+        # such as the enable chain, do not merge shards; their downstream variables
+        # are evaluated by the worker which handles the root variable.
+        def group(v):
+            p = v.path.split('.')
+            return p[1] if len(p) > 2 else None
+
+        merged = {}
+        def find(k):
+            while merged.get(k,k) != k:
+                k = merged[k]
+            return k
 
-                for p,v in uvars.items():
-                    path,value,disp = v._doUpdate()
+        for v in vlist:
+            for l in v._listenerVars:
+                a = find(group(v))
+                b = find(group(l))
+                if a is not None and b is not None and a != b:
+                    merged[b] = a
+
+        shard  = {}
+        groups = {}
+        for v in vlist:
+            k = find(group(v))
+            if k not in groups:
+                groups[k] = len(groups) % len(self._updateQueues)
+            shard[v] = groups[k]
+
+        self._varRank  = rank
+        self._varDown  = down
+        self._varUp    = up
+        self._varShard = shard
+
+    # Listener delivery thread
+    def _listenWorker(self):
+        while True:
+            l = self._listenQueue.get()
 
-                    # Update yaml string
-                    yml += (f"{path}:{disp}" + "\n")
+            # Done
+            if l is None:
+                return
 
-                    # Call listener functions,
-                    with self._varListenLock:
-                        for func in self._varListeners:
-                            try:
+            # Requeue behind other listeners if more updates arrived
+            if l._service(self):
+                self._listenQueue.put(l)
 
-                                if isinstance(func,Pyro4.core.Proxy) or hasattr(func,'varListener'):
-                                    func.varListener(path,value,disp)
-                                else:
-                                    func(path,value,disp)
+    def _processUpdates(self,uvars):
+        """Process a group of updated variables. Send the updates to listeners and the update stream."""
+        self._log.debug(F"Process update group. Length={len(uvars)}. Entry={list(uvars.keys())[0]}")
 
-                            except Pyro4.errors.CommunicationError as msg:
-                                if 'Connection refused' in str(msg):
-                                    self._log.info("Pyro Disconnect. Removing callback")
-                                    self._varListeners.remove(func)
-                                else:
-                                    self._log.error("Pyro callback failed for {}: {}".format(self.name,msg))
+        # Add listening variables and evaluate in dependency order
+        uset = set()
+        for v in uvars.values():
+            uset.update(self._varDown.get(v,(v,)))
 
-                # Generate yaml stream
-                self._sendYamlFrame(yml)
+        self._updateLocal.memo = {}
 
-                # Init var list
-                uvars = {}
+        try:
+            entries = []
 
-            # Set done
-            self._updateQueue.task_done()
+            for v in sorted(uset, key=lambda x: self._varRank.get(x,0)):
+                entries.append(v._doUpdate())
 
+        finally:
+            self._updateLocal.memo = None
 
-class PyroRoot(pr.PyroNode):
-    def __init__(self, *, node,daemon):
-        pr.PyroNode.__init__(self,root=self,node=node,daemon=daemon)
+        # Queue updates to listeners
+        with self._varListenLock:
+            for l in self._varListeners:
+                self._deliver(l,entries)
 
-        self._varListeners   = []
-        self._relayListeners = {}
+        # Generate update stream
+        if self.UpdateEncoding.value() == 'Binary':
+            with self._updateSendLock:
+                for b in self._updateEncoder.encode(entries):
+                    self._sendDataFrame(bytearray(b))
+        else:
+            self._sendYamlFrame(''.join(f"{path}:{disp}\n" for path,value,disp in entries))
 
-    def addInstance(self,node):
-        self._daemon.register(node)
+    # Worker thread
+    def _updateWorker(self,idx):
+        self._log.info(f"Starting update thread {idx}")
 
-    def getNode(self, path):
-        return pr.PyroNode(root=self,node=self._node.getNode(path),daemon=self._daemon)
+        # Init
+        q     = self._updateQueues[idx]
+        uvars = {}
+        last  = 0.0
 
-    def addVarListener(self,listener):
-        self._varListeners.append(listener)
+        while True:
+            wait = None
 
-    def _addRelayListener(self, path, listener):
-        if not path in self._relayListeners:
-            self._relayListeners[path] = []
+            # Groups are merged until UpdateInterval has passed since the last flush
+            if len(uvars) > 0:
+                now      = time.monotonic()
+                interval = self.UpdateInterval.value()
 
-        self._relayListeners[path].append(listener)
+                if (now - last) >= interval:
+                    self._processUpdates(uvars)
+                    uvars = {}
+                    last  = now
 
-    @Pyro4.expose
-    def varListener(self, path, value, disp):
-        for f in self._varListeners:
-            f.varListener(path=path, value=value, disp=disp)
+                else:
 
-        if path in self._relayListeners:
-            for f in self._relayListeners[path]:
-                f.varListener(path=path, value=value, disp=disp)
+                    # Urgent variables bypass the rate limit
+                    urgent = {p:v for p,v in uvars.items() if v.urgent}
 
-class PyroClient(object):
-    def __init__(self, group, localAddr=None, nsAddr=None):
-        self._group = group
+                    if len(urgent) > 0:
+                        self._processUpdates(urgent)
+                        uvars = {p:v for p,v in uvars.items() if not v.urgent}
 
-        Pyro4.config.THREADPOOL_SIZE = 100
-        Pyro4.config.SERVERTYPE = "multiplex"
-        Pyro4.config.POLLTIMEOUT = 3
+                    if len(uvars) > 0:
+                        wait = (last + interval) - now
 
-        Pyro4.util.SerializerBase.register_dict_to_class("collections.OrderedDict", recreate_OrderedDict)
+            # Get a group and merge any others which are already waiting
+            try:
+                ent = q.get(timeout=wait)
 
-        if nsAddr is None:
-            nsAddr = localAddr
+                while ent is not None:
+                    uvars.update(ent)
+                    q.task_done()
+                    ent = q.get_nowait()
 
-        try:
-            self._ns = Pyro4.locateNS(host=nsAddr)
-        except:
-            raise pr.NodeError("PyroClient Failed to find nameserver")
+            except queue.Empty:
+                continue
 
-        self._pyroDaemon = Pyro4.Daemon(host=localAddr)
+            # Done, deliver the updates held back by the rate limit
+            if len(uvars) > 0:
+                self._processUpdates(uvars)
 
-        self._pyroThread = threading.Thread(target=self._pyroDaemon.requestLoop)
-        self._pyroThread.start()
+            self._log.info(f"Stopping update thread {idx}")
+            return
 
-    def stop(self):
-        self._pyroDaemon.shutdown()
 
-    def getRoot(self,name):
-        try:
-            uri = self._ns.lookup("{}.{}".format(self._group,name))
-            ret = PyroRoot(node=Pyro4.Proxy(uri),daemon=self._pyroDaemon)
-            self._pyroDaemon.register(ret)
+def _isPyroProxy(obj):
+    """Check for a Pyro4 proxy. Proxies only exist once Pyro4 has been imported."""
+    pyro = sys.modules.get('Pyro4')
+    return pyro is not None and isinstance(obj,pyro.core.Proxy)
 
-            ret._node.addVarListener(ret)
-            return ret
-        except:
-            raise pr.NodeError("PyroClient Failed to find {}.{}.".format(self._group,name))
+def _isPyroCommError(exc):
+    """Check for a Pyro4 communication error, raised when a remote listener can not be reached"""
+    pyro = sys.modules.get('Pyro4')
+    return pyro is not None and isinstance(exc,pyro.errors.CommunicationError)
 
 
-def yamlToDict(stream, Loader=yaml.Loader, object_pairs_hook=odict):
+def yamlToDict(stream, Loader=None, object_pairs_hook=odict):
     """Load yaml to ordered dictionary"""
+    import yaml
+    if Loader is None:
+        Loader = yaml.Loader
+
     class OrderedLoader(Loader):
         pass
     def construct_mapping(loader, node):
@@ -576,8 +1250,12 @@ def yamlToDict(stream, Loader=yaml.Loader, object_pairs_hook=odict):
     return yaml.load(stream, OrderedLoader)
 
 
-def dictToYaml(data, stream=None, Dumper=yaml.Dumper, **kwds):
+def dictToYaml(data, stream=None, Dumper=None, **kwds):
     """Convert ordered dictionary to yaml"""
+    import yaml
+    if Dumper is None:
+        Dumper = yaml.Dumper
+
     class OrderedDumper(Dumper):
         pass
     def _dict_representer(dumper, data):
@@ -591,9 +1269,6 @@ def dictToYaml(data, stream=None, Dumper=yaml.Dumper, **kwds):
         return None
     return ret
 
-def recreate_OrderedDict(name, values):
-    return odict(values['items'])
-
 def generateAddressMap(root,fname):
     vlist = root.variableList
 
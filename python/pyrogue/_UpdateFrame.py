@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : PyRogue base module - Binary Update Frame Encoding
+#-----------------------------------------------------------------------------
+# File       : pyrogue/_UpdateFrame.py
+# Created    : 2018-08-22
+#-----------------------------------------------------------------------------
+# Description:
+# Compact binary encoding of the root variable update stream.
+#
+# All fields are little endian. Each frame starts with a 16 byte header:
+#    magic     : 2 bytes, 'RU'
+#    version   : uint8
+#    type      : uint8, 1 = path table, 2 = variable updates
+#    count     : uint32, number of records
+#    timestamp : float64, seconds since the epoch
+#
+# Path table records:
+#    id : uint32, length : uint16, path : utf-8 bytes
+#
+# Variable update records:
+#    id : uint32, type code : uint8, value
+#
+# Value type codes:
+#    0 = None   (no data)
+#    1 = bool   (uint8)
+#    2 = int    (int64)
+#    3 = float  (float64)
+#    4 = str    (uint32 length, utf-8 bytes)
+#    5 = int    (uint16 length, signed little endian bytes), for values outside int64
+#    6 = other  (uint32 length, utf-8 display string)
+#
+# A path table frame is sent before the first update frame which uses a new path.
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import struct
+import threading
+import time
+from collections import OrderedDict as odict
+
+UpdateFrameMagic   = b'RU'
+UpdateFrameVersion = 1
+UpdateFrameTable   = 1
+UpdateFrameValues  = 2
+
+_header = struct.Struct('<2sBBId')
+_record = struct.Struct('<IB')
+_pathId = struct.Struct('<IH')
+_u8     = struct.Struct('<B')
+_u16    = struct.Struct('<H')
+_u32    = struct.Struct('<I')
+_i64    = struct.Struct('<q')
+_f64    = struct.Struct('<d')
+
+class UpdateFrameError(Exception):
+    """ Exception for update frame decode errors."""
+    pass
+
+def isUpdateFrame(data):
+    """
+    Return True if the passed frame data is a binary update frame. Besides the magic
+    the version and type bytes are checked, which are never printable characters,
+    so yaml text frames starting with 'RU' are not mistaken for update frames.
+    """
+    return len(data) >= _header.size and bytes(data[0:2]) == UpdateFrameMagic and \
+           data[2] == UpdateFrameVersion and data[3] in (UpdateFrameTable, UpdateFrameValues)
+
+
+class UpdateEncoder(object):
+    """
+    Encodes lists of (path,value,disp) updates into binary update frames.
+    Each path is assigned an id the first time it is seen.
+    """
+    def __init__(self):
+        self._ids  = odict()
+        self._lock = threading.Lock()
+
+    def table(self, stamp=None):
+        """Return a path table frame containing all known paths"""
+        with self._lock:
+            return self._table(list(self._ids.items()), stamp)
+
+    def encode(self, entries, stamp=None):
+        """
+        Encode a list of (path,value,disp) entries.
+        Returns a list of frames: a path table frame for new paths if required
+        followed by the update frame.
+        """
+        if stamp is None:
+            stamp = time.time()
+
+        ret  = []
+        new  = []
+        recs = []
+
+        with self._lock:
+            for path,value,disp in entries:
+                pid = self._ids.get(path)
+
+                if pid is None:
+                    pid = len(self._ids)
+                    self._ids[path] = pid
+                    new.append((path,pid))
+
+                recs.append(_encodeValue(pid,value,disp))
+
+            if len(new) > 0:
+                ret.append(self._table(new,stamp))
+
+        ret.append(_header.pack(UpdateFrameMagic,UpdateFrameVersion,UpdateFrameValues,len(recs),stamp) + b''.join(recs))
+        return ret
+
+    def _table(self, items, stamp):
+        if stamp is None:
+            stamp = time.time()
+
+        data = [_header.pack(UpdateFrameMagic,UpdateFrameVersion,UpdateFrameTable,len(items),stamp)]
+
+        for path,pid in items:
+            b = path.encode('utf-8')
+            data.append(_pathId.pack(pid,len(b)) + b)
+
+        return b''.join(data)
+
+
+class UpdateDecoder(object):
+    """
+    Decodes binary update frames. Path table frames must be passed to
+    decode() in the order they were received so later update frames can be resolved.
+    """
+    def __init__(self):
+        self._paths = {}
+
+    @property
+    def paths(self):
+        return self._paths
+
+    def decode(self, data):
+        """
+        Decode a frame. Returns a tuple of (timestamp, values) where values is an
+        ordered dictionary of path:value. Path table frames return an empty dictionary.
+        Updates for ids missing from the path table are keyed by integer id.
+        """
+        data = bytes(data)
+
+        if len(data) < _header.size or data[0:2] != UpdateFrameMagic:
+            raise UpdateFrameError("Frame is not a binary update frame")
+
+        magic, version, typ, count, stamp = _header.unpack_from(data,0)
+        off = _header.size
+        ret = odict()
+
+        if version != UpdateFrameVersion:
+            raise UpdateFrameError(f"Unsupported update frame version {version}")
+
+        if typ == UpdateFrameTable:
+            for i in range(count):
+                pid, size = _pathId.unpack_from(data,off)
+                off += _pathId.size
+                self._paths[pid] = data[off:off+size].decode('utf-8')
+                off += size
+
+        elif typ == UpdateFrameValues:
+            for i in range(count):
+                pid, code = _record.unpack_from(data,off)
+                value, off = _decodeValue(code,data,off+_record.size)
+                ret[self._paths.get(pid,pid)] = value
+
+        else:
+            raise UpdateFrameError(f"Unknown update frame type {typ}")
+
+        return stamp, ret
+
+
+def packValue(value, disp):
+    """Encode a single value as a type code followed by the value data"""
+    if value is None:
+        return _u8.pack(0)
+
+    elif isinstance(value,bool):
+        return _u8.pack(1) + _u8.pack(value)
+
+    elif isinstance(value,int):
+        if -(1 << 63) <= value < (1 << 63):
+            return _u8.pack(2) + _i64.pack(value)
+        else:
+            b = value.to_bytes((value.bit_length() + 8) // 8, 'little', signed=True)
+            return _u8.pack(5) + _u16.pack(len(b)) + b
+
+    elif isinstance(value,float):
+        return _u8.pack(3) + _f64.pack(value)
+
+    elif isinstance(value,str):
+        b = value.encode('utf-8')
+        return _u8.pack(4) + _u32.pack(len(b)) + b
+
+    else:
+        b = str(disp).encode('utf-8')
+        return _u8.pack(6) + _u32.pack(len(b)) + b
+
+
+def unpackValue(data):
+    """Decode a single value encoded by packValue()"""
+    data = bytes(data)
+    return _decodeValue(data[0],data,1)[0]
+
+
+def _encodeValue(pid, value, disp):
+    return _u32.pack(pid) + packValue(value,disp)
+
+
+def _decodeValue(code, data, off):
+    if code == 0:
+        return None, off
+
+    elif code == 1:
+        return bool(data[off]), off + 1
+
+    elif code == 2:
+        return _i64.unpack_from(data,off)[0], off + _i64.size
+
+    elif code == 3:
+        return _f64.unpack_from(data,off)[0], off + _f64.size
+
+    elif code == 4 or code == 6:
+        size = _u32.unpack_from(data,off)[0]
+        off += _u32.size
+        return data[off:off+size].decode('utf-8'), off + size
+
+    elif code == 5:
+        size = _u16.unpack_from(data,off)[0]
+        off += _u16.size
+        return int.from_bytes(data[off:off+size], 'little', signed=True), off + size
+
+    else:
+        raise UpdateFrameError(f"Unknown value type code {code}")
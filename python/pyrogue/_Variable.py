@@ -16,11 +16,10 @@
 import pyrogue as pr
 import textwrap
 import rogue.interfaces.memory
-import parse
-import Pyro4
 import math
 import inspect
 import threading
+import time
 from collections import Iterable
 
 class VariableError(Exception):
@@ -40,7 +39,10 @@ class BaseVariable(pr.Node):
                  hidden=False,
                  minimum=None,
                  maximum=None,
-                 pollInterval=0
+                 pollInterval=0,
+                 pollAlways=False,
+                 historySize=0,
+                 urgent=False
                 ):
 
         # Public Attributes
@@ -51,6 +53,9 @@ class BaseVariable(pr.Node):
         self._default       = value
         self._block         = None
         self._pollInterval  = pollInterval
+        self._pollAlways    = pollAlways
+        self._urgent        = urgent
+        self._history       = None
         self.__listeners    = []
         self.__functions    = []
         self.__dependencies = []
@@ -90,49 +95,73 @@ class BaseVariable(pr.Node):
            (self._mode != 'WO'):
             raise VariableError(f'Invalid variable mode {self._mode}. Supported: RW, RO, WO')
 
+        # Precompiled display formatter
+        if self._disp == 'enum':
+            self._formatter = self._enum.__getitem__
+        else:
+            fmt = self._disp.format
+
+            def formatter(value):
+                if value == '' or value is None:
+                    return value
+                else:
+                    return fmt(value)
+
+            self._formatter = formatter
+
+        # numpy is only required by variables with a history
+        if historySize > 0:
+            from pyrogue._History import VariableHistory
+            self._history = VariableHistory(historySize)
+
         # Call super constructor
         pr.Node.__init__(self, name=name, description=description, hidden=hidden)
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def enum(self):
         return self._enum
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def revEnum(self):
         return self._revEnum
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def typeStr(self):
         return self._typeStr
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def disp(self):
         return self._disp
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def mode(self):
         return self._mode
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def units(self):
         return self._units
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def minimum(self):
         return self._minimum
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def maximum(self):
         return self._maximum
 
+    @pr.expose
+    @property
+    def urgent(self):
+        return self._urgent
+
     def addDependency(self, dep):
         if dep not in self.__dependencies:
             self.__dependencies.append(dep)
@@ -147,10 +176,52 @@ class BaseVariable(pr.Node):
         self._pollInterval = interval
         self._updatePollInterval()
 
+    @pr.expose
+    @property
+    def pollAlways(self):
+        """Poll the variable with Root.PollOnDemand set even if nothing listens to it"""
+        return self._pollAlways
+
+    @pr.expose
+    @property
+    def historySize(self):
+        """Capacity of the value history, 0 if the variable keeps no history"""
+        return 0 if self._history is None else self._history.size
+
+    def _getHistory(self):
+        if self._history is None:
+            raise VariableError(f'Variable {self.path} has no history, set historySize')
+        return self._history
+
+    def history(self, count=None, since=None):
+        """
+        Return (times, values) numpy arrays of the last count updates with a
+        timestamp at or after since, oldest first. Both default to the full history.
+        """
+        return self._getHistory().arrays(count, since)
+
+    @pr.expose
+    def historyStats(self, count=None, since=None):
+        """Return a dictionary of statistics over the history, see VariableHistory.stats()"""
+        return self._getHistory().stats(count, since)
+
+    @pr.expose
+    def changedSince(self, stamp):
+        """Return True if the value in the history changed at or after the passed time"""
+        return self._getHistory().changedSince(stamp)
+
     @property
     def dependencies(self):
         return self.__dependencies
 
+    @property
+    def _listenerVars(self):
+        return self.__listeners
+
+    @property
+    def _listenerFuncs(self):
+        return self.__functions
+
     def addListener(self, listener):
         """
         Add a listener Variable or function to call when variable changes. 
@@ -159,10 +230,17 @@ class BaseVariable(pr.Node):
         """
         if isinstance(listener, BaseVariable):
             self.__listeners.append(listener)
+
+            # Dependency graph is built at start, rebuild if running
+            if self._root is not None and self._root.running:
+                self._root._buildVarGraph()
         else:
-            self.__functions.append(listener)
+            self.__functions.append(pr.VarListener(func=listener))
+
+        if self._root is not None:
+            self._root._pollSubscribeVar(self)
 
-    @Pyro4.expose
+    @pr.expose
     def set(self, value, write=True):
         """
         Set the value and write to hardware if applicable
@@ -182,7 +260,7 @@ class BaseVariable(pr.Node):
             self._log.exception(e)
             self._log.error("Error setting value '{}' to variable '{}' with type {}".format(value,self.path,self.typeStr))
 
-    @Pyro4.expose
+    @pr.expose
     def post(self,value):
         """
         Set the value and write to hardware if applicable using a posted write.
@@ -200,7 +278,7 @@ class BaseVariable(pr.Node):
             self._log.exception(e)
             self._log.error("Error posting value '{}' to variable '{}' with type {}".format(value,self.path,self.typeStr))
 
-    @Pyro4.expose
+    @pr.expose
     def get(self,read=True):
         """ 
         Return the value after performing a read from hardware if applicable.
@@ -224,32 +302,23 @@ class BaseVariable(pr.Node):
 
         return ret
 
-    @Pyro4.expose
+    @pr.expose
     def value(self):
         return self.get(read=False)
 
-    @Pyro4.expose
+    @pr.expose
     def genDisp(self, value):
-        #print('{}.genDisp(read={}) disp={} value={}'.format(self.path, read, self.disp, value))
-        if self.disp == 'enum':
-            #print('enum: {}'.format(self.enum))
-            #print('get: {}'.format(self.get(read)))
-            return self.enum[value]
-        else:
-            if value == '' or value is None:
-                return value
-            else:
-                return self.disp.format(value)
+        return self._formatter(value)
 
-    @Pyro4.expose
+    @pr.expose
     def getDisp(self, read=True):
         return(self.genDisp(self.get(read)))
 
-    @Pyro4.expose
+    @pr.expose
     def valueDisp(self, read=True):
         return self.getDisp(read=False)
 
-    @Pyro4.expose
+    @pr.expose
     def parseDisp(self, sValue):
         try:
             if sValue is None or isinstance(sValue, self.nativeType()):
@@ -274,11 +343,11 @@ class BaseVariable(pr.Node):
         except:
             raise VariableError("Invalid value {} for variable {} with type {}".format(sValue,self.name,self.nativeType()))
 
-    @Pyro4.expose
+    @pr.expose
     def setDisp(self, sValue, write=True):
         self.set(self.parseDisp(sValue), write)
 
-    @Pyro4.expose
+    @pr.expose
     def nativeType(self):
         return type(self.value())
 
@@ -288,7 +357,7 @@ class BaseVariable(pr.Node):
             self.setDisp(self._default, write=False)
 
     def _updatePollInterval(self):
-        if self._pollInterval > 0 and self.root._pollQueue is not None:
+        if self.root._pollQueue is not None:
             self.root._pollQueue.updatePollInterval(self)
 
     def _finishInit(self):
@@ -305,26 +374,44 @@ class BaseVariable(pr.Node):
         else:
             return None
 
+    def _describe(self):
+        ret = pr.Node._describe(self)
+        ret.update({'mode'         : self.mode,
+                    'typeStr'      : self.typeStr,
+                    'disp'         : self.disp,
+                    'enum'         : self.enum,
+                    'units'        : self.units,
+                    'minimum'      : self.minimum,
+                    'maximum'      : self.maximum,
+                    'urgent'       : self.urgent,
+                    'pollInterval' : self.pollInterval,
+                    'pollAlways'   : self.pollAlways,
+                    'historySize'  : self.historySize})
+        return ret
+
     def _queueUpdate(self):
+        # Listening variables are added by the root update worker
         self._root._queueUpdates(self)
 
-        for var in self.__listeners:
-            var._queueUpdate()
-
     def _doUpdate(self):
+        """
+        Decode the variable once and format the display string from that value.
+        Called by the root update worker once per variable per update group.
+        """
         value = self.value()
-        disp  = self.valueDisp()
+        disp  = self.genDisp(value)
 
-        for func in self.__functions:
-            if hasattr(func,'varListener'):
-                func.varListener(self.path,value,disp)
-            else:
-                func(self.path,value,disp)
+        if self._history is not None:
+            self._history.append(time.time(), value)
+
+        # Delivered by the root listener workers
+        for l in self.__functions:
+            self._root._deliver(l,[(self.path,value,disp)])
 
         return self.path,value,disp
 
 
-@Pyro4.expose
+@pr.expose
 class RemoteVariable(BaseVariable):
 
     def __init__(self, *,
@@ -343,8 +430,12 @@ class RemoteVariable(BaseVariable):
                  bitSize=32,
                  bitOffset=0,
                  pollInterval=0, 
+                 pollAlways=False,
+                 historySize=0,
                  overlapEn=False,
-                 verify=True, ):
+                 verify=True,
+                 deadband=None,
+                 urgent=False):
 
         if disp is None:
             disp = base.defaultdisp
@@ -353,7 +444,8 @@ class RemoteVariable(BaseVariable):
                               mode=mode, value=value, disp=disp, 
                               enum=enum, units=units, hidden=hidden,
                               minimum=minimum, maximum=maximum,
-                              pollInterval=pollInterval)
+                              pollInterval=pollInterval, pollAlways=pollAlways,
+                              historySize=historySize, urgent=urgent)
 
         self._base     = base        
         self._block    = None
@@ -381,38 +473,47 @@ class RemoteVariable(BaseVariable):
         self._typeStr   = base.name(sum(bitSize))
         self._bytes     = int(math.ceil(float(self._bitOffset[-1] + self._bitSize[-1]) / 8.0))
         self._overlapEn = overlapEn
+        self._deadband  = deadband
+
+        if deadband is not None and base.pytype not in (int, float):
+            raise VariableError(f'Deadband is only supported for numeric variables. Variable {name} has base {base.__name__}')
 
 
     @property
     def varBytes(self):
         return self._bytes
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def offset(self):
         return self._offset
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def bitSize(self):
         return self._bitSize
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def bitOffset(self):
         return self._bitOffset
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def verify(self):
         return self._verify
 
-    @Pyro4.expose
+    @pr.expose
     @property
     def base(self):
         return self._base
 
-    @Pyro4.expose
+    @pr.expose
+    @property
+    def deadband(self):
+        return self._deadband
+
+    @pr.expose
     def parseDisp(self, sValue):
         if sValue is None or isinstance(sValue, self.nativeType()):
             return sValue
@@ -457,7 +558,10 @@ class LocalVariable(BaseVariable):
                  maximum=None,
                  localSet=None,
                  localGet=None,
-                 pollInterval=0):
+                 pollInterval=0,
+                 pollAlways=False,
+                 historySize=0,
+                 urgent=False):
 
         if value is None:
             raise VariableError(f'LocalVariable {self.path} must specify value= argument in constructor')
@@ -466,10 +570,17 @@ class LocalVariable(BaseVariable):
                               mode=mode, value=value, disp=disp, 
                               enum=enum, units=units, hidden=hidden,
                               minimum=minimum, maximum=maximum,
-                              pollInterval=pollInterval)
+                              pollInterval=pollInterval, pollAlways=pollAlways,
+                              historySize=historySize, urgent=urgent)
 
         self._block = pr.LocalBlock(variable=self,localSet=localSet,localGet=localGet,value=self._default)
 
+    def _rootAttached(self, parent, root):
+        BaseVariable._rootAttached(self, parent, root)
+
+        # The block is created before the variable is added to a device
+        self._block._device = parent
+
     def __get__(self):
         return self.get(read=False)
 
@@ -525,7 +636,7 @@ class LocalVariable(BaseVariable):
         self._block._ior(other)
         return self
 
-@Pyro4.expose
+@pr.expose
 class LinkVariable(BaseVariable):
 
     def __init__(self, *,
@@ -560,6 +671,10 @@ class LinkVariable(BaseVariable):
         # Must be done after super cunstructor to override it
         self._typeStr = typeStr        
 
+        # Resolve function arguments once
+        self._linkedGet = functionWrapper(function=self._linkedGet, callArgs=['dev','var','read'], log=self._log, path=self.path)
+        self._linkedSet = functionWrapper(function=self._linkedSet, callArgs=['dev','var','value','write'], log=self._log, path=self.path)
+
         # Dependency tracking
         if variable is not None:
             # Add the directly linked variable as a dependency
@@ -573,70 +688,83 @@ class LinkVariable(BaseVariable):
         # Allow dependencies to be accessed as indicies of self
         return self.dependencies[key]
 
-    @Pyro4.expose
+    @pr.expose
     def set(self, value, write=True):
         if self._linkedSet is not None:
+            self._linkedSet(dev=self.parent, var=self, value=value, write=write)
+
+    @pr.expose
+    def get(self, read=True):
+        if self._linkedGet is None:
+            return None
 
-            # Possible args
-            pargs = {'dev' : self.parent, 'var' : self, 'value' : value, 'write' : write}
+        # Values are memoised for the update group being processed
+        memo = self._root._updateMemo if (not read and self._root is not None) else None
 
-            varFuncHelper(self._linkedSet,pargs,self._log,self.path)
+        if memo is not None and self in memo:
+            return memo[self]
 
-    @Pyro4.expose
-    def get(self, read=True):
-        if self._linkedGet is not None:
+        ret = self._linkedGet(dev=self.parent, var=self, read=read)
 
-            # Possible args
-            pargs = {'dev' : self.parent, 'var' : self, 'read' : read}
+        if memo is not None:
+            memo[self] = ret
 
-            return varFuncHelper(self._linkedGet,pargs,self._log,self.path)
-        else:
-            return None
+        return ret
 
 
 # Function helper
-def varFuncHelper(func,pargs,log,path):
-
-    if not callable(func):
+def functionWrapper(*, function, callArgs, log, path):
+    """
+    Create a call adapter for a user supplied variable or command function.
+    The adapter is called with keyword arguments for all of the names in callArgs
+    and passes on only those the function accepts. The function signature is
+    resolved once here instead of on every call. Deprecated eval strings are
+    compiled once. Returns None if function is None.
+    """
+    if function is None:
+        return None
+
+    if not callable(function):
         log.warning("Using deprecated eval string. Please change to function: {}".format(path))
 
-        dev   = None
-        var   = None
-        cmd   = None
-        arg   = None
-        value = 0
+        code = compile(textwrap.dedent(function),path,'exec')
 
-        if 'dev' in pargs:
-            dev = pargs['dev']
+        def evalWrapper(**kwargs):
+            ns = {'dev'   : kwargs.get('dev'),
+                  'var'   : kwargs.get('var'),
+                  'cmd'   : kwargs.get('cmd'),
+                  'arg'   : kwargs.get('arg'),
+                  'value' : 0}
 
-        if 'var' in pargs:
-            var = pargs['var']
+            exec(code,ns)
+            return ns['value']
 
-        if 'cmd' in pargs:
-            cmd = pargs['cmd']
+        evalWrapper.args = []
+        return evalWrapper
 
-        if 'arg' in pargs:
-            arg = pargs['arg']
+    # Python functions
+    try:
+        spec = inspect.getfullargspec(function)
+        args = [k for k in spec.args + spec.kwonlyargs if k in callArgs]
 
-        ns = locals()
-        exec(textwrap.dedent(func),ns)
-        value = ns['value']
-        return value
+    # handle c++ functions, no args supported for now
+    except:
+        args = []
 
+    if len(args) == 0:
+        def wrapper(**kwargs):
+            return function()
     else:
+        def wrapper(**kwargs):
+            return function(**{k:kwargs[k] for k in args})
 
-        # Python functions
-        try:
-            # Function args
-            fargs = inspect.getfullargspec(func).args + \
-                    inspect.getfullargspec(func).kwonlyargs 
-
-            # Build overlapping arg list
-            args = {k:pargs[k] for k in fargs if k is not 'self' and k in pargs}
+    wrapper.args = args
+    return wrapper
 
-        # handle c++ functions, no args supported for now
-        except:
-            args = {}
-
-        return func(**args)
 
+def varFuncHelper(func,pargs,log,path):
+    """
+    Call func with the overlapping args from pargs.
+    The signature is resolved on each call, use functionWrapper for repeated calls.
+    """
+    return functionWrapper(function=func,callArgs=pargs,log=log,path=path)(**pargs)
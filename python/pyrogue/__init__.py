@@ -8,6 +8,7 @@
 # contained in the LICENSE.txt file.
 #-----------------------------------------------------------------------------
 import sys
+import importlib
 
 MIN_PYTHON = (3,6)
 if sys.version_info < MIN_PYTHON:
@@ -22,6 +23,49 @@ from pyrogue._Device    import *
 from pyrogue._Memory    import *
 from pyrogue._Root      import *
 from pyrogue._PollQueue import *
+from pyrogue._LinkScheduler import *
+from pyrogue._UpdateFrame import *
+
+# Attributes which pull in heavy or optional packages (Pyro4, numpy, interfaces)
+# are only imported on first access through the module level __getattr__
+_lazyAttrs = {
+    'PyroNode'             : 'pyrogue._Pyro',
+    'PyroRoot'             : 'pyrogue._Pyro',
+    'PyroClient'           : 'pyrogue._Pyro',
+    'PyroNodeTable'        : 'pyrogue._Pyro',
+    'recreate_OrderedDict' : 'pyrogue._Pyro',
+    'VariableHistory'      : 'pyrogue._History',
+}
+
+_lazyModules = ['gui', 'interfaces', 'protocols', 'utilities']
+
+def __getattr__(name):
+    if name in _lazyAttrs:
+        ret = getattr(importlib.import_module(_lazyAttrs[name]),name)
+    elif name in _lazyModules:
+        ret = importlib.import_module('pyrogue.' + name)
+    else:
+        raise AttributeError(f"module 'pyrogue' has no attribute '{name}'")
+
+    globals()[name] = ret
+    return ret
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_lazyAttrs.keys()) + _lazyModules)
+
+# Module level __getattr__ is only supported for python 3.7 and later,
+# older versions resolve the lazy attributes through the module class
+if sys.version_info < (3,7):
+    import types
+
+    class _LazyModule(types.ModuleType):
+        def __getattr__(self, name):
+            return __getattr__(name)
+
+        def __dir__(self):
+            return __dir__()
+
+    sys.modules[__name__].__class__ = _LazyModule
 
 def streamConnect(source, dest):
     """
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : PyRogue asyncio client
+#-----------------------------------------------------------------------------
+# File       : pyrogue/interfaces/asyncclient.py
+# Created    : 2018-08-22
+#-----------------------------------------------------------------------------
+# Description:
+# asyncio interface to a tree through a blocking client: a local Root,
+# a PyroRoot from PyroClient or a ZmqClient. For a ZmqServer the native
+# pyrogue.interfaces.zmqserver.AsyncZmqClient does not need any threads.
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import asyncio
+import concurrent.futures
+import functools
+
+class AsyncClient(object):
+    """
+    Awaitable get/set/exec and batched calls on a blocking client.
+    Calls from all tasks share a pool of at most maxWorkers threads, so the
+    number of threads does not grow with the number of outstanding calls.
+    Several clients may share one pool by passing executor.
+    """
+
+    def __init__(self, client, *, maxWorkers=4, executor=None):
+        self._client = client
+        self._own    = executor is None
+
+        if executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers)
+        else:
+            self._executor = executor
+
+    def close(self):
+        if self._own:
+            self._executor.shutdown(wait=False)
+
+    async def _call(self, name, *args):
+        func = functools.partial(getattr(self._client,name),*args)
+        return await asyncio.get_event_loop().run_in_executor(self._executor,func)
+
+    def updates(self, patterns=None, maxBacklog=1000):
+        """
+        Return an async iterator over (path,value,disp) updates matching the passed
+        patterns, see pyrogue.pathMatcher. Updates arrive on client threads and
+        are handed to the event loop. When more than maxBacklog updates are waiting
+        the oldest are dropped.
+        """
+        it = AsyncUpdates(maxBacklog=maxBacklog, client=self._client)
+        self._client.addVarListener(it,patterns=patterns)
+        return it
+
+    async def get(self, path):
+        return await self._call('get',path)
+
+    async def getDisp(self, path):
+        return await self._call('getDisp',path)
+
+    async def value(self, path):
+        return await self._call('value',path)
+
+    async def valueDisp(self, path):
+        return await self._call('valueDisp',path)
+
+    async def set(self, path, value):
+        return await self._call('set',path,value)
+
+    async def setDisp(self, path, value):
+        return await self._call('setDisp',path,value)
+
+    async def exec(self, path, arg=None):
+        return await self._call('exec',path,arg)
+
+    async def getMany(self, paths, read=True, disp=False):
+        return await self._call('getMany',list(paths),read,disp)
+
+    async def setMany(self, values, write=True, disp=False):
+        return await self._call('setMany',values,write,disp)
+
+    async def snapshot(self, path=None, modes=['RW','RO','WO'], read=False):
+        return await self._call('snapshot',path,modes,read)
+
+    async def history(self, path, count=None, since=None):
+        return await self._call('history',path,count,since)
+
+    async def historyStats(self, path, count=None, since=None):
+        return await self._call('historyStats',path,count,since)
+
+    async def changedSince(self, path, stamp):
+        return await self._call('changedSince',path,stamp)
+
+    async def describe(self, path=None):
+        return await self._call('describe',path)
+
+
+class AsyncUpdates(object):
+    """
+    Variable listener which queues updates for an asyncio task.
+    Must be created from within the event loop. close() removes the
+    listener from the passed client.
+    """
+
+    def __init__(self, *, maxBacklog=1000, client=None):
+        self._loop   = asyncio.get_event_loop()
+        self._queue  = asyncio.Queue(maxsize=maxBacklog)
+        self._client = client
+        self._closed = False
+
+    def close(self):
+        """Stop queueing updates and remove the listener from the client"""
+        if self._closed:
+            return
+
+        self._closed = True
+
+        if self._client is not None:
+            self._client.removeVarListener(self)
+
+    def varListener(self, path, value, disp):
+        if not self._closed:
+            self._loop.call_soon_threadsafe(self._put,(path,value,disp))
+
+    def __call__(self, path, value, disp):
+        self.varListener(path,value,disp)
+
+    def _put(self, ent):
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(ent)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        return await self._queue.get()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : PyRogue ZeroMQ interface
+#-----------------------------------------------------------------------------
+# File       : pyrogue/interfaces/zmqserver.py
+# Created    : 2018-08-22
+#-----------------------------------------------------------------------------
+# Description:
+# Serves a root over ZeroMQ. Variable updates are published on a PUB socket
+# and get/set/exec requests are handled on a REP socket at the next port.
+#
+# Each update is a three part message: path, value, display string. The path
+# is the message topic so clients subscribe by path prefix and the filtering
+# is done by ZeroMQ. The server only listens to the root for the prefixes
+# which clients have subscribed to, so with Root.PollOnDemand set blocks
+# are not polled for the server alone. The value part starts with a format byte: 'J' for json
+# or 'B' for the typed binary encoding of pyrogue.packValue().
+#
+# Requests and replies are json dictionaries:
+#    request : {'cmd': name, 'args': [...], 'kwargs': {...}}
+#    reply   : {'result': value} or {'error': message}
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import threading
+import asyncio
+import json
+import pyrogue
+import zmq
+import zmq.asyncio
+
+# Root methods which can be called through the request socket
+ZmqCommands = ['get', 'getDisp', 'value', 'valueDisp', 'set', 'setDisp', 'exec',
+               'getMany', 'setMany', 'snapshot', 'describe', 'structureHash',
+               'history', 'historyStats', 'changedSince']
+
+class ZmqException(Exception):
+    pass
+
+def _decodeUpdate(msg):
+    """Decode a published update message to (path, value, disp)"""
+    path, val, disp = msg
+
+    if val[0:1] == b'B':
+        value = pyrogue.unpackValue(val[1:])
+    else:
+        value = json.loads(val[1:].decode('utf-8'))
+
+    return path.decode('utf-8'), value, disp.decode('utf-8')
+
+def _subPrefixes(patterns):
+    """Topic prefixes which cover the passed path patterns"""
+    if patterns is None:
+        return ['']
+    else:
+        return [p.split('*')[0].split('?')[0] for p in patterns]
+
+class ZmqServer(object):
+
+    def __init__(self, *, root, addr='*', port=9099, binary=False):
+        self._root   = root
+        self._binary = binary
+        self._runEn  = True
+        self._log    = pyrogue.logInit(self)
+
+        self._ctx = zmq.Context()
+        self._pub = self._ctx.socket(zmq.XPUB)
+        self._rep = self._ctx.socket(zmq.REP)
+        self._pub.bind("tcp://{}:{}".format(addr,port))
+        self._rep.bind("tcp://{}:{}".format(addr,port+1))
+
+        self._pubLock = threading.Lock()
+        self._topics  = set()
+
+        self._log.info("Zmq server publishing on port {}, requests on port {}".format(port,port+1))
+
+        self._root.addVarListener(self._varUpdates,patterns=[],batch=True)
+
+        self._thread = threading.Thread(target=self._reqRun)
+        self._thread.start()
+
+    def stop(self):
+        self._root.removeVarListener(self._varUpdates)
+        self._runEn = False
+        self._thread.join()
+
+        with self._pubLock:
+            self._pub.close()
+
+        self._ctx.term()
+
+    def _varUpdates(self, entries):
+        with self._pubLock:
+            if self._pub.closed:
+                return
+
+            for path,value,disp in entries:
+                if self._binary:
+                    val = b'B' + pyrogue.packValue(value,disp)
+                else:
+                    val = b'J' + json.dumps(value,default=str).encode('utf-8')
+
+                self._pub.send_multipart([path.encode('utf-8'), val, str(disp).encode('utf-8')])
+
+    def _reqRun(self):
+        while self._runEn:
+            self._subUpdates()
+
+            if self._rep.poll(100) == 0:
+                continue
+
+            self._rep.send(self._doRequest(self._rep.recv()))
+
+        self._rep.close()
+
+    def _subUpdates(self):
+        """Track the topics subscribed to by clients and listen to the root for them"""
+        changed = False
+
+        with self._pubLock:
+            while True:
+                try:
+                    msg = self._pub.recv(zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+
+                topic = msg[1:].decode('utf-8')
+
+                if msg[0:1] == b'\x01':
+                    self._topics.add(topic)
+                else:
+                    self._topics.discard(topic)
+
+                changed = True
+
+        if changed:
+            if '' in self._topics:
+                patterns = None
+            else:
+                patterns = [t + '*' for t in self._topics]
+
+            self._root.setVarListenerPatterns(self._varUpdates,patterns)
+
+    def _doRequest(self, msg):
+        req = {}
+
+        try:
+            req = json.loads(msg.decode('utf-8'))
+            cmd = req['cmd']
+
+            if cmd not in ZmqCommands:
+                raise ZmqException("Invalid command {}".format(cmd))
+
+            ret = {'result' : getattr(self._root,cmd)(*req.get('args',[]),**req.get('kwargs',{}))}
+
+        except Exception as e:
+            ret = {'error' : str(e)}
+
+        # Pipelined clients match replies to requests by id
+        if isinstance(req,dict) and 'id' in req:
+            ret['id'] = req['id']
+
+        return json.dumps(ret,default=str).encode('utf-8')
+
+
+class ZmqClient(object):
+    """
+    Client for a root served by ZmqServer. Requests are sent on a REQ socket,
+    variable updates are received on a SUB socket and passed to the listeners
+    from a receive thread.
+    """
+
+    def __init__(self, *, addr='localhost', port=9099, timeout=5.0):
+        self._addr      = addr
+        self._port      = port
+        self._timeout   = int(timeout * 1000)
+        self._listeners = []
+        self._reqLock   = threading.Lock()
+        self._subLock   = threading.Lock()
+        self._runEn     = True
+        self._log       = pyrogue.logInit(self)
+
+        self._ctx = zmq.Context()
+        self._req = None
+        self._sub = self._ctx.socket(zmq.SUB)
+        self._sub.connect("tcp://{}:{}".format(addr,port))
+
+        self._thread = threading.Thread(target=self._subRun)
+        self._thread.start()
+
+    def stop(self):
+        self._runEn = False
+        self._thread.join()
+
+        with self._reqLock:
+            if self._req is not None:
+                self._req.close(linger=0)
+
+        self._ctx.term()
+
+    def addVarListener(self, func, patterns=None):
+        """
+        Add a listener function, called as func(path,value,disp) for
+        updates matching the passed patterns, see pyrogue.pathMatcher.
+        Patterns default to all paths.
+        """
+        with self._subLock:
+            self._listeners.append((func,pyrogue.pathMatcher(patterns),_subPrefixes(patterns)))
+
+            for p in self._listeners[-1][2]:
+                self._sub.setsockopt(zmq.SUBSCRIBE,p.encode('utf-8'))
+
+    def removeVarListener(self, func):
+        """Remove a listener previously passed to addVarListener() and its subscriptions"""
+        with self._subLock:
+            for ent in [l for l in self._listeners if l[0] == func]:
+                self._listeners.remove(ent)
+
+                for p in ent[2]:
+                    self._sub.setsockopt(zmq.UNSUBSCRIBE,p.encode('utf-8'))
+
+    def _subRun(self):
+        while self._runEn:
+            with self._subLock:
+                if self._sub.poll(100) == 0:
+                    continue
+
+                msg = self._sub.recv_multipart()
+                listeners = list(self._listeners)
+
+            path, value, disp = _decodeUpdate(msg)
+
+            for func,match,prefixes in listeners:
+                if match(path):
+                    try:
+                        func(path,value,disp)
+                    except Exception:
+                        self._log.exception("Zmq listener error for {}".format(path))
+
+        self._sub.close()
+
+    def _remote(self, cmd, *args, **kwargs):
+        msg = json.dumps({'cmd' : cmd, 'args' : args, 'kwargs' : kwargs}).encode('utf-8')
+
+        with self._reqLock:
+            if self._req is None:
+                self._req = self._ctx.socket(zmq.REQ)
+                self._req.setsockopt(zmq.RCVTIMEO,self._timeout)
+                self._req.setsockopt(zmq.LINGER,0)
+                self._req.connect("tcp://{}:{}".format(self._addr,self._port+1))
+
+            try:
+                self._req.send(msg)
+                ret = json.loads(self._req.recv().decode('utf-8'))
+
+            # A REQ socket can not be reused after a lost reply
+            except zmq.Again:
+                self._req.close()
+                self._req = None
+                raise ZmqException("Timeout waiting for {} reply from {}:{}".format(cmd,self._addr,self._port+1))
+
+        if 'error' in ret:
+            raise ZmqException(ret['error'])
+
+        return ret['result']
+
+    def get(self, path):
+        return self._remote('get',path)
+
+    def getDisp(self, path):
+        return self._remote('getDisp',path)
+
+    def value(self, path):
+        return self._remote('value',path)
+
+    def valueDisp(self, path):
+        return self._remote('valueDisp',path)
+
+    def set(self, path, value):
+        return self._remote('set',path,value)
+
+    def setDisp(self, path, value):
+        return self._remote('setDisp',path,value)
+
+    def exec(self, path, arg=None):
+        return self._remote('exec',path,arg)
+
+    def getMany(self, paths, read=True, disp=False):
+        return self._remote('getMany',list(paths),read,disp)
+
+    def setMany(self, values, write=True, disp=False):
+        return self._remote('setMany',values,write,disp)
+
+    def snapshot(self, path=None, modes=['RW','RO','WO'], read=False):
+        return self._remote('snapshot',path,modes,read)
+
+    def history(self, path, count=None, since=None):
+        return self._remote('history',path,count,since)
+
+    def historyStats(self, path, count=None, since=None):
+        return self._remote('historyStats',path,count,since)
+
+    def changedSince(self, path, stamp):
+        return self._remote('changedSince',path,stamp)
+
+    def describe(self, path=None):
+        return self._remote('describe',path)
+
+
+class AsyncZmqClient(object):
+    """
+    asyncio client for a root served by ZmqServer. Requests are pipelined on a
+    DEALER socket, so any number of calls can be outstanding at once from a
+    single task or thread. Replies are matched to requests by a request id.
+    updates() returns an async iterator over variable updates.
+    """
+
+    def __init__(self, *, addr='localhost', port=9099, timeout=5.0):
+        self._addr    = addr
+        self._port    = port
+        self._timeout = timeout
+        self._pending = {} # {id: future} of the requests waiting for a reply
+        self._nextId  = 0
+        self._reader  = None
+
+        self._ctx = zmq.asyncio.Context()
+        self._req = self._ctx.socket(zmq.DEALER)
+        self._req.setsockopt(zmq.LINGER,0)
+        self._req.connect("tcp://{}:{}".format(addr,port+1))
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+
+        self._req.close()
+        self._ctx.term()
+
+    async def _remote(self, cmd, *args, **kwargs):
+        rid = self._nextId
+        self._nextId += 1
+
+        msg = json.dumps({'id' : rid, 'cmd' : cmd, 'args' : args, 'kwargs' : kwargs}).encode('utf-8')
+        fut = asyncio.get_event_loop().create_future()
+
+        if self._reader is None:
+            self._reader = asyncio.ensure_future(self._readRun())
+
+        self._pending[rid] = fut
+
+        try:
+            await self._req.send_multipart([b'',msg])
+            ret = await asyncio.wait_for(fut,self._timeout)
+        except asyncio.TimeoutError:
+            raise ZmqException("Timeout waiting for {} reply from {}:{}".format(cmd,self._addr,self._port+1))
+        finally:
+            self._pending.pop(rid,None)
+
+        if 'error' in ret:
+            raise ZmqException(ret['error'])
+
+        return ret['result']
+
+    async def _readRun(self):
+        while True:
+            empty, msg = await self._req.recv_multipart()
+            ret = json.loads(msg.decode('utf-8'))
+            fut = self._pending.get(ret.pop('id',None))
+
+            # Late replies to timed out requests are dropped
+            if fut is not None and not fut.done():
+                fut.set_result(ret)
+
+    async def updates(self, patterns=None):
+        """Async iterator over (path,value,disp) updates matching the passed patterns"""
+        match = pyrogue.pathMatcher(patterns)
+        sub   = self._ctx.socket(zmq.SUB)
+        sub.connect("tcp://{}:{}".format(self._addr,self._port))
+
+        for p in _subPrefixes(patterns):
+            sub.setsockopt(zmq.SUBSCRIBE,p.encode('utf-8'))
+
+        try:
+            while True:
+                ent = _decodeUpdate(await sub.recv_multipart())
+
+                if match(ent[0]):
+                    yield ent
+        finally:
+            sub.close(linger=0)
+
+    async def get(self, path):
+        return await self._remote('get',path)
+
+    async def getDisp(self, path):
+        return await self._remote('getDisp',path)
+
+    async def value(self, path):
+        return await self._remote('value',path)
+
+    async def valueDisp(self, path):
+        return await self._remote('valueDisp',path)
+
+    async def set(self, path, value):
+        return await self._remote('set',path,value)
+
+    async def setDisp(self, path, value):
+        return await self._remote('setDisp',path,value)
+
+    async def exec(self, path, arg=None):
+        return await self._remote('exec',path,arg)
+
+    async def getMany(self, paths, read=True, disp=False):
+        return await self._remote('getMany',list(paths),read,disp)
+
+    async def setMany(self, values, write=True, disp=False):
+        return await self._remote('setMany',values,write,disp)
+
+    async def snapshot(self, path=None, modes=['RW','RO','WO'], read=False):
+        return await self._remote('snapshot',path,modes,read)
+
+    async def history(self, path, count=None, since=None):
+        return await self._remote('history',path,count,since)
+
+    async def historyStats(self, path, count=None, since=None):
+        return await self._remote('historyStats',path,count,since)
+
+    async def changedSince(self, path, stamp):
+        return await self._remote('changedSince',path,stamp)
+
+    async def describe(self, path=None):
+        return await self._remote('describe',path)
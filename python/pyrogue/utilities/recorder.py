@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : PyRogue Time Series Recorder
+#-----------------------------------------------------------------------------
+# File       : pyrogue/utilities/recorder.py
+# Created    : 2018-08-22
+#-----------------------------------------------------------------------------
+# Description:
+# Records (timestamp, value) samples of selected variables into NumPy ring
+# buffers and periodically flushes them to append-only segment files.
+#
+# Storage layout of a data directory:
+#    index.jsonl   : one json line per variable in each segment, appended
+#                    after the segment file is written
+#    <seg>.npz     : one file per flush, holding a t<var> array of float64
+#                    timestamps in seconds since the epoch and a v<var> array
+#                    of values for each variable with new samples
+#
+# Each index line holds the path, file and array names, sample count and first
+# and last timestamp of a variable in the segment. Segments are only ever
+# added, never modified.
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import os
+import json
+import threading
+import time
+import numpy as np
+import pyrogue
+from pyrogue._History import VariableHistory
+
+class RecorderReader(object):
+    """Query access to the segments of a recorder data directory"""
+
+    def __init__(self, dataDir):
+        self._dir   = dataDir
+        self._index = {} # {path: [segment,...]}
+        self._pos   = 0  # Bytes of the index file already read
+        self._lock  = threading.Lock()
+
+    def _load(self):
+        fname = os.path.join(self._dir, 'index.jsonl')
+
+        if not os.path.isfile(fname):
+            return
+
+        with open(fname,'r') as f:
+            f.seek(self._pos)
+
+            for line in f:
+                # A partial line is read again on the next call
+                if not line.endswith('\n'):
+                    break
+
+                seg = json.loads(line)
+                self._index.setdefault(seg['path'],[]).append(seg)
+                self._pos += len(line.encode('utf-8'))
+
+    def paths(self):
+        """List of recorded variable paths"""
+        with self._lock:
+            self._load()
+            return list(self._index)
+
+    def segments(self, path):
+        """List of index entries for the passed path"""
+        with self._lock:
+            self._load()
+            return list(self._index.get(path,[]))
+
+    def query(self, path, start=None, end=None):
+        """
+        Return (times, values) arrays of the samples of a variable with
+        start <= time < end. start and end default to the full range.
+        Only the arrays of the variable are read from each segment file.
+        """
+        times  = []
+        values = []
+
+        for seg in self.segments(path):
+            if (start is not None and seg['end'] < start) or (end is not None and seg['start'] >= end):
+                continue
+
+            with np.load(os.path.join(self._dir, seg['file'])) as z:
+                t = z[seg['time']]
+                v = z[seg['value']]
+
+            lo = 0 if start is None else np.searchsorted(t, start, 'left')
+            hi = len(t) if end is None else np.searchsorted(t, end, 'left')
+
+            times.append(t[lo:hi])
+            values.append(v[lo:hi])
+
+        if len(times) == 0:
+            return np.zeros(0, dtype='f8'), np.zeros(0)
+
+        return np.concatenate(times), np.concatenate(values)
+
+
+class Recorder(pyrogue.Device):
+    """
+    Records the values of the variables matching the passed patterns, see
+    pyrogue.pathMatcher(). Updates are kept in a ring buffer of bufferSize
+    samples for each variable and flushed to a new segment file in dataDir every
+    flushPeriod seconds while open is set. Variables with values which are not
+    numeric are ignored.
+    """
+
+    def __init__(self, *, patterns=None, bufferSize=100000, hidden=True, **kwargs):
+        pyrogue.Device.__init__(self, hidden=hidden, **kwargs)
+
+        self._patterns = patterns
+        self._buffers  = {} # {path: VariableHistory}
+        self._varIds   = {} # {path: id} used in segment file names
+        self._ignored  = set()
+        self._bufLock  = threading.Lock()
+        self._fileLock = threading.Lock()
+        self._reader   = None
+        self._segment  = 0
+        self._thread   = None
+        self._runEn    = False
+        self._stopEv   = threading.Event()
+
+        self.add(pyrogue.LocalVariable(
+            name='dataDir',
+            mode='RW',
+            value='',
+            description='Directory holding the segment files and index.'))
+
+        self.add(pyrogue.LocalVariable(
+            name='open',
+            mode='RW',
+            value=False,
+            localSet=self._setOpen,
+            description='Record state. Samples are only recorded while set.'))
+
+        self.add(pyrogue.LocalVariable(
+            name='bufferSize',
+            mode='RW',
+            value=bufferSize,
+            description='Samples held in memory for each variable. Applies to variables first seen after a change.'))
+
+        self.add(pyrogue.LocalVariable(
+            name='flushPeriod',
+            mode='RW',
+            value=10.0,
+            units='s',
+            description='Time between flushes of the ring buffers to segment files.'))
+
+        self.add(pyrogue.LocalVariable(
+            name='sampleCount',
+            mode='RO',
+            value=0,
+            pollInterval=1,
+            localGet=lambda: sum(b.appended for b in list(self._buffers.values())),
+            description='Samples recorded since the recorder was created.'))
+
+        self.add(pyrogue.LocalVariable(
+            name='droppedCount',
+            mode='RO',
+            value=0,
+            pollInterval=1,
+            localGet=lambda: sum(b.dropped for b in list(self._buffers.values())),
+            description='Samples overwritten in the ring buffers before they were flushed.'))
+
+        self.add(pyrogue.LocalVariable(
+            name='segmentCount',
+            mode='RO',
+            value=0,
+            pollInterval=1,
+            localGet=lambda: self._segment,
+            description='Segments written to the data directory.'))
+
+        self.add(pyrogue.LocalCommand(
+            name='flush',
+            function=self._flush,
+            description='Flush the ring buffers to segment files now.'))
+
+    def _rootAttached(self, parent, root):
+        pyrogue.Device._rootAttached(self, parent, root)
+        root.addVarListener(self._varUpdates, patterns=self._patterns, batch=True)
+
+    def _stop(self):
+        # Stops the flush thread and writes the remaining samples
+        self.open.set(False)
+        pyrogue.Device._stop(self)
+
+    def _setOpen(self, value, changed):
+        if not changed:
+            return
+
+        if value:
+            dataDir = self.dataDir.value()
+
+            try:
+                if dataDir == '':
+                    raise ValueError('dataDir is not set')
+                os.makedirs(dataDir, exist_ok=True)
+            except (ValueError, OSError) as e:
+                self._log.error(f'Recorder open rejected: {e}')
+                self.open.set(False)
+                return
+
+            with self._fileLock:
+                self._reader  = RecorderReader(dataDir)
+                self._segment = self._lastSegment() + 1
+
+            self._runEn = True
+            self._stopEv.clear()
+            self._thread = threading.Thread(target=self._flushRun)
+            self._thread.start()
+
+        else:
+            self._runEn = False
+            self._stopEv.set()
+
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+
+            self._flush()
+
+    def _varUpdates(self, entries):
+        if not self._runEn:
+            return
+
+        stamp = time.time()
+
+        with self._bufLock:
+            for path,value,disp in entries:
+                if path in self._ignored or path.startswith(self.path + '.'):
+                    continue
+
+                buf = self._buffers.get(path)
+
+                if buf is None:
+                    buf = VariableHistory(self.bufferSize.value())
+                    buf.append(stamp, value)
+
+                    # The first value sets the type, paths with other values are ignored
+                    if buf.dtype is None:
+                        self._ignored.add(path)
+                    else:
+                        self._buffers[path] = buf
+                        self._varIds[path]  = len(self._varIds)
+
+                else:
+                    buf.append(stamp, value)
+
+    def _flushRun(self):
+        while not self._stopEv.wait(self.flushPeriod.value()):
+            try:
+                self._flush()
+            except Exception as e:
+                self._log.exception(e)
+
+    def _lastSegment(self):
+        last = -1
+        for seg in self._reader.paths():
+            for s in self._reader.segments(seg):
+                last = max(last, s['segment'])
+        return last
+
+    def _flush(self):
+        """Write the unflushed samples of each variable to a new segment"""
+        with self._bufLock:
+            data = [(p, self._varIds[p], b.unflushed()) for p,b in self._buffers.items()]
+
+        with self._fileLock:
+            if self._reader is None:
+                return
+
+            base   = '{:08d}.npz'.format(self._segment)
+            arrays = {}
+            lines  = []
+
+            for path, vid, (t, v) in data:
+                if len(t) == 0:
+                    continue
+
+                arrays['t{}'.format(vid)] = t
+                arrays['v{}'.format(vid)] = v
+
+                lines.append(json.dumps({'path'    : path,
+                                         'segment' : self._segment,
+                                         'file'    : base,
+                                         'time'    : 't{}'.format(vid),
+                                         'value'   : 'v{}'.format(vid),
+                                         'dtype'   : str(v.dtype),
+                                         'count'   : len(t),
+                                         'start'   : float(t[0]),
+                                         'end'     : float(t[-1])}) + '\n')
+
+            if len(lines) > 0:
+                fname = os.path.join(self.dataDir.value(), base)
+
+                # The file is complete before it is renamed and indexed
+                with open(fname + '.tmp','wb') as f:
+                    np.savez(f, **arrays)
+
+                os.replace(fname + '.tmp', fname)
+
+                with open(os.path.join(self.dataDir.value(), 'index.jsonl'),'a') as f:
+                    f.write(''.join(lines))
+
+                self._segment += 1
+
+    def paths(self):
+        """List of recorded variable paths"""
+        with self._bufLock:
+            ret = list(self._buffers)
+
+        if self._reader is not None:
+            ret += [p for p in self._reader.paths() if p not in ret]
+
+        return ret
+
+    def query(self, path, start=None, end=None):
+        """
+        Return (times, values) arrays of the samples of a variable with
+        start <= time < end, from the segment files and the ring buffer.
+        """
+        with self._fileLock:
+            if self._reader is not None:
+                dt, dv = self._reader.query(path, start, end)
+            else:
+                dt, dv = np.zeros(0, dtype='f8'), np.zeros(0)
+
+            with self._bufLock:
+                buf = self._buffers.get(path)
+
+                if buf is None:
+                    return dt, dv
+
+                mt, mv = buf.pending(start)
+
+        if end is not None:
+            sel = mt < end
+            mt, mv = mt[sel], mv[sel]
+
+        return np.concatenate([dt, mt]), np.concatenate([dv, mv])
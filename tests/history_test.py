@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Variable history tests for pyrogue
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import importlib.util
+import pyrogue
+import rogue
+import time
+import unittest
+
+# Variable history is optional and requires numpy
+HaveNumpy = importlib.util.find_spec('numpy') is not None
+
+def fill(hist, values, start=0.0):
+    for i,v in enumerate(values):
+        hist.append(start + i, v)
+
+class HistoryDevice(pyrogue.Device):
+    def __init__(self, **kargs):
+        super().__init__(**kargs)
+
+        self.add(pyrogue.LocalVariable(name='Hist', value=0, historySize=4))
+        self.add(pyrogue.LocalVariable(name='Plain', value=0))
+
+class HistoryRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='HistoryRoot', description='History root')
+        self.add(HistoryDevice(name='Dev'))
+
+@unittest.skipUnless(HaveNumpy, 'numpy is not installed')
+class VariableHistory(unittest.TestCase):
+    """
+    Test the ring buffer of variable values
+    """
+
+    def test_empty(self):
+        h = pyrogue.VariableHistory(4)
+        t, v = h.arrays()
+
+        self.assertIsNone(h.dtype)
+        self.assertEqual((len(t), len(v)), (0, 0))
+        self.assertEqual(h.stats()['count'], 0)
+        self.assertIsNone(h.lastChange())
+        self.assertFalse(h.changedSince(0.0))
+
+    def test_promotion(self):
+        h = pyrogue.VariableHistory(8)
+
+        h.append(0.0, True)
+        self.assertEqual(h.dtype, 'bool')
+
+        h.append(1.0, 5)
+        self.assertEqual(h.dtype, 'int64')
+
+        h.append(2.0, 2.5)
+        self.assertEqual(h.dtype, 'float64')
+
+        # Narrower values do not demote the array
+        h.append(3.0, 7)
+        self.assertEqual(h.dtype, 'float64')
+        self.assertEqual(list(h.arrays()[1]), [1.0, 5.0, 2.5, 7.0])
+
+    def test_int_overflow(self):
+        h = pyrogue.VariableHistory(4)
+        fill(h, [1, 1 << 70])
+
+        self.assertEqual(h.dtype, 'float64')
+        self.assertEqual(list(h.arrays()[1]), [1.0, float(1 << 70)])
+
+    def test_skipped(self):
+        h = pyrogue.VariableHistory(4)
+        fill(h, ['text', None, 3])
+
+        self.assertEqual(h.skipped, 2)
+        self.assertEqual(h.appended, 1)
+        self.assertEqual(h.stats()['skipped'], 2)
+
+    def test_wrap(self):
+        h = pyrogue.VariableHistory(4)
+        fill(h, range(10))
+
+        t, v = h.arrays()
+        self.assertEqual(list(t), [6.0, 7.0, 8.0, 9.0])
+        self.assertEqual(list(v), [6, 7, 8, 9])
+        self.assertEqual(h.appended, 10)
+
+    def test_count_since(self):
+        h = pyrogue.VariableHistory(8)
+        fill(h, range(6))
+
+        self.assertEqual(list(h.arrays(count=2)[1]), [4, 5])
+        self.assertEqual(list(h.arrays(since=3.0)[1]), [3, 4, 5])
+        self.assertEqual(list(h.arrays(count=2, since=5.0)[1]), [5])
+        self.assertEqual(list(h.arrays(count=20)[1]), list(range(6)))
+
+    def test_stats(self):
+        h = pyrogue.VariableHistory(8)
+        fill(h, [1.0, 3.0, 5.0, 7.0], start=10.0)
+
+        s = h.stats()
+        self.assertEqual(s['count'], 4)
+        self.assertEqual((s['min'], s['max'], s['mean']), (1.0, 7.0, 4.0))
+        self.assertEqual((s['first'], s['last'], s['value']), (10.0, 13.0, 7.0))
+        self.assertAlmostEqual(s['rate'], 2.0)
+
+        self.assertIsNone(h.stats(count=1)['rate'])
+
+    def test_changed(self):
+        h = pyrogue.VariableHistory(8)
+        fill(h, [1, 1, 2, 2, 2])
+
+        self.assertEqual(h.lastChange(), 2.0)
+        self.assertTrue(h.changedSince(2.0))
+        self.assertFalse(h.changedSince(2.5))
+
+    def test_unflushed(self):
+        h = pyrogue.VariableHistory(4)
+        fill(h, range(3))
+
+        self.assertEqual(list(h.pending(since=1.0)[1]), [1, 2])
+        self.assertEqual(list(h.unflushed()[1]), [0, 1, 2])
+        self.assertEqual(len(h.unflushed()[1]), 0)
+
+        # Six more samples overwrite two before they are handed out
+        fill(h, range(3,9), start=3.0)
+        self.assertEqual(h.dropped, 2)
+        self.assertEqual(list(h.unflushed()[1]), [5, 6, 7, 8])
+        self.assertEqual(h.dropped, 2)
+
+        # The history itself is not cleared by flushing
+        self.assertEqual(list(h.arrays()[1]), [5, 6, 7, 8])
+
+@unittest.skipUnless(HaveNumpy, 'numpy is not installed')
+class VariableHistorySize(unittest.TestCase):
+    """
+    Test the history of a variable with historySize set
+    """
+
+    def test_variable(self):
+        root = HistoryRoot()
+        root.start(pollEn=False)
+
+        try:
+            self.assertEqual(root.Dev.Hist.historySize, 4)
+            self.assertEqual(root.Dev.Plain.historySize, 0)
+
+            start = time.time()
+
+            # Updates are recorded by the root update worker, which merges back to back updates
+            for i in range(1,6):
+                root.Dev.Hist.set(i)
+
+                end = time.monotonic() + 2.0
+                while root.Dev.Hist.history()[1][-1:].tolist() != [i] and time.monotonic() < end:
+                    time.sleep(0.01)
+
+            t, v = root.Dev.Hist.history()
+            self.assertEqual(list(v), [2, 3, 4, 5])
+            self.assertEqual(root.Dev.Hist.historyStats()['value'], 5.0)
+            self.assertTrue(root.Dev.Hist.changedSince(start))
+
+            with self.assertRaises(pyrogue.VariableError):
+                root.Dev.Plain.history()
+        finally:
+            root.stop()
+
+if __name__ == "__main__":
+    unittest.main()
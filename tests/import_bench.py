@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Import time benchmark for pyrogue
+#-----------------------------------------------------------------------------
+# Measures the cold start time of 'import pyrogue' in a fresh interpreter
+# and checks that the lazily loaded packages are not pulled in.
+#
+# Usage: python3 tests/import_bench.py [count] [budget_ms]
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to 
+# the license terms in the LICENSE.txt file found in the top-level directory 
+# of this distribution and at: 
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html. 
+# No part of the rogue software platform, including this file, may be 
+# copied, modified, propagated, or distributed except according to the terms 
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import subprocess
+import statistics
+import sys
+
+# Packages which must not be loaded by a plain 'import pyrogue'
+LAZY = ['Pyro4', 'yaml', 'zmq', 'MySQLdb', 'pyrogue._Pyro', 'pyrogue.interfaces', 'pyrogue.protocols', 'pyrogue.utilities']
+
+SCRIPT = f"""
+import sys, time
+st = time.perf_counter()
+import pyrogue
+print(time.perf_counter() - st)
+print(','.join(m for m in {LAZY} if m in sys.modules))
+"""
+
+def importTime():
+    out = subprocess.check_output([sys.executable, '-c', SCRIPT]).decode().splitlines()
+    return float(out[0]), out[1]
+
+if __name__ == "__main__":
+    count  = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 250.0
+
+    times  = []
+    loaded = ''
+
+    for i in range(count):
+        t, loaded = importTime()
+        times.append(t * 1000.0)
+
+    med = statistics.median(times)
+
+    print(f"import pyrogue: median={med:.1f} ms, min={min(times):.1f} ms, max={max(times):.1f} ms, runs={count}, budget={budget:.1f} ms")
+
+    if loaded != '':
+        print(f"Eagerly loaded modules: {loaded}")
+        sys.exit(1)
+
+    if med > budget:
+        print("Import time budget exceeded")
+        sys.exit(1)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Link scheduler tests for pyrogue
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import pyrogue
+import rogue
+import threading
+import time
+import unittest
+from variable_test import MemSlave, UpdateRoot
+
+Interactive = 0
+Config      = 1
+Poll        = 2
+
+def waitFor(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not cond() and time.monotonic() < end:
+        time.sleep(0.01)
+    return cond()
+
+class LinkScheduler(unittest.TestCase):
+    """
+    Test the ordering of the transaction lanes of a memory link
+    """
+
+    def setUp(self):
+        self.order   = []
+        self.threads = []
+
+    def tearDown(self):
+        for t in self.threads:
+            t.join(5.0)
+
+    def start(self, sched, lane):
+        """Acquire the lane from a new thread, recording the lane once it passes the gate"""
+        def run():
+            if sched.acquire(lane):
+                self.order.append(lane)
+
+        t = threading.Thread(target=run)
+        t.start()
+        self.threads.append(t)
+
+    def waiting(self, sched, name, count=1):
+        return waitFor(lambda: sched.stats()[name]['waiting'] == count)
+
+    def test_lane_context(self):
+        self.assertEqual(pyrogue.currentLane(), Interactive)
+
+        with pyrogue.transactionLane('poll'):
+            self.assertEqual(pyrogue.currentLane(), Poll)
+
+            with pyrogue.transactionLane('config'):
+                self.assertEqual(pyrogue.currentLane(), Config)
+
+            self.assertEqual(pyrogue.currentLane(), Poll)
+
+        self.assertEqual(pyrogue.currentLane(), Interactive)
+
+        with self.assertRaises(ValueError):
+            with pyrogue.transactionLane('bulk'):
+                pass
+
+    def test_interactive_not_held(self):
+        sched = pyrogue.LinkScheduler()
+
+        self.assertTrue(sched.acquire(Config))
+        self.assertTrue(sched.acquire(Interactive))
+        self.assertEqual(sched.stats()['interactive']['yields'], 0)
+        self.assertEqual(sched.stats()['interactive']['pending'], 1)
+
+    def test_lane_order(self):
+        sched = pyrogue.LinkScheduler(maxYield=5.0)
+        self.assertTrue(sched.acquire(Interactive))
+
+        self.start(sched, Poll)
+        self.assertTrue(self.waiting(sched, 'poll'))
+        self.start(sched, Config)
+        self.assertTrue(self.waiting(sched, 'config'))
+        self.assertEqual(self.order, [])
+
+        # Config passes once interactive is released, poll waits for config
+        sched.release(Interactive)
+        self.assertTrue(waitFor(lambda: self.order == [Config]))
+        self.assertTrue(self.waiting(sched, 'poll'))
+
+        sched.release(Config)
+        self.assertTrue(waitFor(lambda: self.order == [Config, Poll]))
+
+        stats = sched.stats()
+        self.assertEqual(stats['config']['yields'], 1)
+        self.assertEqual(stats['poll']['yields'], 1)
+        self.assertEqual(stats['poll']['pending'], 0)
+
+    def test_max_yield(self):
+        sched = pyrogue.LinkScheduler(maxYield=0.1)
+        sched.acquire(Interactive)
+
+        start = time.monotonic()
+        self.assertTrue(sched.acquire(Poll))
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        self.assertGreaterEqual(sched.stats()['poll']['maxWait'], 0.1)
+
+    def test_poll_dropped(self):
+        sched = pyrogue.LinkScheduler(maxYield=5.0, maxPending=(None, 64, 1))
+        sched.acquire(Interactive)
+
+        self.start(sched, Poll)
+        self.assertTrue(self.waiting(sched, 'poll'))
+
+        # The poll lane is full, only droppable transactions are dropped
+        self.assertFalse(sched.acquire(Poll, drop=True))
+        self.assertEqual(sched.stats()['poll']['dropped'], 1)
+
+        sched.release(Interactive)
+        self.assertTrue(waitFor(lambda: self.order == [Poll]))
+
+    def test_config_waits_for_room(self):
+        sched = pyrogue.LinkScheduler(maxYield=5.0, maxPending=(None, 1, 16))
+        sched.acquire(Interactive)
+
+        self.start(sched, Config)
+        self.assertTrue(self.waiting(sched, 'config'))
+        self.start(sched, Config)
+
+        # The second config transaction is held outside of the full lane, not dropped
+        time.sleep(0.1)
+        self.assertEqual(sched.stats()['config']['waiting'], 1)
+
+        sched.release(Interactive)
+        self.assertTrue(waitFor(lambda: self.order == [Config, Config]))
+        self.assertEqual(sched.stats()['config']['dropped'], 0)
+
+    def test_poll_lane_write_not_dropped(self):
+        root = UpdateRoot()
+        root.start(pollEn=False)
+
+        try:
+            block = root.Dev.A._block
+            sched = pyrogue.LinkScheduler(maxYield=0.2, maxPending=(None, 64, 1))
+            block._link = sched
+
+            sched.acquire(Interactive)
+            self.start(sched, Poll)
+            self.assertTrue(self.waiting(sched, 'poll'))
+
+            # A droppable read is dropped, a write from the same lane waits for room
+            with pyrogue.transactionLane('poll'):
+                self.assertFalse(block.startTransaction(rogue.interfaces.memory.Read, check=True, drop=True))
+
+                root.Dev.A.set(7, write=False)
+                self.assertTrue(block.startTransaction(rogue.interfaces.memory.Write, check=True, drop=True))
+
+            self.assertEqual(sched.stats()['poll']['dropped'], 1)
+            sched.release(Interactive)
+
+            block._bData[:] = bytearray(block._size)
+            self.assertEqual(root.Dev.A.get(), 7)
+        finally:
+            root.stop()
+
+    def test_root_stats(self):
+        root = UpdateRoot()
+        root.start(pollEn=False)
+
+        try:
+            root.Dev.A.set(1)
+            root.Dev.A.get()
+
+            with pyrogue.transactionLane('config'):
+                root.Dev.readBlocks()
+                root.Dev.checkBlocks()
+
+            stats = list(root.getLinkStats().values())
+
+            self.assertEqual(len(stats), 1)
+            self.assertGreaterEqual(stats[0]['interactive']['count'], 2)
+            self.assertEqual(stats[0]['config']['count'], 1)
+
+            for lane in stats[0].values():
+                self.assertEqual(lane['pending'], 0)
+        finally:
+            root.stop()
+
+class DropRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='DropRoot', description='Drop root')
+        self.sched = pyrogue.LinkScheduler(maxPending=(None, 64, 0))
+
+        dev = pyrogue.Device(name='Dev', memBase=MemSlave())
+        dev.add(pyrogue.RemoteVariable(name='Reg', offset=0, bitSize=32, base=pyrogue.UInt, pollInterval=1))
+        self.add(dev)
+
+    def _linkScheduler(self, link):
+        return self.sched
+
+class PollDrops(unittest.TestCase):
+    """
+    Test that polls dropped by a full poll lane are counted
+    """
+
+    def test_dropped_stats(self):
+        root = DropRoot()
+        root.start()
+
+        try:
+            self.assertTrue(waitFor(lambda: root.getPollStats()['DropRoot.Dev.Reg']['dropped'] > 0))
+            self.assertEqual(root.getPollStats()['DropRoot.Dev.Reg']['polls'],
+                             root.getPollStats()['DropRoot.Dev.Reg']['dropped'])
+        finally:
+            root.stop()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Variable listener tests for pyrogue
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import pyrogue
+import rogue
+import threading
+import time
+import unittest
+from poll_test import PollRoot
+from variable_test import SetRoot
+
+def entries(*items):
+    return [(path, value, str(value)) for path,value in items]
+
+class VarListener(unittest.TestCase):
+    """
+    Test the delivery queue of variable listeners
+    """
+
+    def setUp(self):
+        self.calls = []
+
+    def func(self, path, value, disp):
+        self.calls.append((path, value))
+
+    def test_coalesce(self):
+        l = pyrogue.VarListener(func=self.func, policy='coalesce')
+        l._push(entries(('R.a',1), ('R.b',1), ('R.a',2)))
+        l._service(None)
+
+        # Only the latest value of each path, in the order of the last update
+        self.assertEqual(self.calls, [('R.b',1), ('R.a',2)])
+        self.assertEqual(l.stats['dropped'], 0)
+
+    def test_coalesce_backlog(self):
+        l = pyrogue.VarListener(func=self.func, policy='coalesce', maxBacklog=2)
+        l._push(entries(('R.a',1), ('R.b',1), ('R.c',1)))
+        l._service(None)
+
+        self.assertEqual(self.calls, [('R.b',1), ('R.c',1)])
+        self.assertEqual(l.stats['dropped'], 1)
+
+    def test_drop_oldest(self):
+        l = pyrogue.VarListener(func=self.func, policy='dropOldest', maxBacklog=3)
+        l._push(entries(*[('R.a',i) for i in range(5)]))
+        l._service(None)
+
+        # Every update is kept until the backlog is full
+        self.assertEqual(self.calls, [('R.a',2), ('R.a',3), ('R.a',4)])
+        self.assertEqual(l.stats['dropped'], 2)
+        self.assertEqual(l.stats['delivered'], 3)
+
+    def test_scheduling(self):
+        l = pyrogue.VarListener(func=self.func)
+
+        self.assertTrue(l._push(entries(('R.a',1))))
+        self.assertFalse(l._push(entries(('R.b',1))))
+        self.assertFalse(l._service(None))
+        self.assertFalse(l._push([]))
+        self.assertTrue(l._push(entries(('R.c',1))))
+
+    def test_batch(self):
+        batches = []
+        l = pyrogue.VarListener(func=batches.append, batch=True)
+        l._push(entries(('R.a',1), ('R.b',2)))
+        l._service(None)
+
+        self.assertEqual(batches, [entries(('R.a',1), ('R.b',2))])
+
+    def test_patterns(self):
+        l = pyrogue.VarListener(func=self.func, patterns=['R.a'])
+        l._push(entries(('R.a',1), ('R.b',1), ('R.a.x',1)))
+        l._service(None)
+
+        self.assertEqual(self.calls, [('R.a',1), ('R.a.x',1)])
+
+    def test_add_patterns(self):
+        l = pyrogue.VarListener(func=self.func, patterns=['R.a'])
+        l._push(entries(('R.b',1)))
+        l._addPatterns(['R.b', 'R.a'])
+        l._push(entries(('R.b',2)))
+        l._service(None)
+
+        self.assertEqual(self.calls, [('R.b',2)])
+        self.assertEqual(l.stats['patterns'], ['R.a', 'R.b'])
+
+        l._addPatterns(None)
+        self.assertIsNone(l.stats['patterns'])
+
+    def test_invalid_policy(self):
+        with self.assertRaises(pyrogue.NodeError):
+            pyrogue.VarListener(func=self.func, policy='latest')
+
+class ShardRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='ShardRoot', description='Shard root', updateThreads=3)
+
+        for i in range(4):
+            dev = pyrogue.Device(name=f'D{i}')
+            dev.add(pyrogue.LocalVariable(name='var', value=0))
+            dev.add(pyrogue.LocalVariable(name='other', value=0))
+            self.add(dev)
+
+        # Depends on a variable of another device
+        dev = pyrogue.Device(name='Link')
+        dev.add(pyrogue.LinkVariable(name='var', dependencies=[self.D0.var], linkedGet=lambda: self.D0.var.value()))
+        self.add(dev)
+
+class UpdateShards(unittest.TestCase):
+    """
+    Test the sharding of variable updates between update workers
+    """
+
+    def setUp(self):
+        self.root = ShardRoot()
+        self.root.start(pollEn=False)
+        self.values = []
+        self.root.addVarListener(lambda path, value, disp: self.values.append((path, value)), policy='dropOldest')
+
+    def tearDown(self):
+        self.root.stop()
+
+    def paths(self):
+        return [p for p,v in self.values]
+
+    def waitPath(self, path):
+        end = time.monotonic() + 2.0
+        while path not in self.paths() and time.monotonic() < end:
+            time.sleep(0.01)
+        return path in self.paths()
+
+    def test_shards(self):
+        shard = self.root._varShard
+        root  = self.root
+
+        self.assertEqual(shard[root.D1.var], shard[root.D1.other])
+        self.assertEqual(shard[root.D0.var], shard[root.Link.var])
+        self.assertEqual(len({shard[root.node(f'D{i}').var] for i in range(4)}), 3)
+
+    def test_group_per_thread(self):
+        opened  = threading.Event()
+        release = threading.Event()
+
+        def run():
+            with self.root.updateGroup():
+                self.root.D1.var.set(1)
+                opened.set()
+                release.wait(5.0)
+
+        t = threading.Thread(target=run)
+        t.start()
+        opened.wait(5.0)
+
+        # An open group in another thread does not hold back these updates
+        self.root.D2.var.set(1)
+        self.assertTrue(self.waitPath('ShardRoot.D2.var'))
+        self.assertNotIn('ShardRoot.D1.var', self.paths())
+
+        release.set()
+        t.join()
+        self.assertTrue(self.waitPath('ShardRoot.D1.var'))
+
+    def test_order(self):
+        for n in range(20):
+            self.root.D0.var.set(n)
+            self.root.D3.var.set(n)
+
+        self.root.stop()
+
+        # Updates of each variable, and of linked variables, arrive in order
+        for path in ['ShardRoot.D0.var', 'ShardRoot.D3.var', 'ShardRoot.Link.var']:
+            values = [v for p,v in self.values if p == path]
+            self.assertEqual(values, sorted(values))
+            self.assertEqual(values[-1], 19)
+
+class ListenerRemoval(unittest.TestCase):
+    """
+    Test that removing a listener releases its polled blocks
+    """
+
+    def test_dead_listener_unsubscribes(self):
+        root = PollRoot()
+        root.start()
+
+        try:
+            root.PollOnDemand.set(True)
+            paused = lambda: root.getPollStats()['PollRoot.P1.Loc']['paused']
+            self.assertTrue(paused())
+
+            root.addVarListener(lambda path, value, disp: None, patterns=['PollRoot.P1'])
+            self.assertFalse(paused())
+
+            # Listeners of disconnected remote clients are removed by the delivery workers
+            root._removeVarListener(root._getVarListeners()[-1])
+            self.assertTrue(paused())
+        finally:
+            root.stop()
+
+class UpdateStop(unittest.TestCase):
+    """
+    Test that stopping the root delivers updates held back by the rate limit
+    """
+
+    def test_final_update_delivered(self):
+        root = SetRoot()
+        root.start(pollEn=False)
+        values = []
+
+        root.UpdateInterval.set(60.0)
+        root.addVarListener(lambda path, value, disp: values.append(value), patterns=['SetRoot.Dev.var'])
+
+        root.Dev.var.set(1)
+        root.Dev.var.set(2)
+        root.stop()
+
+        self.assertEqual(values[-1:], [2])
+
+class PathMatcher(unittest.TestCase):
+    """
+    Test path pattern matching
+    """
+
+    def test_none_and_empty(self):
+        self.assertTrue(pyrogue.pathMatcher(None)('R.a'))
+        self.assertFalse(pyrogue.pathMatcher([])('R.a'))
+
+    def test_subtree(self):
+        m = pyrogue.pathMatcher(['R.Dev'])
+
+        self.assertTrue(m('R.Dev'))
+        self.assertTrue(m('R.Dev.var'))
+        self.assertTrue(m('R.Dev.Sub.var'))
+        self.assertFalse(m('R.Dev2'))
+        self.assertFalse(m('R.DevX.var'))
+        self.assertFalse(m('R'))
+
+    def test_globs(self):
+        m = pyrogue.pathMatcher(['R.*.Temp', 'R.Ch?'])
+
+        self.assertTrue(m('R.Dev.Temp'))
+        self.assertTrue(m('R.Dev.Sub.Temp'))
+        self.assertFalse(m('R.Dev.Temp2'))
+        self.assertTrue(m('R.Ch1'))
+        self.assertFalse(m('R.Ch12'))
+        self.assertFalse(m('R.Ch1.var'))
+
+    def test_literal_characters(self):
+        m = pyrogue.pathMatcher(['R.Dev[0]', 'R.a+b*'])
+
+        self.assertTrue(m('R.Dev[0].var'))
+        self.assertFalse(m('R.Dev0.var'))
+        self.assertTrue(m('R.a+bc'))
+        self.assertFalse(m('R.aabc'))
+
+    def test_add(self):
+        m = pyrogue.pathMatcher(['R.a'])
+        m.add(['R.b', 'R.c*'])
+
+        self.assertTrue(m('R.a.x'))
+        self.assertTrue(m('R.b.x'))
+        self.assertTrue(m('R.cd'))
+        self.assertFalse(m('R.d'))
+
+        m.add(None)
+        self.assertTrue(m('R.d'))
+
+if __name__ == "__main__":
+    unittest.main()
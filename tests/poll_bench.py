@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Poll scheduler benchmark for pyrogue
+#-----------------------------------------------------------------------------
+# Measures the scheduling overhead of the poll queue timer wheel with a large
+# number of entries, against the heap with invalidated entries which it
+# replaced. Time is simulated, no blocks are read.
+#
+# Each run schedules the entries with intervals of 0.1, 1 and 10 seconds,
+# then steps the clock in 10 ms ticks for the run time. Every step expires
+# and reschedules the due entries, and changes the interval of a few entries.
+#
+# Usage: python3 tests/poll_bench.py [entries] [seconds] [budget_us_per_poll]
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import heapq
+import itertools
+import random
+import sys
+import time
+import pyrogue as pr
+
+STEP      = 0.01
+INTERVALS = [0.1, 1.0, 10.0]
+CHANGES   = 10 # Interval changes per step
+
+class HeapEntry(object):
+    def __init__(self, readTime, count, interval, block):
+        self.readTime = readTime
+        self.count    = count
+        self.interval = interval
+        self.block    = block
+
+    def __lt__(self,other):
+        return (self.readTime, self.count) < (other.readTime, other.count)
+
+def heapRun(count, seconds, rng):
+    counter = itertools.count()
+    entries = {}
+    pq      = []
+
+    st = time.perf_counter()
+
+    for i in range(count):
+        iv = rng.choice(INTERVALS)
+        entries[i] = HeapEntry(rng.uniform(0,iv), next(counter), iv, i)
+        heapq.heappush(pq, entries[i])
+
+    ins = time.perf_counter() - st
+    st  = time.perf_counter()
+    polls = 0
+
+    for step in range(int(seconds / STEP)):
+        now = step * STEP
+
+        while len(pq) > 0 and pq[0].readTime <= now:
+            e = heapq.heappop(pq)
+
+            if e.block is not None:
+                e.readTime += e.interval
+                e.count = next(counter)
+                heapq.heappush(pq, e)
+                polls += 1
+
+        # Changed entries are invalidated and a new entry is pushed
+        for i in rng.sample(range(count), CHANGES):
+            entries[i].block = None
+            iv = rng.choice(INTERVALS)
+            entries[i] = HeapEntry(now, next(counter), iv, i)
+            heapq.heappush(pq, entries[i])
+
+    return ins, time.perf_counter() - st, polls, len(pq)
+
+def wheelRun(count, seconds, rng):
+    wheel   = pr.TimerWheel(start=0.0)
+    entries = {}
+
+    st = time.perf_counter()
+
+    for i in range(count):
+        iv = rng.choice(INTERVALS)
+        entries[i] = pr.PollQueueEntry(rng.uniform(0,iv), iv, i)
+        wheel.add(entries[i])
+
+    ins = time.perf_counter() - st
+    st  = time.perf_counter()
+    polls = 0
+
+    for step in range(int(seconds / STEP)):
+        now = step * STEP
+
+        for e in wheel.expire(now):
+            e.readTime += e.interval
+            wheel.add(e)
+            polls += 1
+
+        # Changed entries are removed and a new entry is added
+        for i in rng.sample(range(count), CHANGES):
+            wheel.remove(entries[i])
+            iv = rng.choice(INTERVALS)
+            entries[i] = pr.PollQueueEntry(now, iv, i)
+            wheel.add(entries[i])
+
+    return ins, time.perf_counter() - st, polls, len(wheel)
+
+def report(name, count, seconds, ins, run, polls, size):
+    steps = int(seconds / STEP)
+    print(f"{name:>5}: insert={ins / count * 1e6:.2f} us/entry, step={run / steps * 1e6:.1f} us, "
+          f"poll={run / max(polls,1) * 1e6:.2f} us, polls={polls}, size={size}")
+    return run / max(polls,1) * 1e6
+
+if __name__ == "__main__":
+    count   = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    budget  = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+
+    print(f"Poll scheduler: entries={count}, simulated={seconds:.1f} s, step={STEP * 1000:.0f} ms, changes/step={CHANGES}")
+
+    report('heap', count, seconds, *heapRun(count, seconds, random.Random(1)))
+    poll = report('wheel', count, seconds, *wheelRun(count, seconds, random.Random(1)))
+
+    if poll > budget:
+        print(f"Timer wheel budget of {budget:.1f} us per poll exceeded")
+        sys.exit(1)
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Poll queue tests for pyrogue
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import asyncio
+import pyrogue
+import pyrogue.interfaces.asyncclient
+import rogue
+import rogue.interfaces.memory
+import time
+import unittest
+import zlib
+from variable_test import MemSlave
+
+class PollDevice(pyrogue.Device):
+    def __init__(self, **kargs):
+        super().__init__(**kargs)
+
+        self.add(pyrogue.LocalVariable(
+            name='Loc',
+            value=0,
+            mode='RO',
+            pollInterval=1))
+
+class PollRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='PollRoot', description='Poll root')
+        self.add(PollDevice(name='P0', pollGroup='slow'))
+        self.add(PollDevice(name='P1'))
+
+class LinkRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='LinkRoot', description='Link root')
+        dev = PollDevice(name='P0')
+        dev.add(pyrogue.LocalVariable(name='Other', value=0, mode='RO', pollInterval=1))
+        dev.add(pyrogue.LinkVariable(name='Link', dependencies=[dev.Loc], linkedGet=lambda: dev.Loc.value() * 2))
+        self.add(dev)
+
+class GroupDevice(pyrogue.Device):
+    def __init__(self, **kargs):
+        super().__init__(**kargs)
+
+        for i,offset in enumerate([0, 4, 8, 16]):
+            self.add(pyrogue.RemoteVariable(name=f'R{i}', offset=offset, bitSize=32, base=pyrogue.UInt))
+
+        self.add(pyrogue.RemoteVariable(name='W', offset=20, bitSize=32, base=pyrogue.UInt, mode='WO'))
+
+class GroupRoot(pyrogue.Root):
+    def __init__(self, maxSize=4096):
+        pyrogue.Root.__init__(self, name='GroupRoot', description='Group root')
+        self.add(GroupDevice(name='A', memBase=MemSlave(maxSize)))
+        self.add(GroupDevice(name='B', memBase=MemSlave(maxSize)))
+
+def groupNames(groups):
+    return [[b.name.split('.',1)[1] for b in getattr(g,'blocks',[g])] for g in groups]
+
+class GroupBlocks(unittest.TestCase):
+    """
+    Test merging of address contiguous blocks into read groups
+    """
+
+    def groups(self, root, **kwargs):
+        return groupNames(pyrogue.groupBlocks(root.B._blocks + root.A._blocks, **kwargs))
+
+    def test_merge(self):
+        root = GroupRoot()
+        root.start(pollEn=False)
+
+        try:
+            # Runs are split at address gaps, write only blocks and slaves
+            self.assertEqual(self.groups(root), [['A.R0', 'A.R1', 'A.R2'], ['A.R3'], ['A.W'],
+                                                 ['B.R0', 'B.R1', 'B.R2'], ['B.R3'], ['B.W']])
+
+            self.assertEqual(len(self.groups(root, merge=False)), 10)
+        finally:
+            root.stop()
+
+    def test_max_size(self):
+        root = GroupRoot(maxSize=8)
+        root.start(pollEn=False)
+
+        try:
+            self.assertEqual(self.groups(root)[0:3], [['A.R0', 'A.R1'], ['A.R2'], ['A.R3']])
+        finally:
+            root.stop()
+
+    def test_disabled(self):
+        root = GroupRoot()
+        root.start(pollEn=False)
+
+        try:
+            root.B.enable.set(False)
+            self.assertEqual(self.groups(root)[3:], [['B.R0'], ['B.R1'], ['B.R2'], ['B.R3'], ['B.W']])
+        finally:
+            root.stop()
+
+    def test_read(self):
+        root = GroupRoot()
+        root.start(pollEn=False)
+
+        try:
+            for i in range(3):
+                root.A.node(f'R{i}').set(0x1000 + i)
+
+            group = pyrogue.groupBlocks(root.A._blocks)[0]
+
+            for b in group.blocks:
+                b._bData[:] = bytearray(b._size)
+
+            group.startTransaction(rogue.interfaces.memory.Read, check=True)
+
+            self.assertEqual([root.A.node(f'R{i}').value() for i in range(3)], [0x1000, 0x1001, 0x1002])
+        finally:
+            root.stop()
+
+def entry(readTime):
+    return pyrogue.PollQueueEntry(readTime, 1.0, None)
+
+def readTimes(entries):
+    return sorted(e.readTime for e in entries)
+
+class TimerWheel(unittest.TestCase):
+    """
+    Test expiry and rescheduling of timer wheel entries
+    """
+
+    def test_expire(self):
+        w = pyrogue.TimerWheel(tick=0.1, slots=16, start=0.0)
+
+        for t in [0.05, 0.15, 0.17, 0.5]:
+            w.add(entry(t))
+
+        self.assertEqual(len(w), 4)
+        self.assertEqual(w.nextTime(), 0.05)
+        self.assertEqual(readTimes(w.expire(0.16)), [0.05, 0.15])
+
+        # The remainder of the tick containing the limit expires on the next call
+        self.assertEqual(w.nextTime(), 0.17)
+        self.assertEqual(readTimes(w.expire(0.17)), [0.17])
+        self.assertEqual(w.expire(0.4), [])
+        self.assertEqual(readTimes(w.expire(1.0)), [0.5])
+        self.assertEqual(len(w), 0)
+        self.assertIsNone(w.nextTime())
+
+    def test_already_due(self):
+        w = pyrogue.TimerWheel(tick=0.1, slots=16, start=0.0)
+        w.expire(1.0)
+
+        e = entry(0.25)
+        w.add(e)
+
+        self.assertEqual(w.nextTime(), 0.25)
+        self.assertEqual(w.expire(1.0), [e])
+
+    def test_reschedule(self):
+        w = pyrogue.TimerWheel(tick=0.1, slots=16, start=0.0)
+        e = entry(0.3)
+        w.add(e)
+
+        w.remove(e)
+        w.remove(e) # Removing twice is harmless
+        e.readTime = 0.8
+        w.add(e)
+
+        self.assertEqual(len(w), 1)
+        self.assertEqual(w.expire(0.5), [])
+        self.assertEqual(w.expire(0.8), [e])
+
+        # An expired entry can be added again
+        e.readTime = 1.2
+        w.add(e)
+        self.assertEqual(w.expire(1.25), [e])
+
+    def test_revolutions(self):
+        w = pyrogue.TimerWheel(tick=0.1, slots=4, start=0.0)
+        near = entry(0.15)
+        far  = entry(0.55) # Same slot as near, one revolution later
+
+        w.add(near)
+        w.add(far)
+
+        self.assertEqual(w.expire(0.3), [near])
+        self.assertEqual(w.nextTime(), 0.55)
+        self.assertEqual(w.expire(0.5), [])
+        self.assertEqual(w.expire(0.6), [far])
+
+        # Entries beyond one revolution report the end of the wheel, a lower bound
+        w.add(entry(2.0))
+        self.assertLess(w.nextTime(), 2.0)
+        self.assertEqual(w.expire(1.5), [])
+        self.assertEqual(readTimes(w.expire(2.0)), [2.0])
+
+class Schedule(unittest.TestCase):
+    """
+    Test the deadlines, backoff and phases of poll entries. The poll queue is not
+    started so the entries are only updated by the test.
+    """
+
+    def setUp(self):
+        self.root = GroupRoot()
+        self.root.start(pollEn=False)
+        self.queue = pyrogue.PollQueue(root=self.root)
+
+    def tearDown(self):
+        self.root.stop()
+
+    def add(self, var, interval=1.0):
+        """Poll the variable without starting the worker, returning its worker and entry"""
+        var._pollInterval = interval
+        self.queue.updatePollInterval(var)
+
+        worker = self.queue._entries[var._block]
+        return worker, worker._entries[var._block]
+
+    def late(self, readTime=10.0):
+        """Entry which has already been polled once"""
+        e = pyrogue.PollQueueEntry(readTime, 1.0, None)
+        e.polls = 1
+        return e
+
+    def test_on_time(self):
+        worker, _ = self.add(self.root.A.R0)
+
+        for policy in pyrogue.PollQueue.Policies:
+            e = self.late()
+            self.assertEqual(worker._nextTime(e, 10.2, policy), 11.0)
+            self.assertEqual(e.overruns, 0)
+            self.assertAlmostEqual(e.lateness, 0.2)
+
+    def test_missed_policies(self):
+        worker, _ = self.add(self.root.A.R0)
+        times = {}
+
+        # Two deadlines were missed
+        for policy in pyrogue.PollQueue.Policies:
+            e = self.late()
+            times[policy] = worker._nextTime(e, 12.5, policy)
+
+            self.assertEqual(e.overruns, 1)
+            self.assertEqual((e.lateness, e.maxLateness), (2.5, 2.5))
+
+        self.assertEqual(times, {'skip' : 13.0, 'catchUp' : 11.0, 'coalesce' : 13.5})
+
+    def test_catch_up(self):
+        worker, _ = self.add(self.root.A.R0)
+        e = self.late()
+        now = 12.5
+
+        # Each missed deadline is polled, then the entry is back on its phase
+        for expect in [11.0, 12.0, 13.0]:
+            e.readTime = worker._nextTime(e, now, 'catchUp')
+            self.assertEqual(e.readTime, expect)
+
+        self.assertEqual(e.overruns, 2)
+
+    def test_backoff(self):
+        worker, e = self.add(self.root.A.R0)
+        block = e.block
+        start = e.readTime
+
+        # Unchanged data doubles the period up to the maximum interval
+        for period in [2.0, 4.0, 5.0, 5.0]:
+            worker._adapt([e], 5.0)
+            self.assertEqual(e.period, period)
+
+        self.assertEqual(e.readTime, start + 4.0)
+        self.assertEqual(worker.stats()['GroupRoot.A.R0']['period'], 5.0)
+
+        # A change of the block data returns the entry to its interval
+        block._changeCount += 1
+        worker._adapt([e], 5.0)
+        self.assertEqual(e.period, 1.0)
+        self.assertEqual(e.readTime, start)
+
+    def test_reset_interval(self):
+        worker, e = self.add(self.root.A.R0)
+        _, other = self.add(self.root.B.R0)
+
+        for i in range(3):
+            worker._adapt([e], 60.0)
+            worker._adapt([other], 60.0)
+
+        self.assertEqual((e.period, other.period), (8.0, 8.0))
+
+        self.queue.resetInterval(pyrogue.pathMatcher(['GroupRoot.A.*']))
+        self.assertEqual((e.period, other.period), (1.0, 8.0))
+        self.assertLessEqual(e.readTime, time.monotonic())
+
+        self.queue.resetInterval()
+        self.assertEqual(other.period, 1.0)
+
+    def test_local_not_adapted(self):
+        root = PollRoot()
+        root.start(pollEn=False)
+
+        try:
+            queue = pyrogue.PollQueue(root=root)
+            queue.updatePollInterval(root.P1.Loc)
+
+            worker = queue._entries[root.P1.Loc._block]
+            e = worker._entries[root.P1.Loc._block]
+
+            worker._adapt([e], 60.0)
+            self.assertEqual(e.period, 1.0)
+        finally:
+            root.stop()
+
+    def test_phase(self):
+        _, a0 = self.add(self.root.A.R0)
+        _, a3 = self.add(self.root.A.R3)
+        _, b0 = self.add(self.root.B.R0)
+
+        # Blocks of a device share a crc32 phase of the device path
+        self.assertEqual(a0.phase, zlib.crc32(b'GroupRoot.A') / float(1 << 32))
+        self.assertEqual(a0.phase, a3.phase)
+        self.assertNotEqual(a0.phase, b0.phase)
+
+        for e in [a0, b0]:
+            self.assertTrue(0.0 <= e.phase < 1.0)
+
+    def test_first_poll_phase(self):
+        worker, _ = self.add(self.root.A.R0)
+
+        e = pyrogue.PollQueueEntry(10.0, 2.0, None)
+        e.phase = 0.25
+
+        # The poll after the first lands on the phase of the entry
+        self.assertAlmostEqual(worker._nextTime(e, 10.6, 'skip'), 10.5 + 2.0)
+
+        e = pyrogue.PollQueueEntry(10.0, 2.0, None)
+        self.assertEqual(worker._nextTime(e, 10.0, 'skip'), 12.0)
+
+    def test_spread_disabled(self):
+        self.root.PollSpread.set(False)
+
+        _, a0 = self.add(self.root.A.R0)
+        _, b0 = self.add(self.root.B.R0)
+
+        self.assertEqual((a0.phase, b0.phase), (0.0, 0.0))
+
+class PollQueue(unittest.TestCase):
+    """
+    Test the poll queue
+    """
+
+    def test_local_poll_group(self):
+        root = PollRoot()
+        root.start()
+
+        try:
+            entries = root._pollQueue._entries
+            self.assertEqual(entries[root.P0.Loc._block].group, 'slow')
+            self.assertIsNone(entries[root.P1.Loc._block].group)
+        finally:
+            root.stop()
+
+    def test_poll_stats_paths(self):
+        root = PollRoot()
+        root.start()
+
+        try:
+            stats = root.getPollStats()
+            self.assertIn('PollRoot.P0.Loc', stats)
+            self.assertIn('PollRoot.P1.Loc', stats)
+            self.assertEqual(stats['PollRoot.P0.Loc']['group'], 'slow')
+        finally:
+            root.stop()
+
+    def test_listener_resumes_upstream(self):
+        root = LinkRoot()
+        root.start()
+
+        try:
+            root.PollOnDemand.set(True)
+            root.P0.Link.addListener(lambda path, value, disp: None)
+
+            stats = root.getPollStats()
+            self.assertFalse(stats['LinkRoot.P0.Loc']['paused'])
+            self.assertEqual(stats['LinkRoot.P0.Loc']['consumers'], 1)
+            self.assertTrue(stats['LinkRoot.P0.Other']['paused'])
+        finally:
+            root.stop()
+
+    def test_async_updates_close(self):
+        root = PollRoot()
+        root.start()
+
+        async def run():
+            client  = pyrogue.interfaces.asyncclient.AsyncClient(root)
+            updates = client.updates(patterns=['PollRoot.P1'])
+            self.assertFalse(root.getPollStats()['PollRoot.P1.Loc']['paused'])
+
+            # Closing removes the listener, the block is no longer polled
+            updates.close()
+            client.close()
+
+            self.assertEqual(root._getVarListeners(), [])
+            self.assertTrue(root.getPollStats()['PollRoot.P1.Loc']['paused'])
+
+        try:
+            root.PollOnDemand.set(True)
+
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(run())
+            finally:
+                loop.close()
+        finally:
+            root.stop()
+
+if __name__ == "__main__":
+    unittest.main()
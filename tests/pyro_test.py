@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Pyro client tests for pyrogue
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import os
+import pyrogue
+import pyrogue._Pyro
+import rogue
+import tempfile
+import unittest
+
+class RemoteVar(object):
+    """Stands in for the Pyro proxy of a remote variable"""
+
+    def __init__(self, path, value):
+        self.path  = path
+        self.val   = value
+        self.reads = 0
+
+    def value(self):
+        self.reads += 1
+        return self.val
+
+    def valueDisp(self):
+        self.reads += 1
+        return str(self.val)
+
+class RemoteDevice(object):
+    """Stands in for the Pyro proxy of a remote device and root"""
+
+    def __init__(self, variables):
+        self.variables = {v.path.split('.')[-1] : v for v in variables}
+        self.batches   = 0
+
+    def getMany(self, paths, read, disp):
+        self.batches += 1
+        return {v.path : (v.val, str(v.val)) for v in self.variables.values() if v.path in paths}
+
+class FakeRoot(object):
+    def __init__(self, node):
+        self._node      = node
+        self._structure = {}
+
+class TreeDevice(pyrogue.Device):
+    def __init__(self, count, **kargs):
+        super().__init__(**kargs)
+
+        for i in range(count):
+            self.add(pyrogue.LocalVariable(name=f'var{i}', value=0, units='V'))
+
+class TreeRoot(pyrogue.Root):
+    def __init__(self, count=2):
+        pyrogue.Root.__init__(self, name='TreeRoot', description='Tree root')
+        self.add(TreeDevice(count, name='Dev'))
+
+class RemoteRoot(object):
+    """Stands in for the Pyro proxy of a remote root, counting structure downloads"""
+
+    def __init__(self, root):
+        self.root      = root
+        self.describes = 0
+
+    def structureHash(self):
+        return self.root.structureHash()
+
+    def describe(self, path):
+        self.describes += 1
+        return self.root.describe(path)
+
+    def __getattr__(self, name):
+        raise AssertionError(f'Unexpected remote access of {name}')
+
+class PyroStructure(unittest.TestCase):
+    """
+    Test the structure hash and the structure cache of remote clients
+    """
+
+    def setUp(self):
+        pyrogue._Pyro._structureCache.clear()
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def tree(self, count=2):
+        root = TreeRoot(count)
+        root.start(pollEn=False)
+        self.addCleanup(root.stop)
+        return root
+
+    def load(self, root, cacheDir=None):
+        remote = RemoteRoot(root)
+        client = pyrogue.PyroRoot(node=remote, daemon=None)
+        client._loadStructure(cacheDir)
+        return client, remote
+
+    def cacheFiles(self):
+        return [f for f in os.listdir(self.dir.name) if f.startswith('pyrogue_')]
+
+    def test_hash(self):
+        a = self.tree().structureHash()
+
+        self.assertEqual(self.tree().structureHash(), a)
+        self.assertNotEqual(self.tree(3).structureHash(), a)
+
+    def test_describe(self):
+        desc = self.tree().describe()
+
+        self.assertEqual(list(desc)[0], 'TreeRoot')
+        self.assertIn('Dev', desc['TreeRoot']['nodes'])
+        self.assertEqual(desc['TreeRoot.Dev.var1']['units'], 'V')
+        self.assertEqual(list(self.tree().describe('TreeRoot.Dev')),
+                         ['TreeRoot.Dev', 'TreeRoot.Dev.enable', 'TreeRoot.Dev.var0', 'TreeRoot.Dev.var1'])
+
+    def test_process_cache(self):
+        client, remote = self.load(self.tree())
+        self.assertEqual(remote.describes, 1)
+
+        # Static attributes are served without remote calls
+        node = pyrogue.PyroNode(root=client, node=remote, daemon=None, path='TreeRoot.Dev.var0')
+        self.assertEqual(node.units, 'V')
+
+        client, remote = self.load(self.tree())
+        self.assertEqual(remote.describes, 0)
+
+        # A different tree has a different hash and is downloaded again
+        client, remote = self.load(self.tree(3))
+        self.assertEqual(remote.describes, 1)
+        self.assertIn('TreeRoot.Dev.var2', client._structure)
+
+    def test_disk_cache(self):
+        self.load(self.tree(), self.dir.name)
+        self.assertEqual(len(self.cacheFiles()), 1)
+
+        pyrogue._Pyro._structureCache.clear()
+        client, remote = self.load(self.tree(), self.dir.name)
+
+        self.assertEqual(remote.describes, 0)
+        self.assertIn('TreeRoot.Dev.var1', client._structure)
+
+    def test_corrupt_cache(self):
+        self.load(self.tree(), self.dir.name)
+        fname = os.path.join(self.dir.name, self.cacheFiles()[0])
+
+        with open(fname, 'wb') as f:
+            f.write(b'corrupt')
+
+        pyrogue._Pyro._structureCache.clear()
+
+        with self.assertLogs('pyrogue.Pyro', level='WARNING'):
+            client, remote = self.load(self.tree(), self.dir.name)
+
+        # The unreadable file is replaced by a new download
+        self.assertEqual(remote.describes, 1)
+        self.assertIn('TreeRoot.Dev.var1', client._structure)
+
+        pyrogue._Pyro._structureCache.clear()
+        client, remote = self.load(self.tree(), self.dir.name)
+        self.assertEqual(remote.describes, 0)
+
+class PyroPrefetch(unittest.TestCase):
+    """
+    Test the values prefetched when remote variables are listed
+    """
+
+    def setUp(self):
+        self.remote = RemoteDevice([RemoteVar('R.a', 1), RemoteVar('R.b', 2)])
+        self.node   = pyrogue.PyroNode(root=FakeRoot(self.remote), node=self.remote, daemon=None, path='R')
+
+    def test_prefetch_once(self):
+        vs = self.node.variables
+
+        self.assertEqual(self.remote.batches, 1)
+        self.assertEqual((vs['a'].value(), vs['a'].valueDisp()), (1, '1'))
+        self.assertEqual(self.remote.variables['a'].reads, 0)
+
+        # Later calls read the remote value
+        self.remote.variables['a'].val = 5
+        self.assertEqual(vs['a'].value(), 5)
+        self.assertEqual(self.remote.variables['a'].reads, 1)
+
+    def test_prefetch_expires(self):
+        vs = self.node.variables
+        self.remote.variables['b'].val = 7
+
+        # A value listed longer than PrefetchAge ago is read again
+        vs['b']._prefetch[2] -= pyrogue._Pyro.PrefetchAge + 1.0
+
+        self.assertEqual(vs['b'].value(), 7)
+        self.assertEqual(vs['b'].valueDisp(), '7')
+        self.assertEqual(self.remote.variables['b'].reads, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Time series recorder tests for pyrogue
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import importlib.util
+import json
+import os
+import pyrogue
+import rogue
+import tempfile
+import time
+import unittest
+
+# The recorder requires numpy
+HaveNumpy = importlib.util.find_spec('numpy') is not None
+
+if HaveNumpy:
+    from pyrogue.utilities.recorder import Recorder, RecorderReader
+
+class RecorderRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='RecRoot', description='Recorder root')
+        self.add(Recorder(name='Rec', patterns=['RecRoot.Num', 'RecRoot.Text']))
+        self.add(pyrogue.LocalVariable(name='Num', value=0))
+        self.add(pyrogue.LocalVariable(name='Text', value=''))
+        self.add(pyrogue.LocalVariable(name='Other', value=0))
+
+@unittest.skipUnless(HaveNumpy, 'numpy is not installed')
+class RecorderFiles(unittest.TestCase):
+    """
+    Test recording of variable updates to segment files
+    """
+
+    def setUp(self):
+        self.dir  = tempfile.TemporaryDirectory()
+        self.root = RecorderRoot()
+        self.root.start(pollEn=False)
+        self.rec  = self.root.Rec
+
+        self.rec.dataDir.set(self.dir.name)
+        self.rec.open.set(True)
+
+    def tearDown(self):
+        self.root.stop()
+        self.dir.cleanup()
+
+    def record(self, value, name='Num'):
+        """Set a variable and wait for the recorder to receive the update"""
+        self.root.node(name).set(value)
+
+        end = time.monotonic() + 2.0
+        while time.monotonic() < end:
+            buf = self.rec._buffers.get('RecRoot.' + name)
+
+            if buf is not None and buf.arrays(count=1)[1].tolist() == [value]:
+                return
+
+            time.sleep(0.01)
+
+    def index(self):
+        with open(os.path.join(self.dir.name, 'index.jsonl')) as f:
+            return [json.loads(line) for line in f]
+
+    def files(self):
+        return sorted(f for f in os.listdir(self.dir.name) if f.endswith('.npz'))
+
+    def test_flush_segments(self):
+        self.record(1)
+        self.record(2)
+        self.rec.flush()
+
+        self.assertEqual(self.files(), ['00000000.npz'])
+        self.assertEqual([(s['path'], s['segment'], s['count']) for s in self.index()],
+                         [('RecRoot.Num', 0, 2)])
+
+        # A flush without new samples writes no segment
+        self.rec.flush()
+        self.assertEqual(self.files(), ['00000000.npz'])
+
+        self.record(3)
+        self.rec.flush()
+
+        self.assertEqual(self.files(), ['00000000.npz', '00000001.npz'])
+        self.assertEqual([s['segment'] for s in self.index()], [0, 1])
+        self.assertEqual(self.rec.segmentCount.get(), 2)
+
+    def test_reopen_numbering(self):
+        self.record(1)
+        self.rec.open.set(False)
+
+        # Closing flushes, reopening continues after the last indexed segment
+        self.assertEqual(self.files(), ['00000000.npz'])
+
+        self.rec.open.set(True)
+        self.record(2)
+        self.rec.flush()
+
+        self.assertEqual(self.files(), ['00000000.npz', '00000001.npz'])
+        self.assertEqual([s['segment'] for s in self.index()], [0, 1])
+
+    def test_query(self):
+        self.record(1)
+        self.rec.flush()
+        time.sleep(0.01)
+        mid = time.time()
+
+        self.record(2)
+        self.rec.flush()
+        self.record(3)
+
+        # Segment files followed by the samples still in the ring buffer
+        self.assertEqual(self.rec.query('RecRoot.Num')[1].tolist(), [1, 2, 3])
+        self.assertEqual(self.rec.query('RecRoot.Num', start=mid)[1].tolist(), [2, 3])
+        self.assertEqual(self.rec.query('RecRoot.Num', end=mid)[1].tolist(), [1])
+
+        reader = RecorderReader(self.dir.name)
+        self.assertEqual(reader.paths(), ['RecRoot.Num'])
+        self.assertEqual(reader.query('RecRoot.Num')[1].tolist(), [1, 2])
+        self.assertEqual(reader.query('RecRoot.Num', start=mid)[1].tolist(), [2])
+
+    def test_non_numeric_skipped(self):
+        self.root.Text.set('text')
+        self.record(1)
+        self.root.Other.set(1)
+        self.rec.flush()
+
+        self.assertIn('RecRoot.Text', self.rec._ignored)
+        self.assertEqual(self.rec.paths(), ['RecRoot.Num'])
+        self.assertEqual([s['path'] for s in self.index()], ['RecRoot.Num'])
+
+    def test_stop_flushes(self):
+        self.record(1)
+        self.record(2)
+        self.root.stop()
+
+        self.assertFalse(self.rec.open.value())
+        self.assertEqual(RecorderReader(self.dir.name).query('RecRoot.Num')[1].tolist(), [1, 2])
+
+    def test_open_rejected(self):
+        self.rec.open.set(False)
+        self.rec.dataDir.set('')
+        self.rec.open.set(True)
+
+        self.assertFalse(self.rec.open.value())
+
+if __name__ == "__main__":
+    unittest.main()
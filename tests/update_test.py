@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Binary update frame tests for pyrogue
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import pyrogue
+import rogue
+import threading
+import unittest
+
+Values = [None, True, False, 0, -1, (1 << 63) - 1, -(1 << 63), 1 << 64, -(1 << 100),
+          0.0, -2.5, 1e300, '', 'text', 'utf-8 µs']
+
+class ShardRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='ShardRoot', description='Shard root', updateThreads=4)
+        self.frames = []
+
+        for i in range(8):
+            dev = pyrogue.Device(name=f'Dev{i}')
+            dev.add(pyrogue.LocalVariable(name='var', value=0))
+            self.add(dev)
+
+    def _sendDataFrame(self, b):
+        self.frames.append(bytes(b))
+
+class UpdateFrame(unittest.TestCase):
+    """
+    Test the binary update frame encoder and decoder
+    """
+
+    def roundTrip(self, enc, dec, entries, stamp=1.5):
+        frames = enc.encode(entries, stamp)
+        ret = None
+
+        for f in frames:
+            self.assertTrue(pyrogue.isUpdateFrame(f))
+            ret = dec.decode(bytearray(f))
+
+        return len(frames), ret
+
+    def test_values(self):
+        enc = pyrogue.UpdateEncoder()
+        dec = pyrogue.UpdateDecoder()
+        entries = [(f'Root.v{i}', v, str(v)) for i,v in enumerate(Values)]
+
+        count, (stamp, values) = self.roundTrip(enc, dec, entries)
+
+        self.assertEqual(count, 2) # Path table then values
+        self.assertEqual(stamp, 1.5)
+        self.assertEqual(list(values.items()), [(p,v) for p,v,d in entries])
+
+        for (p,v,d),r in zip(entries, values.values()):
+            self.assertIs(type(r), type(v))
+
+    def test_other_types_use_disp(self):
+        enc = pyrogue.UpdateEncoder()
+        dec = pyrogue.UpdateDecoder()
+
+        count, (stamp, values) = self.roundTrip(enc, dec, [('Root.list', [1,2], '[1, 2]')])
+        self.assertEqual(values['Root.list'], '[1, 2]')
+
+    def test_path_table_once(self):
+        enc = pyrogue.UpdateEncoder()
+        dec = pyrogue.UpdateDecoder()
+
+        self.roundTrip(enc, dec, [('Root.a', 1, '1')])
+
+        count, (stamp, values) = self.roundTrip(enc, dec, [('Root.a', 2, '2')])
+        self.assertEqual(count, 1)
+        self.assertEqual(values, {'Root.a' : 2})
+
+        count, (stamp, values) = self.roundTrip(enc, dec, [('Root.a', 3, '3'), ('Root.b', 4, '4')])
+        self.assertEqual(count, 2)
+        self.assertEqual(values, {'Root.a' : 3, 'Root.b' : 4})
+
+    def test_late_decoder(self):
+        enc = pyrogue.UpdateEncoder()
+        enc.encode([('Root.a', 1, '1')])
+
+        # A decoder which missed the path table gets the ids, then the full table resolves them
+        dec = pyrogue.UpdateDecoder()
+        frame = enc.encode([('Root.a', 2, '2')])[-1]
+        self.assertEqual(dec.decode(frame)[1], {0 : 2})
+
+        dec.decode(enc.table())
+        self.assertEqual(dec.decode(frame)[1], {'Root.a' : 2})
+
+    def test_text_frames(self):
+        self.assertFalse(pyrogue.isUpdateFrame(b'RUN.Dev.var:1\nRUN.Dev.other:2\n'))
+        self.assertFalse(pyrogue.isUpdateFrame(b'RU'))
+
+    def test_update_workers(self):
+        root = ShardRoot()
+        root.start(pollEn=False)
+
+        try:
+            root.UpdateEncoding.set('Binary')
+            uvars = {v.path : v for v in root.variableList if v.name == 'var'}
+
+            # Update workers may process the same variables when the shards are rebuilt
+            barrier = threading.Barrier(4)
+
+            def run():
+                barrier.wait()
+                root._processUpdates(uvars)
+
+            threads = [threading.Thread(target=run) for i in range(4)]
+
+            for t in threads:
+                t.start()
+
+            for t in threads:
+                t.join()
+        finally:
+            root.stop()
+
+        # Frames decode in the order they were sent, a path table precedes the values using it
+        dec = pyrogue.UpdateDecoder()
+
+        for f in root.frames:
+            if pyrogue.isUpdateFrame(f):
+                self.assertTrue(all(isinstance(k, str) for k in dec.decode(f)[1]))
+
+        self.assertEqual(len(dec.paths), len(uvars) + 1)
+
+    def test_pack_value(self):
+        for v in Values:
+            self.assertEqual(pyrogue.unpackValue(pyrogue.packValue(v, str(v))), v)
+
+    def test_errors(self):
+        dec = pyrogue.UpdateDecoder()
+
+        with self.assertRaises(pyrogue.UpdateFrameError):
+            dec.decode(b'XX' + bytes(14))
+
+        frame = bytearray(pyrogue.UpdateEncoder().encode([('Root.a', 1, '1')])[-1])
+        frame[2] = 99
+
+        with self.assertRaises(pyrogue.UpdateFrameError):
+            dec.decode(frame)
+
+if __name__ == "__main__":
+    unittest.main()
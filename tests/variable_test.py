@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : Variable tests for pyrogue
+#-----------------------------------------------------------------------------
+# This file is part of the rogue software platform. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the rogue software platform, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import logging
+import pyrogue
+import rogue
+import rogue.interfaces.memory
+import threading
+import time
+import unittest
+
+CallArgs = ['dev', 'var', 'value', 'changed']
+
+def wrap(function):
+    return pyrogue.functionWrapper(function=function, callArgs=CallArgs,
+                                   log=logging.getLogger('test'), path='Test.var')
+
+class SetDevice(pyrogue.Device):
+    def __init__(self, **kargs):
+        super().__init__(**kargs)
+        self.calls = []
+
+        self.add(pyrogue.LocalVariable(
+            name='var',
+            value=0,
+            localSet=lambda dev, var, value: self.calls.append((dev, var, value))))
+
+class SetRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='SetRoot', description='Set root')
+        self.add(SetDevice(name='Dev'))
+
+class MemSlave(rogue.interfaces.memory.Slave):
+    """Memory emulation, see pyrogue.interfaces.simulation.MemEmulate"""
+
+    def __init__(self, maxSize=4096):
+        rogue.interfaces.memory.Slave.__init__(self,4,maxSize)
+        self._maxSize = maxSize
+        self._data    = {}
+
+    def _doMinAccess(self):
+        return 4
+
+    def _doMaxAccess(self):
+        return self._maxSize
+
+    def _doTransaction(self,transaction):
+        address = transaction.address()
+        size    = transaction.size()
+        ba      = bytearray(size)
+
+        if transaction.type() == rogue.interfaces.memory.Write or transaction.type() == rogue.interfaces.memory.Post:
+            transaction.getData(ba,0)
+
+            for i in range(size):
+                self._data[address+i] = ba[i]
+
+        else:
+            for i in range(size):
+                ba[i] = self._data.get(address+i,0)
+
+            transaction.setData(ba,0)
+
+        transaction.done(0)
+
+class UpdateDevice(pyrogue.Device):
+    def __init__(self, **kargs):
+        super().__init__(**kargs)
+
+        self.add(pyrogue.RemoteVariable(name='A', offset=0, bitSize=8, bitOffset=0, base=pyrogue.UInt))
+        self.add(pyrogue.RemoteVariable(name='B', offset=0, bitSize=8, bitOffset=8, base=pyrogue.UInt))
+        self.add(pyrogue.RemoteVariable(name='C', offset=0, bitSize=16, bitOffset=16, base=pyrogue.UInt, deadband=10))
+
+class UpdateRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='UpdateRoot', description='Update root')
+        self.add(UpdateDevice(name='Dev', memBase=MemSlave()))
+
+class LinkDevice(pyrogue.Device):
+    def __init__(self, **kargs):
+        super().__init__(**kargs)
+        self.calls = [] # Thread of each evaluation of Sum
+        self.fail  = False
+
+        self.add(pyrogue.LocalVariable(name='A', value=1))
+        self.add(pyrogue.LocalVariable(name='B', value=2))
+
+        self.add(pyrogue.LinkVariable(name='Sum', dependencies=[self.A, self.B], linkedGet=self._sum))
+
+        # Reads Sum twice, both are served from the update group memo
+        self.add(pyrogue.LinkVariable(name='Double', dependencies=[self.Sum],
+                                      linkedGet=lambda: self.Sum.value() + self.Sum.get(read=False)))
+
+    def _sum(self):
+        self.calls.append(threading.get_ident())
+
+        if self.fail:
+            raise Exception('Sum failed')
+
+        return self.A.value() + self.B.value()
+
+class LinkRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='LinkRoot', description='Link root')
+        self.add(LinkDevice(name='Dev'))
+
+class CycleRoot(pyrogue.Root):
+    def __init__(self):
+        pyrogue.Root.__init__(self, name='CycleRoot', description='Cycle root')
+        dev = pyrogue.Device(name='Dev')
+        dev.add(pyrogue.LocalVariable(name='A', value=0))
+        dev.add(pyrogue.LinkVariable(name='X', dependencies=[dev.A], linkedGet=lambda: 0))
+        dev.add(pyrogue.LinkVariable(name='Y', dependencies=[dev.X], linkedGet=lambda: 0))
+        dev.Y.addListener(dev.X)
+        self.add(dev)
+
+class FunctionWrapper(unittest.TestCase):
+    """
+    Test the argument resolution of variable and command functions
+    """
+
+    def test_none(self):
+        self.assertIsNone(wrap(None))
+
+    def test_no_args(self):
+        w = wrap(lambda: 5)
+        self.assertEqual(w.args, [])
+        self.assertEqual(w(dev=1, var=2, value=3, changed=4), 5)
+
+    def test_subset(self):
+        w = wrap(lambda value, dev: (dev, value))
+        self.assertEqual(sorted(w.args), ['dev', 'value'])
+        self.assertEqual(w(dev=1, var=2, value=3, changed=4), (1, 3))
+
+    def test_keyword_only(self):
+        def func(*, var, changed):
+            return (var, changed)
+
+        w = wrap(func)
+        self.assertEqual(w(dev=1, var=2, value=3, changed=4), (2, 4))
+
+    def test_unknown_args_ignored(self):
+        def func(value, other=7):
+            return (value, other)
+
+        w = wrap(func)
+        self.assertEqual(w.args, ['value'])
+        self.assertEqual(w(dev=1, var=2, value=3, changed=4), (3, 7))
+
+    def test_eval_string(self):
+        w = wrap("value = arg * 2 if arg is not None else 9")
+        self.assertEqual(w(dev=1, var=2, value=3, changed=4), 9)
+
+    def test_local_set(self):
+        root = SetRoot()
+        root.start(pollEn=False)
+
+        try:
+            root.Dev.calls.clear()
+            root.Dev.var.set(4)
+            self.assertEqual(root.Dev.calls, [(root.Dev, root.Dev.var, 4)])
+        finally:
+            root.stop()
+
+class SingleDecode(unittest.TestCase):
+    """
+    Test that an update decodes each variable once and formats the display from that value
+    """
+
+    def test_remote(self):
+        root = UpdateRoot()
+        root.start(pollEn=False)
+
+        try:
+            var = root.Dev.C
+            var.set(0x1234)
+        finally:
+            # Waits for the update workers, which also decode the variable
+            root.stop()
+
+        block = var._block
+        get   = block.get
+        calls = []
+
+        def countGet(v):
+            calls.append(v)
+            return get(v)
+
+        block.get = countGet
+
+        self.assertEqual(var._doUpdate(), (var.path, 0x1234, var.disp.format(0x1234)))
+        self.assertEqual(calls.count(var), 1)
+
+    def test_link(self):
+        root = LinkRoot()
+        root.start(pollEn=False)
+
+        try:
+            dev = root.Dev
+
+            self.assertEqual(dev.Sum._doUpdate(), ('LinkRoot.Dev.Sum', 3, '3'))
+            self.assertEqual(dev.calls.count(threading.get_ident()), 1)
+        finally:
+            root.stop()
+
+    def test_formatter(self):
+        enum = pyrogue.LocalVariable(name='Enum', value=0, enum={0 : 'Off', 1 : 'On'})
+        hexa = pyrogue.LocalVariable(name='Hex', value=0, disp='{:#x}')
+
+        self.assertEqual(enum.genDisp(1), 'On')
+        self.assertEqual(hexa.genDisp(255), '0xff')
+        self.assertIsNone(hexa.genDisp(None))
+        self.assertEqual(hexa.genDisp(''), '')
+
+class LinkUpdates(unittest.TestCase):
+    """
+    Test the evaluation of link variables within update groups
+    """
+
+    def setUp(self):
+        self.root = LinkRoot()
+        self.root.start(pollEn=False)
+
+    def tearDown(self):
+        self.root.stop()
+
+    def test_memo_cleared_on_error(self):
+        dev = self.root.Dev
+        dev.fail = True
+
+        with self.assertRaises(Exception):
+            self.root._processUpdates({dev.A.path : dev.A})
+
+        self.assertIsNone(self.root._updateMemo)
+
+        # Values read outside of an update group are not memoised
+        dev.fail = False
+        self.assertEqual(dev.Sum.value(), dev.Sum.value())
+        self.assertEqual(dev.calls.count(threading.get_ident()), 3)
+
+        dev.A.set(5, write=False)
+        self.assertEqual(dev.Sum.value(), 7)
+
+    def test_once_per_group(self):
+        dev = self.root.Dev
+
+        # Both dependencies change, Sum is evaluated once and reused by Double
+        self.root._processUpdates({dev.A.path : dev.A, dev.B.path : dev.B})
+        self.assertEqual(dev.calls.count(threading.get_ident()), 1)
+
+    def test_dependency_order(self):
+        dev   = self.root.Dev
+        paths = []
+        self.root.addVarListener(lambda entries: paths.extend(p for p,v,d in entries), batch=True)
+
+        with self.root.updateGroup():
+            dev.B.set(3)
+            dev.A.set(4)
+
+        end = time.monotonic() + 2.0
+        while 'LinkRoot.Dev.Double' not in paths and time.monotonic() < end:
+            time.sleep(0.01)
+
+        self.assertEqual([p.split('.')[-1] for p in paths if 'Dev' in p][-2:], ['Sum', 'Double'])
+        self.assertEqual(dev.Double.value(), 14)
+
+    def test_cycle(self):
+        root = CycleRoot()
+
+        with self.assertRaises(pyrogue.NodeError):
+            root.start(pollEn=False)
+
+class ChangeUpdates(unittest.TestCase):
+    """
+    Test that block updates only notify changed variables, outside of their deadband
+    """
+
+    def setUp(self):
+        self.root = UpdateRoot()
+        self.root.start(pollEn=False)
+        self.paths = []
+        self.root.addVarListener(lambda path, value, disp: self.paths.append(path),
+                                 policy='dropOldest', patterns=['UpdateRoot.Dev'])
+
+    def tearDown(self):
+        self.root.stop()
+
+    def update(self, **values):
+        """Write values to the block and return the sorted names of the notified variables"""
+        for k,v in values.items():
+            self.root.Dev.node(k).set(v, write=False)
+
+        del self.paths[:]
+        self.root.Dev.writeBlocks(force=True)
+        self.root.Dev.checkBlocks()
+
+        # Listeners are called from the root worker threads
+        end = time.monotonic() + 0.3
+        while time.monotonic() < end:
+            time.sleep(0.05)
+
+        return sorted(p.split('.')[-1] for p in self.paths)
+
+    def test_first_update_notifies_all(self):
+        self.assertEqual(self.update(), ['A', 'B', 'C'])
+
+    def test_changed_only(self):
+        self.update()
+        self.assertEqual(self.update(A=1), ['A'])
+        self.assertEqual(self.update(), [])
+        self.assertEqual(self.update(A=1, B=2), ['B'])
+
+    def test_deadband(self):
+        self.update(C=100)
+        self.assertEqual(self.update(C=105), [])
+        self.assertEqual(self.update(C=111), ['C'])
+        self.assertEqual(self.update(C=115), [])
+        self.assertEqual(self.update(C=101), ['C'])
+
+if __name__ == "__main__":
+    unittest.main()